@@ -1,5 +1,6 @@
 from fastapi import APIRouter
-from app.api.v1.endpoints import login, users, services, reviews, categories
+from app.api.v1.endpoints import admin, analytics, login, users, services, reviews, categories, districts, saved_searches
+from app.core.config import settings
 
 api_router = APIRouter()
 
@@ -9,3 +10,10 @@ api_router.include_router(users.router, prefix="/users", tags=["users"])
 api_router.include_router(services.router, prefix="/services", tags=["services"])
 api_router.include_router(reviews.router, prefix="/reviews", tags=["reviews"])
 api_router.include_router(categories.router, prefix="/categories", tags=["categories"])
+api_router.include_router(districts.router, prefix="/districts", tags=["districts"])
+api_router.include_router(saved_searches.router, prefix="/saved-searches", tags=["saved-searches"])
+api_router.include_router(analytics.router, prefix="/analytics", tags=["analytics"])
+
+# Endpoints de administración solo si el profiling está habilitado
+if settings.PROFILING_ENABLED:
+    api_router.include_router(admin.router, prefix="/admin", tags=["admin"])
@@ -0,0 +1,19 @@
+"""
+Parámetro `bbox` de los endpoints con viewport (`?bbox=minLng,minLat,maxLng,maxLat`,
+el formato de Leaflet toBBoxString).
+"""
+
+from typing import Tuple
+
+from fastapi import HTTPException
+
+
+def parse_bbox(bbox: str) -> Tuple[float, float, float, float]:
+    """Valida el bbox y lo devuelve como (min_lat, min_lng, max_lat, max_lng)"""
+    try:
+        min_lng, min_lat, max_lng, max_lat = (float(v) for v in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox debe ser minLng,minLat,maxLng,maxLat")
+    if not (-90 <= min_lat <= max_lat <= 90 and -180 <= min_lng <= max_lng <= 180):
+        raise HTTPException(status_code=400, detail="bbox fuera de rango")
+    return min_lat, min_lng, max_lat, max_lng
@@ -0,0 +1,36 @@
+from typing import Annotated
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+
+from app.api.v1.endpoints.login import get_current_active_principal
+from app.core.config import settings
+from app.core.profiling import ProfilerBusy, render_collapsed, sample_stacks
+from app.schemas.token import Principal
+
+router = APIRouter()
+
+async def get_current_admin_user(
+    current_user: Annotated[Principal, Depends(get_current_active_principal)]
+) -> Principal:
+    """Verifica que el usuario actual sea administrador (ADMIN_EMAILS)"""
+    if current_user.email.lower() not in settings.admin_emails:
+        raise HTTPException(status_code=403, detail="Se requieren permisos de administrador")
+    return current_user
+
+@router.get("/profile", response_class=PlainTextResponse)
+async def sample_profile(
+    current_user: Annotated[Principal, Depends(get_current_admin_user)],
+    seconds: float = Query(5.0, gt=0),
+    interval_ms: float = Query(5.0, ge=1, le=1000)
+) -> PlainTextResponse:
+    """
+    Muestrea los stacks de todos los hilos del worker durante `seconds` y
+    devuelve stacks colapsados (entrada directa para flamegraph.pl o speedscope)
+    """
+    seconds = min(seconds, settings.PROFILING_MAX_SECONDS)
+    try:
+        stacks = await run_in_threadpool(sample_stacks, seconds, interval_ms / 1000)
+    except ProfilerBusy:
+        raise HTTPException(status_code=409, detail="Ya hay un muestreo en curso en este worker")
+    return PlainTextResponse(render_collapsed(stacks))
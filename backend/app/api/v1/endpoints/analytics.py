@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta, timezone
+from typing import Annotated, List, Optional
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+from app.api.v1.bbox import parse_bbox
+from app.api.v1.endpoints.admin import get_current_admin_user
+from app.core import geohash, search_demand
+from app.core.config import settings
+from app.core.profiling import ProfilingRoute
+from app.db.session import get_read_db
+from app.schemas.analytics import DemandCell
+from app.schemas.token import Principal
+
+router = APIRouter(route_class=ProfilingRoute)
+
+@router.get("/demand", response_model=List[DemandCell])
+def read_demand(
+    db: Annotated[Session, Depends(get_read_db)],
+    current_user: Annotated[Principal, Depends(get_current_admin_user)],
+    bbox: Optional[str] = Query(None, description="minLng,minLat,maxLng,maxLat"),
+    category: Optional[str] = Query(None),
+    days: int = Query(7, ge=1, le=settings.SEARCH_DEMAND_RETENTION_DAYS),
+    precision: Optional[int] = Query(None, ge=1, le=settings.SEARCH_DEMAND_GEOHASH_PRECISION)
+) -> List[DemandCell]:
+    """
+    Mapa de calor de la demanda de búsquedas (solo administradores)
+    - **bbox**: solo celdas dentro del viewport
+    - **category**: solo búsquedas de esa categoría (filtro o texto igual al nombre)
+    - **days**: ventana hacia atrás (default: 7)
+    - **precision**: agrupar en celdas geohash más grandes (mapa alejado)
+
+    `empty` son las búsquedas sin resultados: demanda que la oferta no cubre.
+    Las búsquedas de los últimos segundos aparecen tras el siguiente flush.
+    """
+    cells = search_demand.heatmap(
+        db,
+        bbox=parse_bbox(bbox) if bbox else None,
+        category=category,
+        since=datetime.now(timezone.utc) - timedelta(days=days),
+        precision=precision,
+    )
+    result = []
+    for cell, searches, empty in cells:
+        latitude, longitude = geohash.center(cell)
+        result.append(DemandCell(
+            geohash=cell, latitude=latitude, longitude=longitude, searches=searches, empty=empty
+        ))
+    return result
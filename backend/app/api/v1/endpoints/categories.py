@@ -1,34 +1,75 @@
-from typing import Annotated, List
-from fastapi import APIRouter, Depends
+from typing import Annotated, List, Optional, Tuple
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import bindparam, select
 from sqlalchemy.orm import Session
 
+from app.api.v1.fields import FIELDS_QUERY, parse_fields, render_fields, rows_to_dicts, validate_fields
+from app.core.cache import category_cache, category_flight
+from app.core.config import settings
+from app.core.profiling import ProfilingRoute
 from app.db.base import Category
-from app.db.session import get_db
+from app.db.replicas import cache_fill_ttl
+from app.db.session import get_read_db
 from app.schemas.category import Category as CategorySchema
 
-router = APIRouter()
+router = APIRouter(route_class=ProfilingRoute)
+
+# Construida una vez: en cada request solo cambian los parámetros
+_LIST = select(Category).order_by(Category.id).offset(bindparam("skip")).limit(bindparam("limit"))
 
 @router.get("/", response_model=List[CategorySchema])
 def read_categories(
-    db: Annotated[Session, Depends(get_db)],
-    skip: int = 0,
-    limit: int = 100
-) -> List[Category]:
+    db: Annotated[Session, Depends(get_read_db)],
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=settings.MAX_PAGE_SIZE),
+    fields: Optional[str] = FIELDS_QUERY
+) -> List[CategorySchema]:
     """
     Obtener lista de categorías
+    - **fields**: devolver solo estos campos (consulta solo esas columnas)
     """
-    categories = db.query(Category).offset(skip).limit(limit).all()
-    return categories
+    selected = parse_fields(fields, CategorySchema)
+    categories = list_categories(db, skip=skip, limit=limit, fields=selected)
+    if selected is None:
+        return categories
+    return render_fields(CategorySchema, selected, categories)
+
+def list_categories(
+    db: Session, *, skip: int = 0, limit: int = 100, fields: Optional[Tuple[str, ...]] = None
+) -> List[CategorySchema]:
+    """Listado de categorías con caché en memoria (son datos casi estáticos)"""
+    key = (skip, limit, fields)
+    categories = category_cache.get(key)
+    if categories is not None:
+        return categories
+    generation = category_cache.generation
+
+    def load() -> List[CategorySchema]:
+        if fields is None:
+            categories = [
+                CategorySchema.model_validate(c)
+                for c in db.scalars(_LIST, {"skip": skip, "limit": limit})
+            ]
+        else:
+            rows = (
+                db.query(*(getattr(Category, f) for f in fields))
+                .order_by(Category.id).offset(skip).limit(limit).all()
+            )
+            categories = validate_fields(CategorySchema, fields, rows_to_dicts(rows, fields))
+        category_cache.set(key, categories, ttl=cache_fill_ttl(db, category_cache), generation=generation)
+        return categories
+
+    return category_flight.do((generation, key), load, timeout=settings.SINGLE_FLIGHT_TIMEOUT_SECONDS)
 
 @router.get("/{category_id}", response_model=CategorySchema)
 def read_category(
     category_id: int,
-    db: Annotated[Session, Depends(get_db)]
+    db: Annotated[Session, Depends(get_read_db)]
 ) -> Category:
     """
     Obtener categoría por ID
     """
-    category = db.query(Category).filter(Category.id == category_id).first()
+    category = db.get(Category, category_id)
     if not category:
         from fastapi import HTTPException
         raise HTTPException(status_code=404, detail="Categoría no encontrada")
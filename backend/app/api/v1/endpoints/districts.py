@@ -0,0 +1,30 @@
+from typing import List, Optional
+from fastapi import APIRouter, Query
+
+from app.core.districts import districts
+from app.core.profiling import ProfilingRoute
+from app.schemas.district import District
+
+router = APIRouter(route_class=ProfilingRoute)
+
+@router.get("/", response_model=List[District])
+def read_districts() -> List[District]:
+    """
+    Obtener las comunas disponibles para filtrar (?district= en /services/),
+    ordenadas por nombre. Vacío si no hay límites cargados.
+    """
+    districts.ensure_loaded()
+    return sorted(districts.districts.values(), key=lambda d: d.name)
+
+@router.get("/locate", response_model=Optional[District])
+def locate_district(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180)
+) -> Optional[District]:
+    """
+    Comuna que contiene el punto (null si queda fuera de todas)
+    """
+    district_id = districts.locate(lat, lng)
+    if district_id is None:
+        return None
+    return districts.districts[district_id]
@@ -1,43 +1,96 @@
-from datetime import timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Annotated
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Response, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from jose import JWTError, jwt
 from sqlalchemy.orm import Session
 
 from app.core import security
 from app.core.config import settings
+from app.core.profiling import ProfilingRoute
+from app.core.revocation import store as revocation_store, token_keys
 from app.crud import crud_user
+from app.crud.crud_token import revoked_token
 from app.db.session import get_db
-from app.schemas.token import Token, TokenData
+from app.schemas.token import LogoutRequest, Principal, RefreshRequest, Token
 from app.schemas.user import User
 
-router = APIRouter()
+router = APIRouter(route_class=ProfilingRoute)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/login/access-token")
 
-async def get_current_user(
-    db: Annotated[Session, Depends(get_db)],
-    token: Annotated[str, Depends(oauth2_scheme)]
-) -> User:
-    """Obtiene el usuario actual desde el token JWT"""
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="No se pudieron validar las credenciales",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def _issue_tokens(user) -> Token:
+    """Par access/refresh con los datos del usuario que necesitan las rutas"""
+    claims = {"sub": user.email, "uid": user.id, "active": bool(user.is_active)}
+    expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    return Token(
+        access_token=security.create_access_token(data=claims, expires_delta=expires),
+        refresh_token=security.create_refresh_token(data=claims),
+        token_type="bearer",
+        expires_in=int(expires.total_seconds()),
+    )
+
+def _lookup_uid(email: str):
+    from app.db.session import SessionLocal
+    db = SessionLocal()
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-        token_data = TokenData(email=email)
-    except JWTError:
-        raise credentials_exception
-    
-    user = crud_user.user.get_by_email(db, email=token_data.email)
+        user = crud_user.user.get_by_email(db, email=email)
+        return (user.id, bool(user.is_active)) if user else (None, False)
+    finally:
+        db.close()
+
+async def _validate(payload: dict | None, token_type: str) -> Principal:
+    """
+    Valida firma, tipo y revocación. Sin revocaciones que coincidan en el
+    filtro en memoria no se consulta la base.
+    """
+    if payload is None or payload.get("sub") is None:
+        raise _credentials_exception()
+    if payload.get("type", "access") != token_type:
+        raise _credentials_exception()
+    uid, active = payload.get("uid"), payload.get("active")
+    if uid is None:
+        # Tokens emitidos antes de incluir el id: se resuelve una vez por request
+        uid, active = await run_in_threadpool(_lookup_uid, payload["sub"])
+        if uid is None:
+            raise _credentials_exception()
+    jti = payload.get("jti")
+    if revocation_store.needs_refresh():
+        await run_in_threadpool(revocation_store.refresh)
+    if revocation_store.maybe_revoked(token_keys(jti, uid)):
+        if await run_in_threadpool(revocation_store.is_revoked, jti, uid, float(payload.get("iat") or 0)):
+            raise _credentials_exception()
+    return Principal(id=uid, email=payload["sub"], is_active=bool(active), jti=jti, exp=payload.get("exp"))
+
+async def get_current_principal(
+    token: Annotated[str, Depends(oauth2_scheme)]
+) -> Principal:
+    """Obtiene el usuario actual desde los claims del token JWT"""
+    return await _validate(security.decode_access_token(token), "access")
+
+async def get_current_active_principal(
+    principal: Annotated[Principal, Depends(get_current_principal)]
+) -> Principal:
+    """Verifica que el usuario del token esté activo"""
+    if not principal.is_active:
+        raise HTTPException(status_code=400, detail="Usuario inactivo")
+    return principal
+
+async def get_current_user(
+    db: Annotated[Session, Depends(get_db)],
+    principal: Annotated[Principal, Depends(get_current_principal)]
+) -> User:
+    """Obtiene el usuario actual desde la base (para rutas que necesitan el registro completo)"""
+    user = crud_user.user.get(db, id=principal.id)
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
     return user
 
 async def get_current_active_user(
@@ -49,12 +102,16 @@ async def get_current_active_user(
     return current_user
 
 @router.post("/access-token", response_model=Token)
-async def login_access_token(
+def login_access_token(
     db: Annotated[Session, Depends(get_db)],
-    form_data: Annotated[OAuth2PasswordRequestForm, Depends()]
+    form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
+    background_tasks: BackgroundTasks
 ) -> Token:
     """
-    OAuth2 compatible token login, obtiene un token de acceso para futuras peticiones
+    OAuth2 compatible token login, obtiene un token de acceso (de vida corta)
+    y un refresh token para renovarlo. Es síncrono: bcrypt corre en el
+    threadpool y no bloquea el event loop (el tope de concurrencia lo pone
+    la admisión, ADMISSION_BCRYPT_MAX_IN_FLIGHT)
     """
     user = crud_user.user.authenticate(
         db, email=form_data.username, password=form_data.password
@@ -68,15 +125,67 @@ async def login_access_token(
     elif not crud_user.user.is_active(user):
         raise HTTPException(status_code=400, detail="Usuario inactivo")
     
-    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = security.create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
-    )
-    return Token(access_token=access_token, token_type="bearer")
+    if crud_user.user.needs_rehash(user):
+        # El nuevo hash (otro costo de bcrypt) se calcula después de responder
+        background_tasks.add_task(
+            crud_user.user.rehash_password,
+            user_id=user.id, old_hash=user.password_hash, password=form_data.password,
+        )
+    return _issue_tokens(user)
+
+def _expiration(payload: dict) -> datetime:
+    return datetime.fromtimestamp(float(payload["exp"]), tz=timezone.utc)
+
+def _rotate(db: Session, principal: Principal, payload: dict) -> Token:
+    """Consume el refresh token y emite el par nuevo (corre en el threadpool)"""
+    if principal.jti and revoked_token.revoke_jti(db, jti=principal.jti, expires_at=_expiration(payload)) is None:
+        # Ya rotado: otro request (u otro worker) lo usó primero
+        raise _credentials_exception()
+    user = crud_user.user.get(db, id=principal.id)
+    if user is None:
+        raise _credentials_exception()
+    if not crud_user.user.is_active(user):
+        raise HTTPException(status_code=400, detail="Usuario inactivo")
+    return _issue_tokens(user)
+
+@router.post("/refresh-token", response_model=Token)
+async def refresh_access_token(
+    db: Annotated[Session, Depends(get_db)],
+    body: RefreshRequest
+) -> Token:
+    """
+    Entrega un nuevo par de tokens a cambio de un refresh token válido.
+    El refresh token usado queda revocado (rotación): si dos requests lo
+    usan a la vez, solo uno recibe tokens nuevos.
+    """
+    payload = security.decode_access_token(body.refresh_token)
+    principal = await _validate(payload, "refresh")
+    return await run_in_threadpool(_rotate, db, principal, payload)
+
+def _revoke_session(db: Session, principal: Principal, body: LogoutRequest | None) -> None:
+    # Revocar dos veces el mismo token no es un error: logout es idempotente
+    if principal.jti:
+        revoked_token.revoke_jti(db, jti=principal.jti, expires_at=_expiration({"exp": principal.exp}))
+    if body and body.refresh_token:
+        payload = security.decode_access_token(body.refresh_token)
+        if payload and payload.get("type") == "refresh" and payload.get("uid") == principal.id and payload.get("jti"):
+            revoked_token.revoke_jti(db, jti=payload["jti"], expires_at=_expiration(payload))
+
+@router.post("/logout", status_code=204)
+async def logout(
+    db: Annotated[Session, Depends(get_db)],
+    principal: Annotated[Principal, Depends(get_current_principal)],
+    body: LogoutRequest | None = None
+) -> Response:
+    """Revoca el token de acceso actual y, si se envía, el refresh token"""
+    await run_in_threadpool(_revoke_session, db, principal, body)
+    return Response(status_code=204)
 
-@router.post("/test-token", response_model=User)
-async def test_token(current_user: Annotated[User, Depends(get_current_active_user)]) -> User:
+@router.post("/test-token", response_model=Principal)
+async def test_token(
+    current_user: Annotated[Principal, Depends(get_current_active_principal)]
+) -> Principal:
     """
-    Endpoint de prueba para verificar que el token es válido
+    Endpoint de prueba para verificar que el token es válido (sin consultar la base)
     """
     return current_user
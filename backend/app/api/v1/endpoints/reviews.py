@@ -1,21 +1,24 @@
-from typing import Annotated, List
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Annotated, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 
-from app.api.v1.endpoints.login import get_current_active_user
+from app.api.v1.endpoints.login import get_current_active_principal
+from app.api.v1.fields import FIELDS_QUERY, parse_fields, rows_response
+from app.core.config import settings
+from app.core.profiling import ProfilingRoute
 from app.crud import crud_review, crud_service
-from app.db.session import get_db
+from app.db.session import get_db, get_read_db
 from app.schemas.review import Review, ReviewCreate, ReviewUpdate
-from app.schemas.user import User
+from app.schemas.token import Principal
 
-router = APIRouter()
+router = APIRouter(route_class=ProfilingRoute)
 
 @router.post("/", response_model=Review, status_code=201)
 def create_review(
     *,
     db: Annotated[Session, Depends(get_db)],
     review_in: ReviewCreate,
-    current_user: Annotated[User, Depends(get_current_active_user)]
+    current_user: Annotated[Principal, Depends(get_current_active_principal)]
 ) -> Review:
     """
     Crear una nueva reseña para un servicio (requiere autenticación)
@@ -41,37 +44,47 @@ def create_review(
 @router.get("/service/{service_id}", response_model=List[Review])
 def read_service_reviews(
     service_id: int,
-    db: Annotated[Session, Depends(get_db)],
-    skip: int = 0,
-    limit: int = 100
+    db: Annotated[Session, Depends(get_read_db)],
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=settings.MAX_PAGE_SIZE),
+    fields: Optional[str] = FIELDS_QUERY
 ) -> List[Review]:
     """
     Obtener todas las reseñas de un servicio
+    - **fields**: devolver solo estos campos (consulta solo esas columnas)
     """
+    selected = parse_fields(fields, Review)
     reviews = crud_review.review.get_by_service(
-        db, service_id=service_id, skip=skip, limit=limit
+        db, service_id=service_id, skip=skip, limit=limit, columns=selected
     )
-    return reviews
+    if selected is None:
+        return reviews
+    return rows_response(Review, selected, reviews)
 
 @router.get("/me", response_model=List[Review])
 def read_my_reviews(
-    db: Annotated[Session, Depends(get_db)],
-    current_user: Annotated[User, Depends(get_current_active_user)],
-    skip: int = 0,
-    limit: int = 100
+    db: Annotated[Session, Depends(get_read_db)],
+    current_user: Annotated[Principal, Depends(get_current_active_principal)],
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=settings.MAX_PAGE_SIZE),
+    fields: Optional[str] = FIELDS_QUERY
 ) -> List[Review]:
     """
     Obtener todas las reseñas creadas por el usuario actual
+    - **fields**: devolver solo estos campos (consulta solo esas columnas)
     """
+    selected = parse_fields(fields, Review)
     reviews = crud_review.review.get_by_user(
-        db, user_id=current_user.id, skip=skip, limit=limit
+        db, user_id=current_user.id, skip=skip, limit=limit, columns=selected
     )
-    return reviews
+    if selected is None:
+        return reviews
+    return rows_response(Review, selected, reviews)
 
 @router.get("/{review_id}", response_model=Review)
 def read_review(
     review_id: int,
-    db: Annotated[Session, Depends(get_db)]
+    db: Annotated[Session, Depends(get_read_db)]
 ) -> Review:
     """
     Obtener una reseña por ID
@@ -87,7 +100,7 @@ def update_review(
     db: Annotated[Session, Depends(get_db)],
     review_id: int,
     review_in: ReviewUpdate,
-    current_user: Annotated[User, Depends(get_current_active_user)]
+    current_user: Annotated[Principal, Depends(get_current_active_principal)]
 ) -> Review:
     """
     Actualizar una reseña (solo el autor)
@@ -109,7 +122,7 @@ def delete_review(
     *,
     db: Annotated[Session, Depends(get_db)],
     review_id: int,
-    current_user: Annotated[User, Depends(get_current_active_user)]
+    current_user: Annotated[Principal, Depends(get_current_active_principal)]
 ) -> Review:
     """
     Eliminar una reseña (solo el autor)
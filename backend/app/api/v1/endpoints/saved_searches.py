@@ -0,0 +1,67 @@
+from typing import Annotated, List
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+from app.api.v1.endpoints.login import get_current_active_principal
+from app.core.config import settings
+from app.core.profiling import ProfilingRoute
+from app.crud import crud_saved_search
+from app.db.session import get_db
+from app.schemas.saved_search import SavedSearch, SavedSearchCreate
+from app.schemas.token import Principal
+
+router = APIRouter(route_class=ProfilingRoute)
+
+@router.post("/", response_model=SavedSearch, status_code=201)
+def create_saved_search(
+    *,
+    db: Annotated[Session, Depends(get_db)],
+    search_in: SavedSearchCreate,
+    current_user: Annotated[Principal, Depends(get_current_active_principal)]
+) -> SavedSearch:
+    """
+    Guardar una búsqueda (requiere autenticación). Se avisará cuando se
+    publique o cambie un servicio que la cumpla.
+    - **category**: categoría exacta (sin distinguir mayúsculas)
+    - **keywords**: palabras que deben aparecer todas en nombre, descripción o categoría
+    - **latitude**, **longitude**, **radius_km**: círculo geográfico
+    """
+    count = crud_saved_search.saved_search.count_by_user(db, user_id=current_user.id)
+    if count >= settings.SAVED_SEARCH_MAX_PER_USER:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Puedes guardar hasta {settings.SAVED_SEARCH_MAX_PER_USER} búsquedas"
+        )
+    return crud_saved_search.saved_search.create_with_user(
+        db, obj_in=search_in, user_id=current_user.id
+    )
+
+@router.get("/", response_model=List[SavedSearch])
+def read_my_saved_searches(
+    db: Annotated[Session, Depends(get_db)],
+    current_user: Annotated[Principal, Depends(get_current_active_principal)]
+) -> List[SavedSearch]:
+    """
+    Obtener las búsquedas guardadas del usuario actual
+    """
+    return crud_saved_search.saved_search.get_by_user(db, user_id=current_user.id)
+
+@router.delete("/{search_id}", response_model=SavedSearch)
+def delete_saved_search(
+    *,
+    db: Annotated[Session, Depends(get_db)],
+    search_id: int,
+    current_user: Annotated[Principal, Depends(get_current_active_principal)]
+) -> SavedSearch:
+    """
+    Eliminar una búsqueda guardada (solo el dueño)
+    """
+    search = crud_saved_search.saved_search.get(db, id=search_id)
+    if not search:
+        raise HTTPException(status_code=404, detail="Búsqueda no encontrada")
+    if search.user_id != current_user.id:
+        raise HTTPException(
+            status_code=403,
+            detail="No tienes permisos para eliminar esta búsqueda"
+        )
+    return crud_saved_search.saved_search.remove(db, id=search_id)
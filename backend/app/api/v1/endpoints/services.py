@@ -1,22 +1,44 @@
-from typing import Annotated, List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+import asyncio
+import base64
+import math
+from dataclasses import asdict
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Annotated, List, Optional, Tuple
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import bindparam, func, select
+from sqlalchemy.orm import Session, joinedload
 
-from app.api.v1.endpoints.login import get_current_active_user
+from app.api.v1.bbox import parse_bbox
+from app.api.v1.endpoints.login import get_current_active_principal
+from app.api.v1.fields import FIELDS_QUERY, parse_fields, render_fields, validate_fields
+from app.core import price_stats, service_index, service_stream
+from app.core.search_demand import recorder as demand
+from app.core.service_stats import counters
+from app.core.cache import service_list_cache, service_list_flight
+from app.core.config import settings
+from app.core.profiling import ProfilingRoute
 from app.crud import crud_service
-from app.db.session import get_db
-from app.db.base import Service as ServiceModel
-from app.schemas.service import Service, ServiceCreate, ServiceUpdate, ServiceWithOwner
-from app.schemas.user import User
+from app.db.replicas import cache_fill_ttl
+from app.db.session import get_db, get_read_db
+from app.db.base import (
+    Service as ServiceModel, ServiceNeighbor as ServiceNeighborModel, ServiceStat as ServiceStatModel,
+    User as UserModel
+)
+from app.schemas.service import (
+    PriceStats, Service, ServiceChanges, ServiceCreate, ServiceStats, ServiceUpdate, ServiceWithOwner
+)
+from app.schemas.token import Principal
 
-router = APIRouter()
+router = APIRouter(route_class=ProfilingRoute)
 
 @router.post("/", response_model=Service, status_code=201)
 def create_service(
     *,
     db: Annotated[Session, Depends(get_db)],
     service_in: ServiceCreate,
-    current_user: Annotated[User, Depends(get_current_active_user)]
+    current_user: Annotated[Principal, Depends(get_current_active_principal)]
 ) -> Service:
     """
     Crear un nuevo servicio (requiere autenticación)
@@ -26,54 +48,366 @@ def create_service(
     )
     return service
 
+def _base_statement(fields: Optional[Tuple[str, ...]]):
+    """SELECT de servicios completos (con dueño) o solo de las columnas pedidas"""
+    if fields is None:
+        # El dueño se carga en la misma consulta (evita una por servicio)
+        return select(ServiceModel).options(joinedload(ServiceModel.owner))
+    columns = [f for f in fields if f != "owner"]
+    stmt = select(*(getattr(ServiceModel, f) for f in columns))
+    if "owner" in fields:
+        stmt = stmt.join(ServiceModel.owner).add_columns(UserModel.id, UserModel.full_name)
+    return stmt
+
+@lru_cache(maxsize=256)
+def _list_statement(
+    fields: Optional[Tuple[str, ...]], active_only: bool, by_category: bool, by_search: bool,
+    by_min_price: bool = False, by_max_price: bool = False, by_min_rating: bool = False,
+    geo: bool = False, by_radius: bool = False, sort: str = "id", by_district: bool = False
+):
+    """
+    SELECT del listado para una combinación de filtros, construido una sola
+    vez: reutilizarlo evita rearmarlo y recalcular su clave de caché de
+    compilación en cada request
+    """
+    stmt = _base_statement(fields)
+    
+    if active_only:
+        stmt = stmt.where(ServiceModel.is_active == True)
+    
+    if by_category:
+        # Filtro de categoría case-insensitive
+        stmt = stmt.where(ServiceModel.category.ilike(bindparam("category")))
+    
+    if by_search:
+        # Buscar en nombre, descripción y categoría
+        term = bindparam("term")
+        stmt = stmt.where(
+            (ServiceModel.service_name.ilike(term)) |
+            (ServiceModel.description.ilike(term)) |
+            (ServiceModel.category.ilike(term))
+        )
+    
+    if by_district:
+        # Igualdad sobre la columna indexada (la comuna se asigna al guardar)
+        stmt = stmt.where(ServiceModel.district_id == bindparam("district"))
+    
+    if by_min_price:
+        stmt = stmt.where(ServiceModel.price >= bindparam("min_price"))
+    if by_max_price:
+        stmt = stmt.where(ServiceModel.price <= bindparam("max_price"))
+    if by_min_rating:
+        stmt = stmt.where(ServiceModel.rating >= bindparam("min_rating"))
+    
+    # Sin índice en memoria: distancia equirectangular en grados (suficiente
+    # a escala de ciudad); el rango de latitud permite usar un índice
+    if geo:
+        dlat = ServiceModel.latitude - bindparam("lat")
+        dlng = (ServiceModel.longitude - bindparam("lng")) * bindparam("cos_lat")
+        distance2 = dlat * dlat + dlng * dlng
+        if by_radius:
+            stmt = stmt.where(
+                ServiceModel.latitude.between(bindparam("min_lat"), bindparam("max_lat")),
+                distance2 <= bindparam("radius2")
+            )
+    
+    # Paginación con orden estable con o sin proyección
+    if sort == "distance" and geo:
+        stmt = stmt.order_by(distance2, ServiceModel.id)
+    elif sort == "rating":
+        stmt = stmt.order_by(ServiceModel.rating.desc(), ServiceModel.id)
+    elif sort == "popular":
+        stats = ServiceStatModel
+        score = func.coalesce(stats.views + settings.SERVICE_STATS_CONTACT_WEIGHT * stats.contacts, 0)
+        stmt = stmt.outerjoin(stats, stats.service_id == ServiceModel.id).order_by(score.desc(), ServiceModel.id)
+    else:
+        stmt = stmt.order_by(ServiceModel.id)
+    return stmt.offset(bindparam("skip")).limit(bindparam("limit"))
+
+@lru_cache(maxsize=64)
+def _by_ids_statement(fields: Optional[Tuple[str, ...]]):
+    """SELECT de una página de IDs ya resuelta por el índice en memoria"""
+    stmt = _base_statement(fields)
+    if fields is not None:
+        # El id al final de la fila, para devolverlas en el orden del índice
+        stmt = stmt.add_columns(ServiceModel.id)
+    return stmt.where(ServiceModel.id.in_(bindparam("ids", expanding=True)))
+
 @router.get("/", response_model=List[ServiceWithOwner])
 def read_services(
-    db: Annotated[Session, Depends(get_db)],
-    skip: int = 0,
-    limit: int = 100,
+    db: Annotated[Session, Depends(get_read_db)],
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=settings.MAX_PAGE_SIZE),
     category: Optional[str] = Query(None),
     search: Optional[str] = Query(None),
-    active_only: bool = True
+    district: Optional[str] = Query(None),
+    active_only: bool = True,
+    lat: Optional[float] = Query(None, ge=-90, le=90),
+    lng: Optional[float] = Query(None, ge=-180, le=180),
+    radius_km: Optional[float] = Query(None, gt=0),
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    min_rating: Optional[float] = Query(None, ge=0, le=5),
+    sort: str = Query("id", pattern="^(id|distance|rating|popular)$"),
+    fields: Optional[str] = FIELDS_QUERY
 ) -> List[ServiceWithOwner]:
     """
     Obtener lista de servicios con filtros opcionales
     - **category**: Filtrar por categoría (case-insensitive)
     - **search**: Buscar en nombre y descripción
+    - **district**: ID de comuna (ver /districts/)
     - **active_only**: Solo servicios activos (default: True)
+    - **lat** / **lng** / **radius_km**: Solo servicios dentro del radio
+    - **min_price** / **max_price** / **min_rating**: Rangos de precio y rating
+    - **sort**: id (default), distance (requiere lat/lng), rating o popular
+      (vistas y contactos)
+    - **fields**: devolver solo estos campos (ej. id,latitude,longitude,category)
     
-    Los filtros se pueden combinar (search + category)
+    Los filtros se pueden combinar (search + category + radio + precio...)
     """
-    # Construir query base
-    query = db.query(ServiceModel)
-    
-    # Aplicar filtros
-    if active_only:
-        query = query.filter(ServiceModel.is_active == True)
-    
-    if category:
-        # Filtro de categoría case-insensitive
-        query = query.filter(ServiceModel.category.ilike(category))
-    
-    if search:
-        # Buscar en nombre, descripción y categoría
-        search_term = f"%{search}%"
-        query = query.filter(
-            (ServiceModel.service_name.ilike(search_term)) |
-            (ServiceModel.description.ilike(search_term)) |
-            (ServiceModel.category.ilike(search_term))
-        )
-    
-    # Aplicar paginación y ejecutar
-    services = query.offset(skip).limit(limit).all()
-    
-    return services
+    if (lat is None) != (lng is None):
+        raise HTTPException(status_code=400, detail="lat y lng deben indicarse juntos")
+    if lat is None and (radius_km is not None or sort == "distance"):
+        raise HTTPException(status_code=400, detail="radius_km y sort=distance requieren lat y lng")
+    selected = parse_fields(fields, ServiceWithOwner)
+    services = list_services(
+        db, skip=skip, limit=limit, category=category, search=search,
+        district=district, active_only=active_only, lat=lat, lng=lng, radius_km=radius_km,
+        min_price=min_price, max_price=max_price, min_rating=min_rating,
+        sort=sort, fields=selected
+    )
+    if settings.SEARCH_DEMAND_ENABLED and skip == 0:
+        # Solo la primera página: paginar no es otra búsqueda
+        demand.record(category, search, lat, lng, len(services))
+    if selected is None:
+        return services
+    return render_fields(ServiceWithOwner, selected, services)
+
+def list_services(
+    db: Session,
+    *,
+    skip: int = 0,
+    limit: int = 100,
+    category: Optional[str] = None,
+    search: Optional[str] = None,
+    district: Optional[str] = None,
+    active_only: bool = True,
+    lat: Optional[float] = None,
+    lng: Optional[float] = None,
+    radius_km: Optional[float] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    min_rating: Optional[float] = None,
+    sort: str = "id",
+    fields: Optional[Tuple[str, ...]] = None
+) -> List[ServiceWithOwner]:
+    """
+    Listado de servicios con caché en memoria por combinación de filtros.
+    Las escrituras de servicios, reseñas y usuarios invalidan el caché.
+    Con `fields` se consultan solo esas columnas (y el dueño con un JOIN
+    si se pide `owner`).
+
+    Con SERVICE_INDEX_ENABLED los filtros, la distancia y el orden se
+    resuelven en el índice en memoria (app.core.service_index) y la base
+    solo entrega las filas de la página. Las búsquedas con ubicación no se
+    guardan en el caché: casi nunca se repiten las mismas coordenadas.
+    Con el caché frío, los requests idénticos simultáneos esperan la
+    consulta del primero (app.core.singleflight).
+    """
+    geo = lat is not None and lng is not None
+    key = (skip, limit, category, search, district, active_only, min_price, max_price, min_rating, sort, fields)
+    if not geo:
+        cached = service_list_cache.get(key)
+        if cached is not None:
+            return cached
+    generation = service_list_cache.generation
+
+    def load() -> List[ServiceWithOwner]:
+        if settings.SERVICE_INDEX_ENABLED:
+            ids, _ = service_index.index.query(
+                category=category, search=search, district=district, lat=lat, lng=lng, radius_km=radius_km,
+                min_price=min_price, max_price=max_price, min_rating=min_rating,
+                active_only=active_only, sort=sort, skip=skip, limit=limit
+            )
+            result = db.execute(_by_ids_statement(fields), {"ids": ids}) if ids else []
+        else:
+            # Sentencia ya construida para esta combinación de filtros; solo cambian los parámetros
+            stmt = _list_statement(
+                fields, active_only, bool(category), bool(search),
+                min_price is not None, max_price is not None, min_rating is not None,
+                geo, geo and radius_km is not None, sort, bool(district)
+            )
+            params = {"skip": skip, "limit": limit}
+            if category:
+                params["category"] = category
+            if search:
+                params["term"] = f"%{search}%"
+            if district:
+                params["district"] = district
+            if min_price is not None:
+                params["min_price"] = min_price
+            if max_price is not None:
+                params["max_price"] = max_price
+            if min_rating is not None:
+                params["min_rating"] = min_rating
+            if geo:
+                params.update(lat=lat, lng=lng, cos_lat=math.cos(math.radians(lat)))
+                if radius_km is not None:
+                    radius_deg = math.degrees(radius_km / service_index.EARTH_RADIUS_KM)
+                    params.update(min_lat=lat - radius_deg, max_lat=lat + radius_deg, radius2=radius_deg ** 2)
+            result = db.execute(stmt, params)
+            ids = None
+
+        if fields is None:
+            services = [ServiceWithOwner.model_validate(s) for s in result.unique().scalars()] if result else []
+            if ids is not None:
+                position = {service_id: i for i, service_id in enumerate(ids)}
+                services.sort(key=lambda s: position[s.id])
+        else:
+            columns = [f for f in fields if f != "owner"]
+            rows = list(result)
+            if ids is not None:
+                position = {service_id: i for i, service_id in enumerate(ids)}
+                rows.sort(key=lambda row: position[row[-1]])
+            items = []
+            for row in rows:
+                item = dict(zip(columns, row))
+                if "owner" in fields:
+                    item["owner"] = {"id": row[len(columns)], "full_name": row[len(columns) + 1]}
+                items.append(item)
+            services = validate_fields(ServiceWithOwner, fields, items)
+        if not geo:
+            service_list_cache.set(key, services, ttl=cache_fill_ttl(db, service_list_cache), generation=generation)
+        return services
+
+    # Los requests idénticos concurrentes (caché frío) comparten una consulta
+    return service_list_flight.do(
+        (generation, key, lat, lng, radius_km), load, timeout=settings.SINGLE_FLIGHT_TIMEOUT_SECONDS
+    )
+
+@router.get("/stream")
+async def stream_services(
+    request: Request,
+    bbox: str = Query(..., description="minLng,minLat,maxLng,maxLat")
+) -> StreamingResponse:
+    """
+    Feed Server-Sent Events de los cambios de servicios dentro del viewport
+    - **added** / **updated**: servicio completo (mismo formato que el listado)
+    - **removed**: `{"id": ...}` (borrado, desactivado o salió del bbox)
+    - **reset**: el cliente se atrasó; debe recargar el listado completo
+    """
+    viewer = service_stream.Viewer(*parse_bbox(bbox), queue_size=settings.SERVICE_STREAM_QUEUE_SIZE)
+    if not service_stream.hub.register(viewer):
+        raise HTTPException(status_code=503, detail="Demasiadas conexiones de streaming")
+
+    async def event_source():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(
+                        viewer.queue.get(), timeout=settings.SERVICE_STREAM_HEARTBEAT_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": ping\n\n"
+                    continue
+                yield f"event: {event}\ndata: {data}\n\n"
+        finally:
+            service_stream.hub.unregister(viewer)
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite devuelve fechas sin zona (CURRENT_TIMESTAMP está en UTC)
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+def _encode_watermark(watermark: Tuple[datetime, int]) -> str:
+    raw = f"{watermark[0].isoformat()}|{watermark[1]}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _decode_watermark(token: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+        timestamp, service_id = raw.split("|")
+        return _as_utc(datetime.fromisoformat(timestamp)), int(service_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Marca de agua inválida")
+
+@router.get("/changes", response_model=ServiceChanges)
+def read_service_changes(
+    # Siempre del primario: con el retraso de una réplica la marca de agua
+    # podría saltarse cambios que aún no llegaron
+    db: Annotated[Session, Depends(get_db)],
+    since: Optional[str] = Query(None, description="Valor `next` de la respuesta anterior"),
+    limit: int = Query(500, ge=1, le=1000)
+) -> ServiceChanges:
+    """
+    Sincronización incremental: servicios creados o modificados y IDs
+    eliminados (o desactivados) desde la marca de agua `since`.
+    Sin `since` devuelve todos los servicios, paginados con `has_more`.
+    """
+    now = datetime.now(timezone.utc)
+    after = _decode_watermark(since) if since else None
+    if after is not None and after[0] < now - timedelta(days=settings.SERVICE_TOMBSTONE_RETENTION_DAYS):
+        # Los tombstones de ese período ya se purgaron
+        return ServiceChanges(services=[], deleted=[], next="", has_more=False, reset=True)
+
+    services, deleted, has_more = crud_service.service.get_changes(db, after=after, limit=limit)
+    cursor = after
+    if services:
+        cursor = (_as_utc(services[-1].updated_at), services[-1].id)
+    if not has_more:
+        # Al quedar al día, la marca de agua no avanza más allá de now - SETTLE:
+        # una transacción en curso puede confirmar con un updated_at anterior.
+        # Lo posterior se vuelve a enviar en la próxima llamada (es idempotente).
+        horizon = (now - timedelta(seconds=settings.SERVICE_CHANGES_SETTLE_SECONDS), 0)
+        cursor = horizon if cursor is None else min(cursor, horizon)
+
+    return ServiceChanges(
+        services=[ServiceWithOwner.model_validate(s) for s in services if s.is_active],
+        deleted=deleted + [s.id for s in services if not s.is_active],
+        next=_encode_watermark(cursor),
+        has_more=has_more,
+    )
+
+@router.get("/price-stats", response_model=List[PriceStats])
+def read_price_stats(
+    category: str = Query(..., min_length=1),
+    price_modality: Optional[str] = Query(None),
+    bbox: Optional[str] = Query(None, description="minLng,minLat,maxLng,maxLat")
+) -> List[PriceStats]:
+    """
+    Precios típicos de una categoría: p25, mediana y p75 por modalidad de
+    precio (una entrada por modalidad, de la más común a la menos)
+    - **category**: categoría (case-insensitive)
+    - **price_modality**: solo esa modalidad
+    - **bbox**: solo servicios de la zona (celdas de ~5 km que la tocan)
+
+    Los cuartiles tienen a lo más `relative_error` de error relativo; no
+    ordenan los precios en cada request.
+    """
+    if not settings.PRICE_STATS_ENABLED:
+        raise HTTPException(status_code=404, detail="Estadísticas de precio deshabilitadas")
+    summaries = price_stats.stats.summarize(
+        category, price_modality=price_modality, bbox=parse_bbox(bbox) if bbox else None
+    )
+    return [
+        PriceStats(**asdict(summary), relative_error=settings.PRICE_STATS_RELATIVE_ACCURACY)
+        for summary in summaries
+    ]
 
 @router.get("/me", response_model=List[Service])
 def read_my_services(
-    db: Annotated[Session, Depends(get_db)],
-    current_user: Annotated[User, Depends(get_current_active_user)],
-    skip: int = 0,
-    limit: int = 100
+    db: Annotated[Session, Depends(get_read_db)],
+    current_user: Annotated[Principal, Depends(get_current_active_principal)],
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=settings.MAX_PAGE_SIZE)
 ) -> List[Service]:
     """
     Obtener servicios del usuario actual
@@ -86,7 +420,7 @@ def read_my_services(
 @router.get("/{service_id}", response_model=ServiceWithOwner)
 def read_service(
     service_id: int,
-    db: Annotated[Session, Depends(get_db)]
+    db: Annotated[Session, Depends(get_read_db)]
 ) -> ServiceWithOwner:
     """
     Obtener servicio por ID
@@ -94,15 +428,86 @@ def read_service(
     service = crud_service.service.get(db, id=service_id)
     if not service:
         raise HTTPException(status_code=404, detail="Servicio no encontrado")
+    counters.record_view(service_id)
     return service
 
+def _service_exists(db: Session, service_id: int) -> bool:
+    if settings.SERVICE_INDEX_ENABLED:
+        return service_index.index.contains(service_id)
+    return db.scalar(select(ServiceModel.id).where(ServiceModel.id == service_id)) is not None
+
+@router.post("/{service_id}/view", status_code=204)
+def record_service_view(
+    service_id: int,
+    db: Annotated[Session, Depends(get_read_db)]
+) -> None:
+    """
+    Registrar una vista del detalle (el frontend lo muestra sin pedir
+    /services/{id}). Solo suma en memoria; los IDs inexistentes no ocupan
+    un contador.
+    """
+    if not _service_exists(db, service_id):
+        raise HTTPException(status_code=404, detail="Servicio no encontrado")
+    counters.record_view(service_id)
+
+@router.post("/{service_id}/contact", status_code=204)
+def record_service_contact(
+    service_id: int,
+    db: Annotated[Session, Depends(get_read_db)]
+) -> None:
+    """
+    Registrar un clic en un botón de contacto (email, teléfono o WhatsApp)
+    """
+    if not _service_exists(db, service_id):
+        raise HTTPException(status_code=404, detail="Servicio no encontrado")
+    counters.record_contact(service_id)
+
+@router.get("/{service_id}/stats", response_model=ServiceStats)
+def read_service_stats(
+    service_id: int,
+    db: Annotated[Session, Depends(get_read_db)]
+) -> ServiceStats:
+    """
+    Vistas y clics de contacto de un servicio
+    """
+    if db.get(ServiceModel, service_id) is None:
+        raise HTTPException(status_code=404, detail="Servicio no encontrado")
+    stats = db.get(ServiceStatModel, service_id)
+    pending = counters.pending_for(service_id)
+    return ServiceStats(
+        service_id=service_id,
+        views=(stats.views if stats else 0) + pending["views"],
+        contacts=(stats.contacts if stats else 0) + pending["contacts"],
+    )
+
+@router.get("/{service_id}/similar", response_model=List[ServiceWithOwner])
+def read_similar_services(
+    service_id: int,
+    db: Annotated[Session, Depends(get_read_db)]
+) -> List[ServiceWithOwner]:
+    """
+    Servicios similares cercanos (texto, categoría y distancia), del más al
+    menos parecido. Las listas están precalculadas (app.core.similar).
+    """
+    neighbors = ServiceNeighborModel
+    services = db.scalars(
+        select(ServiceModel)
+        .join(neighbors, neighbors.neighbor_id == ServiceModel.id)
+        .options(joinedload(ServiceModel.owner))
+        .where(neighbors.service_id == service_id, ServiceModel.is_active == True)
+        .order_by(neighbors.rank)
+    ).all()
+    if not services and db.get(ServiceModel, service_id) is None:
+        raise HTTPException(status_code=404, detail="Servicio no encontrado")
+    return services
+
 @router.put("/{service_id}", response_model=Service)
 def update_service(
     *,
     db: Annotated[Session, Depends(get_db)],
     service_id: int,
     service_in: ServiceUpdate,
-    current_user: Annotated[User, Depends(get_current_active_user)]
+    current_user: Annotated[Principal, Depends(get_current_active_principal)]
 ) -> Service:
     """
     Actualizar un servicio (solo el propietario)
@@ -121,7 +526,7 @@ def delete_service(
     *,
     db: Annotated[Session, Depends(get_db)],
     service_id: int,
-    current_user: Annotated[User, Depends(get_current_active_user)]
+    current_user: Annotated[Principal, Depends(get_current_active_principal)]
 ) -> Service:
     """
     Eliminar un servicio (solo el propietario)
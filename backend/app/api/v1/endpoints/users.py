@@ -1,13 +1,16 @@
 from typing import Annotated, List
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
 
-from app.api.v1.endpoints.login import get_current_active_user
+from app.api.v1.endpoints.login import get_current_active_principal, get_current_active_user
+from app.core.config import settings
+from app.core.profiling import ProfilingRoute
 from app.crud import crud_user
 from app.db.session import get_db
+from app.schemas.token import Principal
 from app.schemas.user import User, UserCreate, UserUpdate
 
-router = APIRouter()
+router = APIRouter(route_class=ProfilingRoute)
 
 @router.post("/", response_model=User, status_code=201)
 def create_user(
@@ -52,10 +55,25 @@ def update_user_me(
 @router.delete("/me", response_model=User)
 def delete_user_me(
     db: Annotated[Session, Depends(get_db)],
-    current_user: Annotated[User, Depends(get_current_active_user)]
+    current_user: Annotated[Principal, Depends(get_current_active_principal)],
+    background_tasks: BackgroundTasks,
+    response: Response
 ) -> User:
     """
-    Eliminar usuario actual
+    Eliminar usuario actual junto con sus servicios y reseñas.
+    Con ACCOUNT_DELETION_IN_BACKGROUND la cuenta queda desactivada (y sus
+    tokens revocados) al responder 202, y el borrado corre después.
     """
+    # El principal sale del token: la cuenta pudo borrarse en otro request
+    if settings.ACCOUNT_DELETION_IN_BACKGROUND:
+        user = crud_user.user.get(db, current_user.id)
+        if user is None:
+            raise HTTPException(status_code=404, detail="Usuario no encontrado")
+        user = crud_user.user.update(db, db_obj=user, obj_in={"is_active": False})
+        background_tasks.add_task(crud_user.user.purge, user_id=user.id)
+        response.status_code = 202
+        return user
     user = crud_user.user.remove(db, id=current_user.id)
+    if user is None:
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
     return user
@@ -0,0 +1,58 @@
+"""
+Selección de campos para listados (`?fields=id,latitude,longitude`).
+
+Con `fields` el endpoint consulta solo esas columnas y serializa con un
+modelo reducido derivado del schema de respuesta, en vez de cargar
+objetos ORM completos y descartar campos después.
+"""
+
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Type
+
+from fastapi import HTTPException, Query, Response
+from pydantic import BaseModel, ConfigDict, TypeAdapter, create_model
+
+FIELDS_QUERY = Query(
+    None,
+    description="Campos a devolver separados por coma (ej. id,latitude,longitude,category)",
+)
+
+
+def parse_fields(fields: Optional[str], schema: Type[BaseModel]) -> Optional[Tuple[str, ...]]:
+    """Valida los campos pedidos contra el schema; None si se piden todos"""
+    if not fields:
+        return None
+    requested = tuple(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    unknown = [f for f in requested if f not in schema.model_fields]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Campos desconocidos: {', '.join(unknown)}")
+    return requested or None
+
+
+@lru_cache(maxsize=256)
+def _adapter(schema: Type[BaseModel], fields: Tuple[str, ...]) -> TypeAdapter:
+    # Sin los validadores del schema original: los datos ya vienen de la base
+    subset = create_model(
+        f"{schema.__name__}Fields",
+        __config__=ConfigDict(from_attributes=True),
+        **{name: (schema.model_fields[name].annotation, ...) for name in fields},
+    )
+    return TypeAdapter(List[subset])
+
+
+def rows_to_dicts(rows: Iterable[Sequence[Any]], fields: Sequence[str]) -> List[Dict[str, Any]]:
+    return [dict(zip(fields, row)) for row in rows]
+
+
+def validate_fields(schema: Type[BaseModel], fields: Tuple[str, ...], items: List[Dict[str, Any]]) -> List[Any]:
+    return _adapter(schema, fields).validate_python(items)
+
+
+def render_fields(schema: Type[BaseModel], fields: Tuple[str, ...], items: List[Any]) -> Response:
+    """Respuesta JSON con el modelo reducido (omite el response_model del endpoint)"""
+    return Response(content=_adapter(schema, fields).dump_json(items), media_type="application/json")
+
+
+def rows_response(schema: Type[BaseModel], fields: Tuple[str, ...], rows: Iterable[Sequence[Any]]) -> Response:
+    """Filas de una consulta proyectada (en el orden de `fields`) como respuesta JSON"""
+    return render_fields(schema, fields, validate_fields(schema, fields, rows_to_dicts(rows, fields)))
@@ -0,0 +1,223 @@
+"""
+Control de admisión: rate limiting con token buckets y tope de requests
+concurrentes por ruta.
+
+Cada cliente (usuario autenticado o IP) tiene un bucket de
+ADMISSION_BUCKET_CAPACITY unidades que se recarga a
+ADMISSION_REFILL_PER_SECOND. Cada request consume según el costo de su
+ruta: el login y el registro (bcrypt) cuestan mucho más que leer
+categorías, y los listados cuestan según su `limit`. Sin saldo se responde
+429 de inmediato; si la ruta ya tiene el máximo de requests en curso, 503.
+Ambos con Retry-After, sin encolar trabajo que terminaría en timeout.
+
+Los buckets viven en memoria del worker (backend "memory") o en Redis
+(backend "redis", requiere el paquete redis) para compartirlos entre
+workers y hosts. El tope de concurrencia siempre es por worker.
+"""
+
+import hashlib
+import json
+import logging
+import math
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs
+
+from app.core import metrics
+from app.core.config import settings
+
+logger = logging.getLogger("app.admission")
+
+
+@dataclass(frozen=True)
+class Rule:
+    name: str
+    cost: float = 1.0
+    max_in_flight: Optional[int] = None
+    # Costo adicional por cada 100 elementos pedidos con ?limit=
+    cost_per_100_items: float = 0.0
+
+
+API = settings.API_V1_STR
+# Rutas sin regla propia: comparten un solo contador de requests en curso,
+# es decir, ADMISSION_MAX_IN_FLIGHT es el tope global del worker para
+# todas ellas juntas (no uno por ruta)
+DEFAULT_RULE = Rule("default", max_in_flight=settings.ADMISSION_MAX_IN_FLIGHT)
+RULES: Dict[Tuple[str, str], Rule] = {
+    ("POST", f"{API}/login/access-token"): Rule(
+        "login", cost=10, max_in_flight=settings.ADMISSION_BCRYPT_MAX_IN_FLIGHT
+    ),
+    ("POST", f"{API}/users"): Rule(
+        "user_create", cost=10, max_in_flight=settings.ADMISSION_BCRYPT_MAX_IN_FLIGHT
+    ),
+    ("POST", f"{API}/services"): Rule("service_create", cost=3),
+    ("POST", f"{API}/reviews"): Rule("review_create", cost=3),
+    ("GET", f"{API}/services"): Rule("services_list", cost=1, cost_per_100_items=1),
+    ("GET", f"{API}/categories"): Rule("categories_list", cost=0.5),
+    # Conexiones largas: su tope es SERVICE_STREAM_MAX_CONNECTIONS
+    ("GET", f"{API}/services/stream"): Rule("services_stream"),
+}
+EXEMPT_PATHS = {"/", "/health", "/ready", "/metrics"}
+
+
+def _limit_param(query_string: bytes) -> int:
+    try:
+        return int(parse_qs(query_string.decode())["limit"][0])
+    except (KeyError, ValueError, UnicodeDecodeError):
+        return 100
+
+
+def rule_for(method: str, path: str, query_string: bytes) -> Tuple[Rule, float]:
+    rule = RULES.get((method, path.rstrip("/")), DEFAULT_RULE)
+    cost = rule.cost
+    if rule.cost_per_100_items:
+        cost += rule.cost_per_100_items * max(_limit_param(query_string), 0) / 100
+    return rule, cost
+
+
+class MemoryBucketStore:
+    """Buckets por cliente en memoria; los inactivos (llenos) se purgan"""
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = capacity
+        self.rate = refill_per_second
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+        self._next_sweep = time.monotonic() + self._full_after
+
+    @property
+    def _full_after(self) -> float:
+        return self.capacity / self.rate
+
+    async def take(self, key: str, cost: float) -> float:
+        """Consume `cost` unidades; devuelve 0 o los segundos a esperar"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+            if tokens >= cost:
+                self._buckets[key] = (tokens - cost, now)
+                wait = 0.0
+            else:
+                self._buckets[key] = (tokens, now)
+                wait = (cost - tokens) / self.rate
+            if now >= self._next_sweep:
+                self._sweep(now)
+        return wait
+
+    def _sweep(self, now: float) -> None:
+        # Un bucket sin uso por capacity/rate segundos está lleno: equivale a no tenerlo
+        cutoff = now - self._full_after
+        self._buckets = {k: v for k, v in self._buckets.items() if v[1] > cutoff}
+        self._next_sweep = now + self._full_after
+
+
+class RedisBucketStore:
+    """Buckets compartidos en Redis; la actualización es atómica con un script Lua"""
+
+    SCRIPT = """
+    local capacity, rate, cost, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local tokens = tonumber(bucket[1]) or capacity
+    local updated = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+    local wait = 0
+    if tokens >= cost then tokens = tokens - cost else wait = (cost - tokens) / rate end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+    return tostring(wait)
+    """
+
+    def __init__(self, url: str, capacity: float, refill_per_second: float):
+        import redis.asyncio
+
+        self.capacity = capacity
+        self.rate = refill_per_second
+        self._client = redis.asyncio.Redis.from_url(url, socket_timeout=0.05)
+        self._script = self._client.register_script(self.SCRIPT)
+
+    async def take(self, key: str, cost: float) -> float:
+        try:
+            wait = await self._script(
+                keys=[f"admission:{key}"], args=[self.capacity, self.rate, cost, time.time()]
+            )
+            return float(wait)
+        except Exception:
+            # Si el store no responde se deja pasar: mejor sin límite que sin servicio
+            logger.exception("No se pudo consultar el bucket en Redis")
+            return 0.0
+
+
+def create_store():
+    if settings.ADMISSION_BACKEND == "redis":
+        return RedisBucketStore(
+            settings.ADMISSION_REDIS_URL,
+            settings.ADMISSION_BUCKET_CAPACITY,
+            settings.ADMISSION_REFILL_PER_SECOND,
+        )
+    return MemoryBucketStore(settings.ADMISSION_BUCKET_CAPACITY, settings.ADMISSION_REFILL_PER_SECOND)
+
+
+def client_key(scope) -> str:
+    """Usuario del token si es válido; si no, la IP del cliente"""
+    headers = dict(scope["headers"])
+    authorization = headers.get(b"authorization", b"")
+    if authorization[:7].lower() == b"bearer ":
+        from app.core.security import decode_access_token
+
+        payload = decode_access_token(authorization[7:].decode("latin-1"))
+        if payload and payload.get("sub"):
+            return "user:" + hashlib.sha1(str(payload["sub"]).encode()).hexdigest()[:16]
+    forwarded = headers.get(b"x-forwarded-for")
+    if forwarded and settings.ADMISSION_TRUST_FORWARDED:
+        return "ip:" + forwarded.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return "ip:" + (client[0] if client else "unknown")
+
+
+class AdmissionMiddleware:
+    """Middleware ASGI puro: decide antes de tocar la aplicación"""
+
+    def __init__(self, app, store=None):
+        self.app = app
+        self.store = store or create_store()
+        self._in_flight: Dict[str, int] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "OPTIONS" or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        rule, cost = rule_for(scope["method"], scope["path"], scope.get("query_string", b""))
+        in_flight = self._in_flight.get(rule.name, 0)
+        if rule.max_in_flight is not None and in_flight >= rule.max_in_flight:
+            await self._reject(send, 503, 1, rule, "Servidor ocupado, intenta nuevamente")
+            return
+
+        # Se ocupa el lugar antes del await del store: si no, los requests
+        # que esperan a Redis a la vez pasan todos el tope con el mismo valor
+        self._in_flight[rule.name] = in_flight + 1
+        try:
+            wait = await self.store.take(client_key(scope), cost)
+            if wait > 0:
+                await self._reject(send, 429, wait, rule, "Demasiadas solicitudes")
+                return
+            await self.app(scope, receive, send)
+        finally:
+            self._in_flight[rule.name] -= 1
+
+    async def _reject(self, send, status: int, retry_after: float, rule: Rule, detail: str) -> None:
+        metrics.admission_rejected.inc(rule.name, str(status))
+        body = json.dumps({"detail": detail}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,96 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+from app.core import metrics
+from app.core.config import settings
+from app.core.invalidation import RESYNC_ENTITY, Invalidation, bus
+from app.core.singleflight import SingleFlight
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Caché LRU en memoria con expiración por entrada.
+
+    Pensado para lecturas públicas muy repetidas (categorías, listado de
+    servicios). Los aciertos y fallos se publican en /metrics.
+    """
+
+    def __init__(self, name: str, ttl_seconds: float, max_entries: int = 256):
+        self.name = name
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # Se incrementa en cada clear(): un lector que calculó un valor antes
+        # de una invalidación no debe volver a guardarlo
+        self.generation = 0
+        self.cleared_at = float("-inf")
+        metrics.register_cache(name, self.stats)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING and entry[0] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not _MISSING:
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(
+        self, key: Hashable, value: Any, ttl: Optional[float] = None, generation: Optional[int] = None
+    ) -> None:
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.generation += 1
+            self.cleared_at = time.monotonic()
+
+    def stats(self) -> Tuple[int, int]:
+        return self.hits, self.misses
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+category_cache = TTLCache("categories", settings.CATEGORY_CACHE_TTL_SECONDS, max_entries=32)
+service_list_cache = TTLCache("services_list", settings.SERVICE_LIST_CACHE_TTL_SECONDS)
+# Debajo de cada caché: con el caché frío, un solo request por clave consulta
+category_flight = SingleFlight("categories")
+service_list_flight = SingleFlight("services_list")
+
+
+# Entidades cuyo cambio altera el listado de servicios: el propio servicio,
+# las reseñas (rating) y los usuarios (nombre del dueño, bajas en cascada)
+SERVICE_LIST_DEPENDENCIES = {"services", "reviews", "users"}
+
+
+def _on_invalidation(message: Invalidation) -> None:
+    if message.entity == RESYNC_ENTITY:
+        category_cache.clear()
+        service_list_cache.clear()
+    elif message.entity == "categories":
+        category_cache.clear()
+    elif message.entity in SERVICE_LIST_DEPENDENCIES:
+        service_list_cache.clear()
+
+
+bus.subscribe(_on_invalidation)
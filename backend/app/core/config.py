@@ -1,4 +1,5 @@
 import os
+from typing import Optional
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -23,6 +24,23 @@ class Settings(BaseSettings):
         )
     )
     
+    # Costo de bcrypt (2^N iteraciones). Elegirlo con
+    # `python -m benchmarks.bcrypt_cost --target-ms 250` en el hardware real;
+    # los hashes con otro costo se recalculan en segundo plano al hacer login
+    BCRYPT_ROUNDS: int = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+    
+    # Eliminación de cuentas (DELETE /users/me): con 1 la cuenta se desactiva
+    # al instante y el borrado de servicios y reseñas corre en segundo plano
+    ACCOUNT_DELETION_IN_BACKGROUND: bool = os.environ.get("ACCOUNT_DELETION_IN_BACKGROUND", "0") == "1"
+    
+    # Refresh tokens (rotan en cada uso) y filtro de revocación en memoria
+    REFRESH_TOKEN_EXPIRE_DAYS: int = int(os.environ.get("REFRESH_TOKEN_EXPIRE_DAYS", "14"))
+    REVOCATION_BLOOM_BITS: int = int(os.environ.get("REVOCATION_BLOOM_BITS", str(1 << 20)))
+    REVOCATION_BLOOM_HASHES: int = int(os.environ.get("REVOCATION_BLOOM_HASHES", "7"))
+    # Cada cuánto se leen revocaciones nuevas de otros workers y se reconstruye el filtro
+    REVOCATION_REFRESH_SECONDS: float = float(os.environ.get("REVOCATION_REFRESH_SECONDS", "5"))
+    REVOCATION_REBUILD_SECONDS: float = float(os.environ.get("REVOCATION_REBUILD_SECONDS", "3600"))
+    
     # DATABASE_URL: usar variable de entorno (Postgres en producción)
     # Si no existe, fallback a SQLite local para desarrollo
     SQLALCHEMY_DATABASE_URL: str = os.environ.get(
@@ -30,11 +48,176 @@ class Settings(BaseSettings):
         "sqlite:///./map_project.db"
     )
     
+    # Réplicas de lectura (URLs separadas por coma, vacío = todo al primario).
+    # Las lecturas públicas van a las réplicas en round-robin; un usuario que
+    # acaba de escribir lee del primario durante REPLICA_STICKY_SECONDS
+    DATABASE_REPLICA_URLS: str = os.environ.get("DATABASE_REPLICA_URLS", "")
+    REPLICA_STICKY_SECONDS: float = float(os.environ.get("REPLICA_STICKY_SECONDS", "5"))
+    # Una réplica que falla queda fuera de rotación y se vuelve a probar tras este intervalo
+    REPLICA_HEALTH_CHECK_SECONDS: float = float(os.environ.get("REPLICA_HEALTH_CHECK_SECONDS", "5"))
+
+    @property
+    def database_replica_urls(self) -> list[str]:
+        return [u.strip() for u in self.DATABASE_REPLICA_URLS.split(",") if u.strip()]
+
+    # Ejecuciones de una misma consulta antes de prepararla en Postgres
+    # (psycopg 3); "none" desactiva las sentencias preparadas
+    DB_PREPARE_THRESHOLD: str = os.environ.get("DB_PREPARE_THRESHOLD", "1")
+
+    @property
+    def db_prepare_threshold(self) -> Optional[int]:
+        value = self.DB_PREPARE_THRESHOLD.strip().lower()
+        return None if value in ("", "none") else int(value)
+    
     # Orígenes permitidos para CORS en producción (separados por coma)
     CORS_ORIGINS: list[str] = [
         o.strip() for o in os.environ.get("CORS_ORIGINS", "").split(",") if o.strip()
     ]
 
+    # Instrumentación de consultas: cabeceras Server-Timing y log por request
+    # (apagada por defecto; LOG_SAMPLE_RATE es la fracción de requests que se
+    # registran, los avisos de N+1 siempre). Las consultas que superan el
+    # umbral se registran junto a su plan (EXPLAIN, calculado en segundo
+    # plano y a lo más una vez por sentencia cada EXPLAIN_INTERVAL segundos).
+    QUERY_INSTRUMENTATION: bool = os.environ.get("QUERY_INSTRUMENTATION", "0") == "1"
+    QUERY_LOG_SAMPLE_RATE: float = float(os.environ.get("QUERY_LOG_SAMPLE_RATE", "1"))
+    SLOW_QUERY_THRESHOLD_MS: float = float(os.environ.get("SLOW_QUERY_THRESHOLD_MS", "100"))
+    SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS: float = float(
+        os.environ.get("SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS", "300")
+    )
+    # Veces que una misma sentencia puede repetirse en un request antes de avisar (N+1)
+    REPEATED_QUERY_WARNING: int = int(os.environ.get("REPEATED_QUERY_WARNING", "10"))
+
+    # Métricas Prometheus en /metrics y cacheo del probe de readiness (/ready)
+    METRICS_ENABLED: bool = os.environ.get("METRICS_ENABLED", "1") == "1"
+    READINESS_CACHE_SECONDS: float = float(os.environ.get("READINESS_CACHE_SECONDS", "5"))
+
+    # Profiling en producción (desactivado por defecto, costo nulo si está apagado).
+    # El muestreo de stacks requiere un usuario cuyo email esté en ADMIN_EMAILS;
+    # el profiling por request requiere la cabecera X-Profile-Token = PROFILING_TOKEN.
+    PROFILING_ENABLED: bool = os.environ.get("PROFILING_ENABLED", "0") == "1"
+    PROFILING_TOKEN: str = os.environ.get("PROFILING_TOKEN", "")
+    PROFILING_MAX_SECONDS: float = float(os.environ.get("PROFILING_MAX_SECONDS", "30"))
+    PROFILING_TOP_FUNCTIONS: int = int(os.environ.get("PROFILING_TOP_FUNCTIONS", "40"))
+    # Emails separados por coma (se guarda como texto: BaseSettings intentaría
+    # parsear una lista desde la variable de entorno como JSON)
+    ADMIN_EMAILS: str = os.environ.get("ADMIN_EMAILS", "")
+
+    @property
+    def admin_emails(self) -> set[str]:
+        return {e.strip().lower() for e in self.ADMIN_EMAILS.split(",") if e.strip()}
+
+    # Tamaño máximo de página en los listados (?limit=)
+    MAX_PAGE_SIZE: int = int(os.environ.get("MAX_PAGE_SIZE", "200"))
+
+    # Cachés en memoria de lecturas públicas y warm-up al arrancar el worker
+    CATEGORY_CACHE_TTL_SECONDS: float = float(os.environ.get("CATEGORY_CACHE_TTL_SECONDS", "3600"))
+    SERVICE_LIST_CACHE_TTL_SECONDS: float = float(os.environ.get("SERVICE_LIST_CACHE_TTL_SECONDS", "30"))
+    # Índice columnar en memoria (NumPy) para el listado con filtros
+    # combinados; se reconstruye completo cada REBUILD segundos en segundo plano
+    SERVICE_INDEX_ENABLED: bool = os.environ.get("SERVICE_INDEX_ENABLED", "1") == "1"
+    SERVICE_INDEX_REBUILD_SECONDS: float = float(os.environ.get("SERVICE_INDEX_REBUILD_SECONDS", "600"))
+    # Requests idénticos concurrentes comparten una sola consulta; los que
+    # esperan responden 503 si el cálculo en curso tarda más que esto
+    SINGLE_FLIGHT_TIMEOUT_SECONDS: float = float(os.environ.get("SINGLE_FLIGHT_TIMEOUT_SECONDS", "10"))
+    WARMUP_ENABLED: bool = os.environ.get("WARMUP_ENABLED", "1") == "1"
+    WARMUP_POOL_CONNECTIONS: int = int(os.environ.get("WARMUP_POOL_CONNECTIONS", "5"))
+
+    # Límites de comunas (GeoJSON local) para asignar services.district_id;
+    # el ID y el nombre de cada comuna se leen de estas propiedades
+    DISTRICTS_GEOJSON_PATH: str = os.environ.get("DISTRICTS_GEOJSON_PATH", "")
+    DISTRICTS_ID_PROPERTY: str = os.environ.get("DISTRICTS_ID_PROPERTY", "id")
+    DISTRICTS_NAME_PROPERTY: str = os.environ.get("DISTRICTS_NAME_PROPERTY", "name")
+
+    # Contadores de vistas y contactos: se acumulan en memoria y se escriben
+    # en service_stats cada FLUSH segundos (es lo que se pierde si el proceso
+    # muere). MAX_KEYS acota los servicios distintos por hilo en un intervalo.
+    # La popularidad para ordenar es vistas + CONTACT_WEIGHT × contactos
+    SERVICE_STATS_FLUSH_SECONDS: float = float(os.environ.get("SERVICE_STATS_FLUSH_SECONDS", "5"))
+    SERVICE_STATS_MAX_KEYS: int = int(os.environ.get("SERVICE_STATS_MAX_KEYS", "200000"))
+    SERVICE_STATS_CONTACT_WEIGHT: float = float(os.environ.get("SERVICE_STATS_CONTACT_WEIGHT", "10"))
+
+    # Estadísticas de precio por categoría, modalidad y celda geohash
+    # (PRECISION caracteres; 5 ≈ 5 km): sketches de cuantiles con error
+    # relativo RELATIVE_ACCURACY, mantenidos en memoria al escribir servicios
+    PRICE_STATS_ENABLED: bool = os.environ.get("PRICE_STATS_ENABLED", "1") == "1"
+    PRICE_STATS_RELATIVE_ACCURACY: float = float(os.environ.get("PRICE_STATS_RELATIVE_ACCURACY", "0.01"))
+    PRICE_STATS_GEOHASH_PRECISION: int = int(os.environ.get("PRICE_STATS_GEOHASH_PRECISION", "5"))
+
+    # Servicios similares cercanos: NEIGHBORS por servicio, precalculados
+    # comparando solo dentro de bloques de celdas geohash (PRECISION
+    # caracteres) y actualizados en segundo plano al escribir servicios.
+    # DISTANCE_SCALE_KM: a esa distancia el aporte de la cercanía cae a la mitad
+    SIMILAR_ENABLED: bool = os.environ.get("SIMILAR_ENABLED", "1") == "1"
+    SIMILAR_NEIGHBORS: int = int(os.environ.get("SIMILAR_NEIGHBORS", "5"))
+    SIMILAR_GEOHASH_PRECISION: int = int(os.environ.get("SIMILAR_GEOHASH_PRECISION", "5"))
+    SIMILAR_DISTANCE_SCALE_KM: float = float(os.environ.get("SIMILAR_DISTANCE_SCALE_KM", "2"))
+    SIMILAR_QUEUE_SIZE: int = int(os.environ.get("SIMILAR_QUEUE_SIZE", "10000"))
+
+    # Demanda de búsquedas: cada búsqueda del listado entra a una cola
+    # acotada (si está llena se descarta) y se resume cada FLUSH segundos en
+    # search_demand por celda geohash (PRECISION caracteres) × categoría ×
+    # hora; las horas más antiguas que RETENTION_DAYS se purgan
+    SEARCH_DEMAND_ENABLED: bool = os.environ.get("SEARCH_DEMAND_ENABLED", "1") == "1"
+    SEARCH_DEMAND_QUEUE_SIZE: int = int(os.environ.get("SEARCH_DEMAND_QUEUE_SIZE", "50000"))
+    SEARCH_DEMAND_FLUSH_SECONDS: float = float(os.environ.get("SEARCH_DEMAND_FLUSH_SECONDS", "10"))
+    SEARCH_DEMAND_GEOHASH_PRECISION: int = int(os.environ.get("SEARCH_DEMAND_GEOHASH_PRECISION", "6"))
+    SEARCH_DEMAND_RETENTION_DAYS: int = int(os.environ.get("SEARCH_DEMAND_RETENTION_DAYS", "90"))
+    # Tope de celdas que devuelve /analytics/demand
+    SEARCH_DEMAND_MAX_CELLS: int = int(os.environ.get("SEARCH_DEMAND_MAX_CELLS", "5000"))
+
+    # Búsquedas guardadas con aviso: índice inverso en memoria por categoría
+    # y celda de la grilla (CELL_DEGREES grados; los círculos que cubren más
+    # de MAX_CELLS celdas se indexan solo por categoría)
+    SAVED_SEARCH_ENABLED: bool = os.environ.get("SAVED_SEARCH_ENABLED", "1") == "1"
+    SAVED_SEARCH_MAX_PER_USER: int = int(os.environ.get("SAVED_SEARCH_MAX_PER_USER", "20"))
+    SAVED_SEARCH_MAX_RADIUS_KM: float = float(os.environ.get("SAVED_SEARCH_MAX_RADIUS_KM", "100"))
+    SAVED_SEARCH_CELL_DEGREES: float = float(os.environ.get("SAVED_SEARCH_CELL_DEGREES", "0.05"))
+    SAVED_SEARCH_MAX_CELLS: int = int(os.environ.get("SAVED_SEARCH_MAX_CELLS", "64"))
+    SAVED_SEARCH_QUEUE_SIZE: int = int(os.environ.get("SAVED_SEARCH_QUEUE_SIZE", "10000"))
+    # Entrega de avisos: log (logger y, si se indica, archivo JSON lines en
+    # SAVED_SEARCH_LOG_PATH), webhook (POST JSON a SAVED_SEARCH_WEBHOOK_URL) o none
+    SAVED_SEARCH_NOTIFIER: str = os.environ.get("SAVED_SEARCH_NOTIFIER", "log")
+    SAVED_SEARCH_LOG_PATH: str = os.environ.get("SAVED_SEARCH_LOG_PATH", "")
+    SAVED_SEARCH_WEBHOOK_URL: str = os.environ.get("SAVED_SEARCH_WEBHOOK_URL", "")
+
+    # Bus de invalidación entre workers: none (un worker), socket (varios
+    # procesos en el mismo host) o postgres (LISTEN/NOTIFY)
+    INVALIDATION_BACKEND: str = os.environ.get("INVALIDATION_BACKEND", "none")
+    INVALIDATION_SOCKET_DIR: str = os.environ.get("INVALIDATION_SOCKET_DIR", "")
+    INVALIDATION_CHANNEL: str = os.environ.get("INVALIDATION_CHANNEL", "mapa_invalidation")
+
+    # Feed SSE de cambios de servicios por viewport (/services/stream)
+    SERVICE_STREAM_MAX_CONNECTIONS: int = int(os.environ.get("SERVICE_STREAM_MAX_CONNECTIONS", "1000"))
+    SERVICE_STREAM_QUEUE_SIZE: int = int(os.environ.get("SERVICE_STREAM_QUEUE_SIZE", "100"))
+    SERVICE_STREAM_HEARTBEAT_SECONDS: float = float(os.environ.get("SERVICE_STREAM_HEARTBEAT_SECONDS", "15"))
+    # Tamaño de celda de la grilla de suscriptores y máximo de celdas por
+    # viewport; los viewports más grandes se revisan uno a uno
+    SERVICE_STREAM_CELL_DEGREES: float = float(os.environ.get("SERVICE_STREAM_CELL_DEGREES", "0.25"))
+    SERVICE_STREAM_MAX_CELLS: int = int(os.environ.get("SERVICE_STREAM_MAX_CELLS", "256"))
+
+    # Sincronización incremental (/services/changes): la marca de agua se
+    # retrasa SETTLE segundos para no perder transacciones que confirman tarde
+    SERVICE_CHANGES_SETTLE_SECONDS: float = float(os.environ.get("SERVICE_CHANGES_SETTLE_SECONDS", "5"))
+    SERVICE_TOMBSTONE_RETENTION_DAYS: int = int(os.environ.get("SERVICE_TOMBSTONE_RETENTION_DAYS", "30"))
+
+    # Control de admisión: token bucket por usuario/IP (backend memory o
+    # redis, este último requiere el paquete redis) y tope de requests en curso.
+    # Apagado por defecto: detrás de un proxy reverso todos los anónimos
+    # comparten la IP del proxy y un solo bucket, así que al activarlo ahí
+    # hay que activar también ADMISSION_TRUST_FORWARDED
+    ADMISSION_ENABLED: bool = os.environ.get("ADMISSION_ENABLED", "0") == "1"
+    ADMISSION_BACKEND: str = os.environ.get("ADMISSION_BACKEND", "memory")
+    ADMISSION_REDIS_URL: str = os.environ.get("ADMISSION_REDIS_URL", "redis://localhost:6379/0")
+    ADMISSION_BUCKET_CAPACITY: float = float(os.environ.get("ADMISSION_BUCKET_CAPACITY", "60"))
+    ADMISSION_REFILL_PER_SECOND: float = float(os.environ.get("ADMISSION_REFILL_PER_SECOND", "10"))
+    ADMISSION_MAX_IN_FLIGHT: int = int(os.environ.get("ADMISSION_MAX_IN_FLIGHT", "200"))
+    ADMISSION_BCRYPT_MAX_IN_FLIGHT: int = int(
+        os.environ.get("ADMISSION_BCRYPT_MAX_IN_FLIGHT", str(2 * (os.cpu_count() or 1)))
+    )
+    # Usar X-Forwarded-For como IP del cliente (solo detrás de un proxy confiable)
+    ADMISSION_TRUST_FORWARDED: bool = os.environ.get("ADMISSION_TRUST_FORWARDED", "0") == "1"
+
     class Config:
         case_sensitive = True
 
@@ -0,0 +1,231 @@
+"""
+Comuna (district) de un servicio a partir de sus coordenadas, sin
+servicios externos.
+
+Los límites administrativos se cargan de un GeoJSON local
+(DISTRICTS_GEOJSON_PATH; FeatureCollection de Polygon/MultiPolygon). Cada
+polígono entra con su bounding box en un R-tree estático empaquetado con
+Sort-Tile-Recursive: ubicar un punto revisa solo las cajas que lo
+contienen y hace el test exacto de punto en polígono (ray casting) sobre
+esos pocos candidatos.
+
+La comuna se asigna al guardar el servicio (evento del mapper en
+app.db.base) y queda en services.district_id, indexada: filtrar por
+?district= es una igualdad sobre un índice, sin geometría por consulta.
+Los servicios existentes se completan con:
+
+    python -m app.core.districts            # solo los que no tienen comuna
+    python -m app.core.districts --all      # recalcula todos (límites nuevos)
+
+Sin archivo configurado el índice queda vacío y district_id en NULL.
+"""
+
+import argparse
+import json
+import logging
+import math
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger("app.districts")
+
+# (min_x, min_y, max_x, max_y) en grados: x = longitud, y = latitud
+BBox = Tuple[float, float, float, float]
+Ring = List[Tuple[float, float]]
+
+
+def _bbox(points: Sequence[Tuple[float, float]]) -> BBox:
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def _union(boxes: Sequence[BBox]) -> BBox:
+    return (
+        min(b[0] for b in boxes), min(b[1] for b in boxes),
+        max(b[2] for b in boxes), max(b[3] for b in boxes),
+    )
+
+
+class RTree:
+    """R-tree estático (Sort-Tile-Recursive) sobre bounding boxes"""
+
+    def __init__(self, entries: Sequence[Tuple[BBox, Any]], node_size: int = 16):
+        self.size = len(entries)
+        # (bbox, hijo, es_elemento): en el último nivel el hijo es el elemento
+        nodes = [(bbox, item, True) for bbox, item in entries]
+        while len(nodes) > node_size:
+            nodes = [(_union([n[0] for n in group]), group, False) for group in self._pack(nodes, node_size)]
+        self._root = nodes
+
+    @staticmethod
+    def _pack(nodes: List[tuple], node_size: int) -> List[List[tuple]]:
+        """Agrupa los nodos de un nivel: franjas por x y, dentro, tandas por y"""
+        leaves = math.ceil(len(nodes) / node_size)
+        per_slice = math.ceil(math.sqrt(leaves)) * node_size
+        nodes = sorted(nodes, key=lambda n: n[0][0] + n[0][2])
+        groups = []
+        for i in range(0, len(nodes), per_slice):
+            strip = sorted(nodes[i:i + per_slice], key=lambda n: n[0][1] + n[0][3])
+            groups.extend(strip[j:j + node_size] for j in range(0, len(strip), node_size))
+        return groups
+
+    def query_point(self, x: float, y: float) -> Iterator[Any]:
+        """Elementos cuya caja contiene el punto"""
+        stack = [self._root]
+        while stack:
+            for (min_x, min_y, max_x, max_y), child, is_item in stack.pop():
+                if min_x <= x <= max_x and min_y <= y <= max_y:
+                    if is_item:
+                        yield child
+                    else:
+                        stack.append(child)
+
+    def __len__(self) -> int:
+        return self.size
+
+
+def point_in_polygon(rings: Sequence[Ring], x: float, y: float) -> bool:
+    """
+    Ray casting par-impar sobre todos los anillos (exterior y agujeros):
+    un punto dentro de un agujero cruza un número par de bordes
+    """
+    inside = False
+    for ring in rings:
+        j = len(ring) - 1
+        for i in range(len(ring)):
+            xi, yi = ring[i]
+            xj, yj = ring[j]
+            if (yi > y) != (yj > y) and x < (xj - xi) * (y - yi) / (yj - yi) + xi:
+                inside = not inside
+            j = i
+    return inside
+
+
+@dataclass(frozen=True)
+class District:
+    id: str
+    name: str
+
+
+class DistrictIndex:
+    def __init__(self):
+        self._tree = RTree([])
+        self.districts: Dict[str, District] = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            path = settings.DISTRICTS_GEOJSON_PATH
+            if path:
+                try:
+                    self.load(path)
+                except (OSError, ValueError, KeyError, TypeError):
+                    # Sin límites se sigue sirviendo: district_id queda en NULL
+                    logger.exception("No se pudieron cargar las comunas desde %s", path)
+            self._loaded = True
+
+    def load(self, path: str) -> int:
+        """Carga los límites del GeoJSON; devuelve la cantidad de comunas"""
+        with open(path, encoding="utf-8") as fh:
+            collection = json.load(fh)
+        entries: List[Tuple[BBox, Tuple[str, List[Ring]]]] = []
+        districts: Dict[str, District] = {}
+        for feature in collection["features"]:
+            properties = feature.get("properties") or {}
+            district_id = properties.get(settings.DISTRICTS_ID_PROPERTY, feature.get("id"))
+            geometry = feature.get("geometry") or {}
+            if district_id is None:
+                continue
+            district_id = str(district_id)
+            if geometry.get("type") == "Polygon":
+                polygons = [geometry["coordinates"]]
+            elif geometry.get("type") == "MultiPolygon":
+                polygons = geometry["coordinates"]
+            else:
+                continue
+            # Cada parte de un MultiPolygon con su propia caja: islas y
+            # territorios discontinuos no inflan la caja de la comuna
+            for polygon in polygons:
+                rings = [[(float(p[0]), float(p[1])) for p in ring] for ring in polygon]
+                if rings and rings[0]:
+                    entries.append((_bbox(rings[0]), (district_id, rings)))
+            name = properties.get(settings.DISTRICTS_NAME_PROPERTY) or district_id
+            districts[district_id] = District(district_id, str(name))
+        self._tree = RTree(entries)
+        self.districts = districts
+        logger.info("Comunas cargadas: %d (%d polígonos)", len(districts), len(entries))
+        return len(districts)
+
+    def locate(self, lat: Optional[float], lng: Optional[float]) -> Optional[str]:
+        """ID de la comuna que contiene el punto, o None"""
+        self.ensure_loaded()
+        if lat is None or lng is None:
+            return None
+        for district_id, rings in self._tree.query_point(lng, lat):
+            if point_in_polygon(rings, lng, lat):
+                return district_id
+        return None
+
+    def __len__(self) -> int:
+        return len(self.districts)
+
+
+districts = DistrictIndex()
+
+
+def backfill(db, only_missing: bool = True, batch_size: int = 1000) -> int:
+    """
+    Asigna district_id a los servicios existentes con UPDATEs por lote
+    (executemany); devuelve cuántos cambiaron. Con `only_missing` solo
+    revisa los que no tienen comuna.
+    """
+    from sqlalchemy import bindparam, select, update
+
+    from app.db.base import Service
+
+    districts.ensure_loaded()
+    services = Service.__table__
+    query = select(services.c.id, services.c.latitude, services.c.longitude, services.c.district_id)
+    if only_missing:
+        query = query.where(services.c.district_id.is_(None))
+    changes = []
+    for service_id, lat, lng, current in db.execute(query.order_by(services.c.id)):
+        district_id = districts.locate(lat, lng)
+        if district_id != current:
+            changes.append({"b_id": service_id, "b_district": district_id})
+    stmt = update(services).where(services.c.id == bindparam("b_id")).values(district_id=bindparam("b_district"))
+    for start in range(0, len(changes), batch_size):
+        db.execute(stmt, changes[start:start + batch_size])
+    db.commit()
+    return len(changes)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Asigna la comuna a los servicios existentes")
+    parser.add_argument("--all", action="store_true", help="Recalcular también los que ya tienen comuna")
+    args = parser.parse_args(argv)
+
+    from app.db.session import SessionLocal
+
+    districts.ensure_loaded()
+    if not len(districts):
+        raise SystemExit("Sin comunas: define DISTRICTS_GEOJSON_PATH con un GeoJSON de límites")
+    db = SessionLocal()
+    try:
+        changed = backfill(db, only_missing=not args.all)
+    finally:
+        db.close()
+    print(f"Servicios actualizados: {changed}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Stream de eventos de cambio del dominio.
+
+La capa CRUD emite un ChangeEvent después de cada commit. Los suscriptores
+pueden ser síncronos (se ejecutan en el hilo que escribió, deben ser
+baratos) o asíncronos mediante una cola acotada ligada a un event loop,
+que descarta los eventos más antiguos si el consumidor se atrasa.
+
+Es la base para índices incrementales, cachés y exportaciones sin tener
+que consultar las tablas periódicamente.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, FrozenSet, List, Mapping, Optional, Tuple
+
+logger = logging.getLogger("app.events")
+
+Coords = Tuple[float, float]
+
+
+@dataclass(frozen=True)
+class ChangeEvent:
+    """Cambio confirmado en una entidad (`entity` es el nombre de la tabla)"""
+    entity: str
+    action: str  # create, update, delete
+    entity_id: Any
+    changed_fields: FrozenSet[str]
+    old_coords: Optional[Coords] = None
+    new_coords: Optional[Coords] = None
+    # Valores de columnas tras el cambio (antes del borrado si action=delete)
+    values: Mapping[str, Any] = field(default_factory=dict)
+    # Valores antes del cambio (vacío en create)
+    previous: Mapping[str, Any] = field(default_factory=dict)
+    timestamp: float = field(default_factory=time.time)
+
+
+def _coords(values: Optional[Mapping[str, Any]]) -> Optional[Coords]:
+    if not values or values.get("latitude") is None or values.get("longitude") is None:
+        return None
+    return (values["latitude"], values["longitude"])
+
+
+def build_event(
+    entity: str,
+    action: str,
+    entity_id: Any,
+    before: Optional[Mapping[str, Any]],
+    after: Optional[Mapping[str, Any]],
+) -> ChangeEvent:
+    """Arma el evento a partir de los valores de columnas antes y después"""
+    if before is None:
+        changed = frozenset(after or ())
+    elif after is None:
+        changed = frozenset(before)
+    else:
+        changed = frozenset(k for k, v in after.items() if before.get(k) != v)
+    return ChangeEvent(
+        entity=entity,
+        action=action,
+        entity_id=entity_id,
+        changed_fields=changed,
+        old_coords=_coords(before),
+        new_coords=_coords(after),
+        values=dict(after if after is not None else before or {}),
+        previous=dict(before or {}),
+    )
+
+
+class QueueSubscription:
+    """Suscripción asíncrona con cola acotada ligada a un event loop"""
+
+    def __init__(self, stream: "EventStream", loop: asyncio.AbstractEventLoop, maxsize: int,
+                 predicate: Optional[Callable[[ChangeEvent], bool]]):
+        self._stream = stream
+        self._loop = loop
+        self._predicate = predicate
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def deliver(self, event: ChangeEvent) -> None:
+        """Llamado desde cualquier hilo"""
+        if self._predicate is not None and not self._predicate(event):
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # El loop ya cerró: la suscripción quedó huérfana
+            self.close()
+
+    def _put(self, event: ChangeEvent) -> None:
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def get(self) -> ChangeEvent:
+        return await self.queue.get()
+
+    def close(self) -> None:
+        self._stream.unsubscribe_queue(self)
+
+
+class EventStream:
+    def __init__(self):
+        self._handlers: List[Callable[[ChangeEvent], None]] = []
+        self._queues: List[QueueSubscription] = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, handler: Callable[[ChangeEvent], None]) -> None:
+        """Suscriptor síncrono: corre en el hilo que confirmó la escritura"""
+        with self._lock:
+            self._handlers = self._handlers + [handler]
+
+    def subscribe_queue(
+        self,
+        maxsize: int = 1000,
+        predicate: Optional[Callable[[ChangeEvent], bool]] = None,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+    ) -> QueueSubscription:
+        """Suscriptor asíncrono; debe llamarse desde el event loop consumidor"""
+        subscription = QueueSubscription(self, loop or asyncio.get_running_loop(), maxsize, predicate)
+        with self._lock:
+            self._queues = self._queues + [subscription]
+        return subscription
+
+    def unsubscribe_queue(self, subscription: QueueSubscription) -> None:
+        with self._lock:
+            self._queues = [q for q in self._queues if q is not subscription]
+
+    def publish(self, event: ChangeEvent) -> None:
+        # Las listas se reemplazan (copy-on-write) al suscribir: se leen sin lock
+        for handler in self._handlers:
+            try:
+                handler(event)
+            except Exception:
+                logger.exception("Error en suscriptor de eventos (%s)", event.entity)
+        for subscription in self._queues:
+            subscription.deliver(event)
+
+
+stream = EventStream()
+
+
+def emit(entity: str, action: str, entity_id: Any,
+         before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]]) -> ChangeEvent:
+    event = build_event(entity, action, entity_id, before, after)
+    stream.publish(event)
+    return event
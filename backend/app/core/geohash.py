@@ -0,0 +1,133 @@
+"""
+Geohash: celdas de una grilla jerárquica identificadas por un string
+base32. Cada carácter agrega 5 bits (alternando longitud y latitud), así
+que las celdas de un prefijo son exactamente las contenidas en la celda
+del prefijo y un rango de strings `[prefijo, prefijo + "~")` las recorre
+sobre un índice B-tree.
+
+Tamaño de celda aproximado en el ecuador por precisión:
+5 ≈ 4.9 × 4.9 km, 6 ≈ 1.2 × 0.6 km, 7 ≈ 153 × 153 m.
+"""
+
+from typing import List, Tuple
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_DECODE = {c: i for i, c in enumerate(_BASE32)}
+
+# (min_lat, min_lng, max_lat, max_lng)
+Bounds = Tuple[float, float, float, float]
+
+
+def encode(lat: float, lng: float, precision: int) -> str:
+    lat_lo, lat_hi = -90.0, 90.0
+    lng_lo, lng_hi = -180.0, 180.0
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lng_lo + lng_hi) / 2
+            if lng >= mid:
+                value = value * 2 + 1
+                lng_lo = mid
+            else:
+                value *= 2
+                lng_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                value = value * 2 + 1
+                lat_lo = mid
+            else:
+                value *= 2
+                lat_hi = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits = value = 0
+    return "".join(chars)
+
+
+def bounds(geohash: str) -> Bounds:
+    lat_lo, lat_hi = -90.0, 90.0
+    lng_lo, lng_hi = -180.0, 180.0
+    even = True
+    for char in geohash:
+        value = _DECODE[char]
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            if even:
+                mid = (lng_lo + lng_hi) / 2
+                if bit:
+                    lng_lo = mid
+                else:
+                    lng_hi = mid
+            else:
+                mid = (lat_lo + lat_hi) / 2
+                if bit:
+                    lat_lo = mid
+                else:
+                    lat_hi = mid
+            even = not even
+    return lat_lo, lng_lo, lat_hi, lng_hi
+
+
+def center(geohash: str) -> Tuple[float, float]:
+    min_lat, min_lng, max_lat, max_lng = bounds(geohash)
+    return (min_lat + max_lat) / 2, (min_lng + max_lng) / 2
+
+
+def cell_size(precision: int) -> Tuple[float, float]:
+    """Alto y ancho en grados de una celda de esta precisión"""
+    lng_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lng_bits
+
+
+def cover(min_lat: float, min_lng: float, max_lat: float, max_lng: float,
+          precision: int, max_cells: int) -> List[str]:
+    """
+    Geohashes que cubren el bbox, con la mayor precisión (hasta
+    `precision`) que no pase de `max_cells` celdas. Las celdas pueden
+    salirse del bbox: quien consulta filtra los bordes.
+    """
+    for p in range(precision, 0, -1):
+        height, width = cell_size(p)
+        rows = int(max_lat // height) - int(min_lat // height) + 1
+        cols = int(max_lng // width) - int(min_lng // width) + 1
+        if rows * cols <= max_cells or p == 1:
+            break
+    cells = set()
+    lat = min_lat
+    while True:
+        lng = min_lng
+        while True:
+            cells.add(encode(min(lat, max_lat), min(lng, max_lng), p))
+            if lng >= max_lng:
+                break
+            lng += width
+        if lat >= max_lat:
+            break
+        lat += height
+    return sorted(cells)
+
+
+def intersects(geohash: str, min_lat: float, min_lng: float, max_lat: float, max_lng: float) -> bool:
+    lat0, lng0, lat1, lng1 = bounds(geohash)
+    return lat0 <= max_lat and lat1 >= min_lat and lng0 <= max_lng and lng1 >= min_lng
+
+
+def block(geohash: str) -> List[str]:
+    """La celda y sus 8 vecinas (menos en los polos)"""
+    height, width = cell_size(len(geohash))
+    lat, lng = center(geohash)
+    cells = []
+    for dlat in (-height, 0.0, height):
+        if not -90 <= lat + dlat <= 90:
+            continue
+        for dlng in (-width, 0.0, width):
+            # La longitud da la vuelta en el antimeridiano
+            cells.append(encode(lat + dlat, (lng + dlng + 180) % 360 - 180, len(geohash)))
+    return cells
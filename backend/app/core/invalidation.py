@@ -0,0 +1,355 @@
+"""
+Bus de invalidación entre workers.
+
+Cada evento del dominio (app.core.events) se reenvía como mensaje de
+invalidación; cada proceso lo entrega a sus suscriptores locales (cachés, índices) y lo
+difunde al resto de workers según el backend configurado:
+
+- "none": un solo worker, entrega solo local.
+- "socket": varios procesos en el mismo host, vía sockets Unix de
+  datagramas en INVALIDATION_SOCKET_DIR (uno por proceso).
+- "postgres": varios hosts, vía LISTEN/NOTIFY sobre la base de datos.
+
+Si el backend pierde mensajes (la conexión LISTEN se cortó), al
+recuperarse entrega localmente un mensaje con entity RESYNC_ENTITY: los
+suscriptores descartan todo lo que tengan en memoria.
+
+Los cambios en cascada (p. ej. borrar un usuario con sus servicios y
+reseñas) se publican dentro de `bus.batch()`: cada mensaje se entrega
+localmente al momento, pero se difunden juntos al salir del bloque, en
+lotes que respetan el tamaño máximo de payload del backend.
+"""
+
+import json
+import logging
+import os
+import select
+import socket
+import tempfile
+import threading
+import uuid
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from app.core import events
+from app.core.config import settings
+
+logger = logging.getLogger("app.invalidation")
+
+
+@dataclass(frozen=True)
+class Invalidation:
+    """Cambio en una entidad: `entity` es el nombre de la tabla"""
+    entity: str
+    entity_id: Optional[int]
+    action: str  # create, update, delete
+    origin: str = ""
+    # Ubicación antes y después del cambio, para entidades geolocalizadas
+    old_coords: Optional[Tuple[float, float]] = None
+    new_coords: Optional[Tuple[float, float]] = None
+
+
+Handler = Callable[[Invalidation], None]
+
+# Pudo cambiar cualquier cosa: se perdieron mensajes del bus
+RESYNC_ENTITY = "*"
+
+
+class InvalidationBus:
+    """Backend sin difusión: solo entrega a los suscriptores de este proceso"""
+
+    # Tope de un payload difundido (NOTIFY admite menos de 8000 bytes)
+    MAX_PAYLOAD_BYTES = 7500
+
+    def __init__(self):
+        self.origin = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._handlers: List[Handler] = []
+        # Mensajes pendientes de difundir del bloque batch() de cada hilo
+        self._pending = threading.local()
+
+    def subscribe(self, handler: Handler) -> None:
+        self._handlers.append(handler)
+
+    def publish(
+        self,
+        entity: str,
+        entity_id: Optional[int],
+        action: str,
+        old_coords: Optional[Tuple[float, float]] = None,
+        new_coords: Optional[Tuple[float, float]] = None,
+    ) -> None:
+        message = Invalidation(entity, entity_id, action, self.origin, old_coords, new_coords)
+        self._dispatch(message)
+        pending = getattr(self._pending, "messages", None)
+        if pending is not None:
+            pending.append(message)
+            return
+        try:
+            self._broadcast_all([json.dumps(asdict(message)).encode()])
+        except Exception:
+            # Otros workers quedarán desactualizados hasta el TTL, pero la
+            # escritura ya se confirmó y no debe fallar por esto
+            logger.exception("No se pudo difundir la invalidación %s", message)
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """
+        Agrupa la difusión de lo publicado por este hilo dentro del bloque:
+        la entrega local no cambia, pero al resto de workers les llega en
+        pocos payloads (una sola transacción en postgres) en lugar de uno
+        por mensaje.
+        """
+        if getattr(self._pending, "messages", None) is not None:
+            # Anidado: difunde el bloque exterior
+            yield
+            return
+        self._pending.messages = []
+        try:
+            yield
+        finally:
+            messages, self._pending.messages = self._pending.messages, None
+            if messages:
+                try:
+                    self._broadcast_all(self._pack(messages))
+                except Exception:
+                    logger.exception("No se pudo difundir un lote de %d invalidaciones", len(messages))
+
+    def _pack(self, messages: List[Invalidation]) -> List[bytes]:
+        """Arma payloads {"origin", "batch"} de hasta MAX_PAYLOAD_BYTES"""
+        payloads: List[bytes] = []
+        head = json.dumps({"origin": self.origin, "batch": []}).encode()
+        items: List[bytes] = []
+        size = len(head)
+        for message in messages:
+            data = asdict(message)
+            del data["origin"]
+            item = json.dumps(data).encode()
+            if items and size + len(item) + 1 > self.MAX_PAYLOAD_BYTES:
+                payloads.append(head[:-2] + b",".join(items) + head[-2:])
+                items, size = [], len(head)
+            items.append(item)
+            size += len(item) + 1
+        payloads.append(head[:-2] + b",".join(items) + head[-2:])
+        return payloads
+
+    def start(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+    def _resync(self) -> None:
+        self._dispatch(Invalidation(RESYNC_ENTITY, None, "resync", self.origin))
+
+    def _dispatch(self, message: Invalidation) -> None:
+        for handler in self._handlers:
+            try:
+                handler(message)
+            except Exception:
+                logger.exception("Error en suscriptor de invalidación")
+
+    def _broadcast_all(self, payloads: List[bytes]) -> None:
+        for payload in payloads:
+            self._broadcast(payload)
+
+    def _broadcast(self, payload: bytes) -> None:
+        pass
+
+    def _receive(self, payload: bytes) -> None:
+        data = json.loads(payload)
+        if data.get("origin") == self.origin:
+            return
+        if "batch" in data:
+            for item in data["batch"]:
+                self._dispatch(self._message(dict(item, origin=data["origin"])))
+        else:
+            self._dispatch(self._message(data))
+
+    @staticmethod
+    def _message(data: Dict) -> Invalidation:
+        for key in ("old_coords", "new_coords"):
+            if data.get(key) is not None:
+                data[key] = tuple(data[key])
+        return Invalidation(**data)
+
+
+class SocketInvalidationBus(InvalidationBus):
+    """
+    Cada proceso escucha en su propio socket Unix de datagramas dentro de un
+    directorio compartido; publicar es un sendto() a cada socket vecino.
+    Los sockets de procesos muertos se eliminan al primer envío fallido.
+    El envío no bloquea: si el buffer de un vecino está lleno, ese vecino
+    pierde el mensaje (queda desactualizado hasta el TTL) y el request que
+    escribió no espera.
+    """
+
+    def __init__(self, directory: str):
+        super().__init__()
+        self.directory = directory
+        self.path = os.path.join(directory, f"{self.origin}.sock")
+        self._sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sender.setblocking(False)
+        self._listener: Optional[socket.socket] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    def start(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._listener.bind(self.path)
+        self._listener.settimeout(1.0)
+        self._thread = threading.Thread(target=self._listen, name="invalidation-socket", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+        if self._listener:
+            self._listener.close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def _listen(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                payload = self._listener.recv(65536)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            try:
+                self._receive(payload)
+            except Exception:
+                logger.exception("Mensaje de invalidación inválido")
+
+    def _broadcast(self, payload: bytes) -> None:
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+        for name in names:
+            path = os.path.join(self.directory, name)
+            if not name.endswith(".sock") or path == self.path:
+                continue
+            try:
+                self._sender.sendto(payload, path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Nadie escucha: el proceso dueño terminó sin limpiar
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+            except BlockingIOError:
+                logger.warning("Buffer lleno en %s: se descarta la invalidación para ese worker", name)
+            except OSError:
+                # Un vecino con problemas no impide avisar a los demás
+                logger.exception("No se pudo enviar la invalidación a %s", name)
+
+
+class PostgresInvalidationBus(InvalidationBus):
+    """
+    LISTEN/NOTIFY: una conexión dedicada escucha; NOTIFY usa el pool. Si la
+    conexión se corta (p. ej. reinicio de la base) se reconecta con backoff
+    exponencial y, como las notificaciones de mientras se perdieron, se
+    entrega un RESYNC_ENTITY local.
+    """
+
+    # Espera entre reintentos de conexión: de 1 s, duplicando hasta 30 s
+    RECONNECT_MIN_SECONDS = 1.0
+    RECONNECT_MAX_SECONDS = 30.0
+
+    def __init__(self, channel: str):
+        super().__init__()
+        self.channel = channel
+        self._conn = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    def _connect(self) -> None:
+        import psycopg
+        from app.db.session import engine
+
+        url = engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+        conn = psycopg.connect(url, autocommit=True)
+        conn.add_notify_handler(lambda notify: self._receive(notify.payload.encode()))
+        conn.execute(f'LISTEN "{self.channel}"')
+        self._conn = conn
+
+    def _disconnect(self) -> None:
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def start(self) -> None:
+        self._connect()
+        self._thread = threading.Thread(target=self._listen, name="invalidation-pg", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+        self._disconnect()
+
+    def _listen(self) -> None:
+        # psycopg entrega las notificaciones al procesar cualquier resultado:
+        # se espera actividad en el socket y se ejecuta una consulta vacía
+        delay = self.RECONNECT_MIN_SECONDS
+        while not self._stopping.is_set():
+            try:
+                if self._conn is None:
+                    self._connect()
+                    logger.info("Conexión LISTEN de invalidación restablecida")
+                    self._resync()
+                    delay = self.RECONNECT_MIN_SECONDS
+                ready, _, _ = select.select([self._conn.fileno()], [], [], 1.0)
+                if ready:
+                    self._conn.execute("SELECT 1")
+            except Exception:
+                if self._stopping.is_set():
+                    break
+                logger.exception("Se perdió la conexión LISTEN de invalidación; reintento en %.0f s", delay)
+                self._disconnect()
+                self._stopping.wait(delay)
+                delay = min(delay * 2, self.RECONNECT_MAX_SECONDS)
+
+    def _broadcast_all(self, payloads: List[bytes]) -> None:
+        # Todos los NOTIFY de un lote en una sola transacción
+        from sqlalchemy import text
+        from app.db.session import engine
+
+        with engine.begin() as conn:
+            for payload in payloads:
+                conn.execute(
+                    text("SELECT pg_notify(:channel, :payload)"),
+                    {"channel": self.channel, "payload": payload.decode()},
+                )
+
+
+def create_bus() -> InvalidationBus:
+    backend = settings.INVALIDATION_BACKEND
+    if backend == "socket":
+        directory = settings.INVALIDATION_SOCKET_DIR or os.path.join(
+            tempfile.gettempdir(), "mapa-invalidation"
+        )
+        return SocketInvalidationBus(directory)
+    if backend == "postgres":
+        return PostgresInvalidationBus(settings.INVALIDATION_CHANNEL)
+    return InvalidationBus()
+
+
+bus = create_bus()
+
+
+def _forward(event: events.ChangeEvent) -> None:
+    bus.publish(event.entity, event.entity_id, event.action, event.old_coords, event.new_coords)
+
+
+events.stream.subscribe(_forward)
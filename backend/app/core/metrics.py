@@ -0,0 +1,325 @@
+"""
+Métricas en formato de texto de Prometheus.
+
+Los contadores e histogramas se acumulan en shards por hilo: cada hilo
+escribe solo en su propio dict, sin locks, y el scrape de /metrics suma
+los shards. El middleware HTTP corre siempre en el hilo del event loop,
+así que el camino caliente nunca compite por un lock.
+"""
+
+import logging
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("app.metrics")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelKey = Tuple[str, ...]
+
+
+class _Sharded:
+    """Un dict por hilo; solo el scrape recorre todos los shards"""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards: List[dict] = []
+        self._lock = threading.Lock()
+
+    def shard(self) -> dict:
+        try:
+            return self._local.data
+        except AttributeError:
+            data = self._local.data = {}
+            with self._lock:
+                self._shards.append(data)
+            return data
+
+    def snapshot(self) -> List[dict]:
+        with self._lock:
+            shards = list(self._shards)
+        copies = []
+        for data in shards:
+            # Un hilo puede agregar una clave mientras copiamos; reintentar es barato
+            while True:
+                try:
+                    copies.append(dict(data))
+                    break
+                except RuntimeError:
+                    continue
+        return copies
+
+
+class Counter(_Sharded):
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        super().__init__()
+        self.name, self.help, self.labels = name, help_text, labels
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        data = self.shard()
+        data[label_values] = data.get(label_values, 0.0) + amount
+
+    def collect(self) -> Dict[LabelKey, float]:
+        totals: Dict[LabelKey, float] = {}
+        for data in self.snapshot():
+            for key, value in data.items():
+                totals[key] = totals.get(key, 0.0) + value
+        return totals
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self.collect().items()):
+            lines.append(f"{self.name}{_labels(self.labels, key)} {_num(value)}")
+        return lines
+
+
+class Histogram(_Sharded):
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        super().__init__()
+        self.name, self.help, self.labels = name, help_text, labels
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *label_values: str) -> None:
+        data = self.shard()
+        entry = data.get(label_values)
+        if entry is None:
+            # [conteo por bucket..., +Inf, suma]
+            entry = data[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+        entry[bisect_left(self.buckets, value)] += 1
+        entry[-1] += value
+
+    def render(self) -> List[str]:
+        merged: Dict[LabelKey, list] = {}
+        for data in self.snapshot():
+            for key, entry in data.items():
+                target = merged.setdefault(key, [0] * (len(self.buckets) + 1) + [0.0])
+                for i, value in enumerate(entry):
+                    target[i] += value
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, entry in sorted(merged.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), entry[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _num(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), key + (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {_num(entry[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """Gauge de valor explícito o calculado en el scrape mediante callback"""
+
+    def __init__(self, name: str, help_text: str, fn: Callable[[], Dict[LabelKey, float]] = None,
+                 labels: Tuple[str, ...] = ()):
+        self.name, self.help, self.labels = name, help_text, labels
+        self._fn = fn
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: int = 1) -> None:
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: int = 1) -> None:
+        with self._lock:
+            self._value -= amount
+
+    @property
+    def value(self) -> int:
+        return self._value
+
+    def render(self) -> List[str]:
+        values = self._fn() if self._fn else {(): self._value}
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_labels(self.labels, key)} {_num(value)}")
+        return lines
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Tuple[str, ...], values: LabelKey) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+def _num(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+# ============================================
+# Registro de métricas de la aplicación
+# ============================================
+
+_cache_sources: Dict[str, Callable[[], Tuple[int, int]]] = {}
+
+
+def register_cache(name: str, stats: Callable[[], Tuple[int, int]]) -> None:
+    """Registra un caché; `stats` devuelve (hits, misses) acumulados"""
+    _cache_sources[name] = stats
+
+
+def _cache_values(index: int) -> Dict[LabelKey, float]:
+    return {(name,): fn()[index] for name, fn in _cache_sources.items()}
+
+
+def _cache_ratios() -> Dict[LabelKey, float]:
+    ratios = {}
+    for name, fn in _cache_sources.items():
+        hits, misses = fn()
+        ratios[(name,)] = hits / (hits + misses) if hits + misses else 0.0
+    return ratios
+
+
+def _pool_values() -> Dict[LabelKey, float]:
+    from app.db.session import engine
+
+    pool = engine.pool
+    values = {}
+    for state, attr in (("checked_out", "checkedout"), ("checked_in", "checkedin"),
+                        ("overflow", "overflow"), ("size", "size")):
+        fn = getattr(pool, attr, None)
+        if fn is not None:
+            values[(state,)] = fn()
+    return values
+
+
+http_requests = Counter(
+    "http_requests_total", "Requests HTTP atendidos", ("method", "route", "status")
+)
+http_latency = Histogram(
+    "http_request_duration_seconds", "Latencia de requests HTTP", ("method", "route")
+)
+http_in_flight = Gauge("http_requests_in_flight", "Requests HTTP en curso")
+bcrypt_in_flight = Gauge(
+    "bcrypt_operations_in_flight", "Operaciones bcrypt en curso o esperando CPU"
+)
+admission_rejected = Counter(
+    "admission_rejected_total", "Requests rechazados por control de admisión", ("rule", "status")
+)
+stream_connections = Gauge("service_stream_connections", "Conexiones SSE abiertas en /services/stream")
+service_stats_flushed = Counter(
+    "service_stats_flushed_total", "Vistas y contactos sumados a service_stats", ("kind",)
+)
+service_stats_dropped = Counter(
+    "service_stats_dropped_total", "Vistas y contactos descartados (tope de claves o servicio borrado)", ("kind",)
+)
+saved_search_candidates = Counter(
+    "saved_search_candidates_total", "Búsquedas guardadas comparadas con un servicio", ("result",)
+)
+saved_search_notifications = Counter(
+    "saved_search_notifications_total", "Avisos de búsquedas guardadas", ("status",)
+)
+search_demand_events = Counter(
+    "search_demand_events_total", "Búsquedas registradas en la demanda: escritas o descartadas", ("status",)
+)
+singleflight_calls = Counter(
+    "singleflight_calls_total", "Lecturas coalescidas: líderes, seguidores y esperas vencidas", ("group", "role")
+)
+
+REGISTRY = [
+    http_requests,
+    http_latency,
+    http_in_flight,
+    Gauge("db_pool_connections", "Estado del pool de conexiones", _pool_values, ("state",)),
+    Gauge("cache_hits", "Aciertos acumulados por caché", lambda: _cache_values(0), ("cache",)),
+    Gauge("cache_misses", "Fallos acumulados por caché", lambda: _cache_values(1), ("cache",)),
+    Gauge("cache_hit_ratio", "Proporción de aciertos por caché", _cache_ratios, ("cache",)),
+    bcrypt_in_flight,
+    stream_connections,
+    admission_rejected,
+    service_stats_flushed,
+    service_stats_dropped,
+    saved_search_candidates,
+    saved_search_notifications,
+    search_demand_events,
+    singleflight_calls,
+]
+
+
+def render() -> str:
+    """Exposición completa en formato de texto de Prometheus"""
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def route_labels(router) -> Dict[int, str]:
+    """
+    Plantilla completa de cada ruta (con los prefijos de include_router),
+    por id del objeto que queda en scope["route"]. Según la versión de
+    FastAPI ese objeto es una copia que ya trae el prefijo, o la ruta
+    original del router incluido (inclusión perezosa, sin prefijo): en ese
+    caso el prefijo sale de los contextos efectivos del router incluido.
+    """
+    labels: Dict[int, str] = {}
+    owners: Dict[Tuple[str, str], int] = {}
+
+    def add(route, path: str) -> None:
+        key = id(route)
+        if labels.get(key, path) != path:
+            # El mismo router incluido con dos prefijos: no se pueden distinguir
+            logger.warning("Ruta %s incluida como %s y %s; se mide como la primera", route, labels[key], path)
+            return
+        labels[key] = path
+        for method in sorted(getattr(route, "methods", None) or ("*",)):
+            if owners.setdefault((method, path), key) != key:
+                logger.warning("Dos rutas responden %s %s: sus métricas se mezclan", method, path)
+
+    for route in router.routes:
+        contexts = getattr(route, "effective_route_contexts", None)
+        if contexts is not None:
+            for context in contexts():
+                add(context.original_route, context.path_format)
+        elif getattr(route, "path_format", None):
+            add(route, route.path_format)
+    return labels
+
+
+class MetricsMiddleware:
+    """Middleware ASGI puro: mide cada request sin envolver la respuesta"""
+
+    def __init__(self, app):
+        self.app = app
+        # Se arma con el primer request, cuando ya están todas las rutas
+        self._labels: Optional[Dict[int, str]] = None
+
+    def _route_label(self, scope) -> str:
+        route = scope.get("route")
+        if route is None:
+            return "unmatched"
+        if self._labels is None:
+            self._labels = route_labels(scope["app"].router)
+        return self._labels.get(id(route), route.path)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_holder = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder[0] = message["status"]
+            await send(message)
+
+        http_in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            http_in_flight.dec()
+            # Se usa la plantilla de la ruta para no crear una serie por ID
+            path = self._route_label(scope)
+            method = scope["method"]
+            http_requests.inc(method, path, str(status_holder[0]))
+            http_latency.observe(elapsed, method, path)
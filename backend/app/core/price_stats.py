@@ -0,0 +1,266 @@
+"""
+Estadísticas de precio (p25/p50/p75) por categoría, modalidad y zona.
+
+Cada grupo (categoría, price_modality, celda geohash) guarda un sketch de
+cuantiles con error relativo acotado (estilo DDSketch): los precios caen en
+cubetas logarítmicas de razón γ = (1 + α) / (1 - α), así que cualquier
+cuantil se responde con a lo más α de error relativo
+(PRICE_STATS_RELATIVE_ACCURACY). A diferencia de t-digest o KLL, las
+cubetas son solo conteos: dos sketches se combinan sumándolos y un precio
+se quita restando, que es lo que hace falta cuando un servicio cambia de
+precio o se borra.
+
+Consultar un bbox combina los sketches de las celdas que lo tocan, sin
+ordenar filas. Las celdas del borde pueden incluir servicios algo fuera
+del bbox (hasta el tamaño de celda, PRICE_STATS_GEOHASH_PRECISION).
+
+Se actualiza como el índice de servicios: los cambios (stream de eventos y
+bus) marcan servicios como sucios y la siguiente consulta relee solo esas
+filas, quitando el precio anterior y agregando el nuevo.
+"""
+
+import logging
+import math
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from app.core import events, geohash
+from app.core.config import settings
+from app.core.invalidation import RESYNC_ENTITY, Invalidation, bus
+
+logger = logging.getLogger("app.price_stats")
+
+# (categoría en minúsculas, modalidad)
+Group = Tuple[str, str]
+
+
+class QuantileSketch:
+    """Sketch de cuantiles con error relativo acotado, combinable y con bajas"""
+
+    def __init__(self, relative_accuracy: float):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets: Dict[int, int] = {}
+        # Precios 0 (gratis o "a convenir"): log no está definido
+        self.zeros = 0
+        self.count = 0
+
+    def _bucket(self, value: float) -> int:
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def add(self, value: float, count: int = 1) -> None:
+        if value <= 0:
+            self.zeros += count
+        else:
+            bucket = self._bucket(value)
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+        self.count += count
+
+    def remove(self, value: float) -> None:
+        if value <= 0:
+            self.zeros -= 1
+        else:
+            bucket = self._bucket(value)
+            remaining = self.buckets.get(bucket, 0) - 1
+            if remaining > 0:
+                self.buckets[bucket] = remaining
+            else:
+                self.buckets.pop(bucket, None)
+        self.count -= 1
+
+    def merge(self, other: "QuantileSketch") -> None:
+        for bucket, count in other.buckets.items():
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+        self.zeros += other.zeros
+        self.count += other.count
+
+    def quantiles(self, qs: Iterable[float]) -> List[Optional[float]]:
+        """Cuantiles pedidos (en orden creciente) en una sola pasada por las cubetas"""
+        if self.count <= 0:
+            return [None for _ in qs]
+        ranks = [q * (self.count - 1) for q in qs]
+        result: List[Optional[float]] = []
+        seen = self.zeros
+        buckets = iter(sorted(self.buckets.items()))
+        bucket = None
+        for rank in ranks:
+            if rank < self.zeros:
+                result.append(0.0)
+                continue
+            while seen <= rank:
+                bucket, count = next(buckets)
+                seen += count
+            # Punto medio (en escala relativa) de la cubeta (γ^(i-1), γ^i]
+            result.append(2 * self.gamma ** bucket / (self.gamma + 1))
+        return result
+
+    def __len__(self) -> int:
+        return self.count
+
+
+@dataclass
+class PriceSummary:
+    category: str
+    price_modality: str
+    count: int
+    p25: float
+    p50: float
+    p75: float
+
+
+class PriceStats:
+    def __init__(self):
+        self._groups: Dict[Group, Dict[str, QuantileSketch]] = {}
+        # Nombre de categoría tal como está en los servicios, por grupo
+        self._names: Dict[str, str] = {}
+        # service_id → (grupo, celda, precio) de lo que está en los sketches
+        self._entries: Dict[int, Tuple[Group, str, float]] = {}
+        self._dirty: Set[int] = set()
+        self._lock = threading.Lock()
+        # Una relectura a la vez: una más lenta no pisa a una más nueva
+        self._refresh_lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._loaded = threading.Event()
+
+    # --------------------------------------------
+    # Mantenimiento
+    # --------------------------------------------
+
+    def _add(self, service_id: int, category: str, modality: str, lat: float, lng: float, price: float) -> None:
+        key = category.casefold()
+        self._names.setdefault(key, category)
+        group = (key, modality)
+        cell = geohash.encode(lat, lng, settings.PRICE_STATS_GEOHASH_PRECISION)
+        cells = self._groups.setdefault(group, {})
+        sketch = cells.get(cell)
+        if sketch is None:
+            sketch = cells[cell] = QuantileSketch(settings.PRICE_STATS_RELATIVE_ACCURACY)
+        sketch.add(price)
+        self._entries[service_id] = (group, cell, price)
+
+    def _remove(self, service_id: int) -> None:
+        entry = self._entries.pop(service_id, None)
+        if entry is None:
+            return
+        group, cell, price = entry
+        cells = self._groups[group]
+        sketch = cells[cell]
+        sketch.remove(price)
+        if not sketch.count:
+            del cells[cell]
+            if not cells:
+                del self._groups[group]
+
+    def _load(self, service_ids: Optional[Set[int]] = None) -> List[tuple]:
+        from sqlalchemy import select
+
+        from app.db.base import Service
+        from app.db.session import SessionLocal
+
+        stmt = select(
+            Service.id, Service.category, Service.price_modality,
+            Service.latitude, Service.longitude, Service.price,
+        ).where(Service.is_active == True)
+        if service_ids is not None:
+            stmt = stmt.where(Service.id.in_(service_ids))
+        db = SessionLocal()
+        try:
+            return db.execute(stmt).all()
+        finally:
+            db.close()
+
+    def ensure_loaded(self) -> None:
+        """Arma los sketches si todavía no existen (bloquea solo la primera vez)"""
+        if self._loaded.is_set():
+            return
+        with self._load_lock:
+            if self._loaded.is_set():
+                return
+            with self._lock:
+                # Los cambios anteriores a la lectura quedan incluidos en ella
+                self._dirty.clear()
+            rows = self._load()
+            with self._lock:
+                self._groups.clear()
+                self._entries.clear()
+                for row in rows:
+                    self._add(*row)
+            self._loaded.set()
+        logger.info("Estadísticas de precio: %d servicios en %d grupos", len(rows), len(self._groups))
+
+    def mark_service(self, service_id: int) -> None:
+        with self._lock:
+            self._dirty.add(service_id)
+
+    def invalidate(self) -> None:
+        """La próxima consulta vuelve a leer todos los precios"""
+        self._loaded.clear()
+
+    def _refresh(self) -> None:
+        """Relee los servicios que cambiaron desde la última consulta"""
+        if not self._dirty:
+            return
+        with self._refresh_lock:
+            with self._lock:
+                services, self._dirty = self._dirty, set()
+            if not services:
+                return
+            rows = self._load(services)
+            with self._lock:
+                for service_id in services:
+                    self._remove(service_id)
+                for row in rows:
+                    self._add(*row)
+
+    # --------------------------------------------
+    # Consulta
+    # --------------------------------------------
+
+    def summarize(
+        self, category: str, price_modality: Optional[str] = None,
+        bbox: Optional[geohash.Bounds] = None
+    ) -> List[PriceSummary]:
+        """p25/p50/p75 por modalidad de precio, combinando las celdas del bbox"""
+        self.ensure_loaded()
+        self._refresh()
+        key = category.casefold()
+        summaries = []
+        with self._lock:
+            for (group_key, modality), cells in self._groups.items():
+                if group_key != key or (price_modality is not None and modality != price_modality):
+                    continue
+                merged = QuantileSketch(settings.PRICE_STATS_RELATIVE_ACCURACY)
+                for cell, sketch in cells.items():
+                    if bbox is None or geohash.intersects(cell, *bbox):
+                        merged.merge(sketch)
+                if merged.count:
+                    p25, p50, p75 = (round(p, 2) for p in merged.quantiles((0.25, 0.5, 0.75)))
+                    summaries.append(PriceSummary(self._names[key], modality, merged.count, p25, p50, p75))
+        summaries.sort(key=lambda s: -s.count)
+        return summaries
+
+
+stats = PriceStats()
+
+
+def _on_event(event: events.ChangeEvent) -> None:
+    if event.entity == "services":
+        stats.mark_service(event.entity_id)
+
+
+def _on_invalidation(message: Invalidation) -> None:
+    if message.entity == RESYNC_ENTITY:
+        stats.invalidate()
+        return
+    # Los cambios locales llegan por el stream de eventos
+    if message.origin == bus.origin or message.entity_id is None:
+        return
+    if message.entity == "services":
+        stats.mark_service(message.entity_id)
+
+
+if settings.PRICE_STATS_ENABLED:
+    events.stream.subscribe(_on_event)
+    bus.subscribe(_on_invalidation)
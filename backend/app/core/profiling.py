@@ -0,0 +1,198 @@
+"""
+Profiling bajo demanda para workers en producción.
+
+- Muestreo estadístico: recorre sys._current_frames() cada pocos ms durante
+  N segundos y acumula stacks colapsados (formato de flamegraph.pl/speedscope).
+- Profiling por request: con la cabecera X-Profile-Token se ejecuta ese único
+  request bajo cProfile y se devuelve el resumen en lugar de la respuesta.
+
+Con PROFILING_ENABLED desactivado no se instala middleware ni se envuelve
+ningún endpoint, así que el costo es nulo.
+"""
+
+import asyncio
+import cProfile
+import functools
+import hmac
+import io
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Callable, List, Optional
+
+from fastapi.routing import APIRoute
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+
+from app.core.config import settings
+
+PROFILE_HEADER = "X-Profile-Token"
+SORT_KEYS = ("cumulative", "tottime", "calls")
+
+_sampling_lock = threading.Lock()
+# Un request perfilado a la vez por worker: en Python 3.12+ un segundo
+# cProfile activo lanza ValueError, y antes reemplazaba al primero
+_request_profile_lock = threading.Lock()
+# Perfiles cProfile del request en curso (uno por hilo que ejecutó código)
+_request_profiles: ContextVar[Optional[List[cProfile.Profile]]] = ContextVar(
+    "request_profiles", default=None
+)
+
+
+class ProfilerBusy(Exception):
+    """Ya hay un muestreo en curso en este worker"""
+
+
+# ============================================
+# Muestreo estadístico de stacks
+# ============================================
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    module = frame.f_globals.get("__name__", "?")
+    return f"{module}:{code.co_name}:{frame.f_lineno}"
+
+
+def _collapse(frame, thread_name: str) -> str:
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.append(thread_name)
+    return ";".join(reversed(labels))
+
+
+def sample_stacks(seconds: float, interval: float) -> Counter:
+    """
+    Muestrea los stacks de todos los hilos del worker (salvo el propio) y
+    devuelve un Counter {stack colapsado: muestras}.
+    """
+    if not _sampling_lock.acquire(blocking=False):
+        raise ProfilerBusy()
+    try:
+        own_id = threading.get_ident()
+        stacks: Counter = Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stacks[_collapse(frame, names.get(thread_id, f"thread-{thread_id}"))] += 1
+            time.sleep(interval)
+        return stacks
+    finally:
+        _sampling_lock.release()
+
+
+def render_collapsed(stacks: Counter) -> str:
+    """Una línea por stack: `frame;frame;frame muestras`"""
+    return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()) + "\n"
+
+
+# ============================================
+# Profiling de un único request con cProfile
+# ============================================
+
+def profile_in_thread(call: Callable) -> Callable:
+    """
+    Envuelve un endpoint sync: si el request pidió profiling, la llamada en el
+    threadpool se perfila con su propio cProfile (cProfile es por hilo).
+    """
+    @functools.wraps(call)
+    def wrapper(*args, **kwargs):
+        profiles = _request_profiles.get()
+        if profiles is None:
+            return call(*args, **kwargs)
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+: cProfile usa sys.monitoring, que es global a todos
+            # los hilos, así que el perfil del event loop ya cubre esta llamada
+            return call(*args, **kwargs)
+        try:
+            return call(*args, **kwargs)
+        finally:
+            profile.disable()
+            profiles.append(profile)
+
+    wrapper._profiled = True
+    return wrapper
+
+
+class ProfilingRoute(APIRoute):
+    """APIRoute que habilita el profiling por request de endpoints sync"""
+
+    def get_route_handler(self):
+        call = self.dependant.call
+        if (
+            settings.PROFILING_ENABLED
+            and call is not None
+            and not asyncio.iscoroutinefunction(call)
+            and not getattr(call, "_profiled", False)
+        ):
+            self.dependant.call = profile_in_thread(call)
+        return super().get_route_handler()
+
+
+def _requested(request: Request) -> bool:
+    token = request.headers.get(PROFILE_HEADER)
+    return bool(token and settings.PROFILING_TOKEN) and hmac.compare_digest(
+        token, settings.PROFILING_TOKEN
+    )
+
+
+def _busy_response() -> PlainTextResponse:
+    return PlainTextResponse("Ya hay un request perfilado en curso en este worker\n", status_code=409)
+
+
+async def profile_request_middleware(request: Request, call_next):
+    """
+    Ejecuta el request bajo cProfile si trae un X-Profile-Token válido.
+    El perfil del event loop también incluye trabajo de requests concurrentes.
+    Si ya hay un request perfilado en este worker se responde 409.
+    """
+    if not _requested(request):
+        return await call_next(request)
+
+    if not _request_profile_lock.acquire(blocking=False):
+        return _busy_response()
+    try:
+        loop_profile = cProfile.Profile()
+        try:
+            loop_profile.enable()
+        except ValueError:
+            # Otra herramienta de profiling (p. ej. un depurador) ya está activa
+            return _busy_response()
+        profiles: List[cProfile.Profile] = []
+        token = _request_profiles.set(profiles)
+        started = time.perf_counter()
+        try:
+            response = await call_next(request)
+            # Consumir el body dentro del perfil para incluir la serialización
+            body = b"".join([chunk async for chunk in response.body_iterator])
+        finally:
+            loop_profile.disable()
+            _request_profiles.reset(token)
+    finally:
+        _request_profile_lock.release()
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    output = io.StringIO()
+    stats = pstats.Stats(loop_profile, stream=output)
+    for profile in profiles:
+        stats.add(profile)
+    sort_key = request.query_params.get("profile_sort", "cumulative")
+    stats.sort_stats(sort_key if sort_key in SORT_KEYS else "cumulative")
+    output.write(
+        f"# {request.method} {request.url.path} -> {response.status_code} "
+        f"({len(body)} bytes) en {elapsed_ms:.2f} ms\n"
+    )
+    stats.print_stats(settings.PROFILING_TOP_FUNCTIONS)
+    return PlainTextResponse(
+        output.getvalue(), headers={"X-Profiled-Status": str(response.status_code)}
+    )
@@ -0,0 +1,150 @@
+"""
+Filtro de revocación de tokens en memoria.
+
+Un bloom filter con las claves de la tabla revoked_tokens ("jti:..." y
+"uid:...") permite autorizar casi todos los requests sin consultar la base:
+si ninguna clave del token está en el filtro, no está revocado. Solo ante
+un positivo (real o falso) se verifica contra la tabla.
+
+El filtro se actualiza de forma incremental (filas revocadas desde la
+última lectura, con un margen para transacciones que confirman tarde) cada
+REVOCATION_REFRESH_SECONDS, o antes si llega un cambio de usuarios o
+revocaciones por el bus, y se reconstruye completo cada
+REVOCATION_REBUILD_SECONDS para descartar las revocaciones vencidas.
+"""
+
+import hashlib
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Optional
+
+from app.core.config import settings
+from app.core.invalidation import RESYNC_ENTITY, Invalidation, bus
+
+
+class BloomFilter:
+    def __init__(self, bits: int, hashes: int):
+        self.bits = bits
+        self.hashes = hashes
+        self._array = bytearray((bits + 7) // 8)
+
+    def _positions(self, key: str) -> List[int]:
+        # Doble hashing: k posiciones a partir de dos hashes de 64 bits
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def add(self, key: str) -> None:
+        for position in self._positions(key):
+            self._array[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._array[p >> 3] & (1 << (p & 7)) for p in self._positions(key))
+
+
+# Relectura en cada actualización incremental (agregar dos veces es inocuo)
+_OVERLAP = timedelta(seconds=30)
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite devuelve fechas sin zona
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def token_keys(jti: Optional[str], user_id: Optional[int]) -> List[str]:
+    keys = []
+    if jti:
+        keys.append(f"jti:{jti}")
+    if user_id is not None:
+        keys.append(f"uid:{user_id}")
+    return keys
+
+
+class RevocationStore:
+    def __init__(self):
+        self._filter = BloomFilter(settings.REVOCATION_BLOOM_BITS, settings.REVOCATION_BLOOM_HASHES)
+        self._watermark: Optional[datetime] = None
+        self._next_refresh = 0.0
+        self._next_rebuild = 0.0
+        self._lock = threading.Lock()
+
+    def needs_refresh(self) -> bool:
+        return time.monotonic() >= self._next_refresh
+
+    def mark_stale(self) -> None:
+        self._next_refresh = 0.0
+
+    def maybe_revoked(self, keys: Iterable[str]) -> bool:
+        """Solo memoria: False garantiza que el token no está revocado"""
+        return any(key in self._filter for key in keys)
+
+    def refresh(self) -> None:
+        """Incorpora revocaciones nuevas (o reconstruye el filtro si toca)"""
+        from app.db.base import RevokedToken
+        from app.db.session import SessionLocal
+
+        with self._lock:
+            now = time.monotonic()
+            if now < self._next_refresh:
+                return  # Otro hilo acaba de actualizar
+            rebuild = now >= self._next_rebuild
+            db = SessionLocal()
+            try:
+                query = db.query(RevokedToken.key, RevokedToken.revoked_at)
+                if rebuild or self._watermark is None:
+                    query = query.filter(RevokedToken.expires_at > datetime.now(timezone.utc))
+                else:
+                    query = query.filter(RevokedToken.revoked_at > self._watermark - _OVERLAP)
+                rows = query.all()
+            finally:
+                db.close()
+
+            target = (
+                BloomFilter(settings.REVOCATION_BLOOM_BITS, settings.REVOCATION_BLOOM_HASHES)
+                if rebuild else self._filter
+            )
+            for key, revoked_at in rows:
+                target.add(key)
+                revoked_at = _as_utc(revoked_at)
+                if self._watermark is None or revoked_at > self._watermark:
+                    self._watermark = revoked_at
+            self._filter = target
+            if rebuild:
+                self._next_rebuild = now + settings.REVOCATION_REBUILD_SECONDS
+            self._next_refresh = now + settings.REVOCATION_REFRESH_SECONDS
+
+    def is_revoked(self, jti: Optional[str], user_id: Optional[int], issued_at: float) -> bool:
+        """Verificación exacta contra la tabla (ante un positivo del filtro)"""
+        from app.db.base import RevokedToken
+        from app.db.session import SessionLocal
+
+        db = SessionLocal()
+        try:
+            rows = (
+                db.query(RevokedToken.key, RevokedToken.revoked_at)
+                .filter(
+                    RevokedToken.key.in_(token_keys(jti, user_id)),
+                    RevokedToken.expires_at > datetime.now(timezone.utc),
+                )
+                .all()
+            )
+        finally:
+            db.close()
+        for key, revoked_at in rows:
+            if key.startswith("jti:") or _as_utc(revoked_at).timestamp() > issued_at:
+                return True
+        return False
+
+
+store = RevocationStore()
+
+
+def _on_invalidation(message: Invalidation) -> None:
+    if message.entity in ("users", "revoked_tokens", RESYNC_ENTITY):
+        store.mark_stale()
+
+
+# El bus entrega tanto los cambios de este worker como los de los demás
+bus.subscribe(_on_invalidation)
@@ -0,0 +1,450 @@
+"""
+Búsquedas guardadas con aviso ("gasfiter a menos de 5 km de mi casa").
+
+Comparar cada servicio nuevo con todas las búsquedas guardadas no escala,
+así que se indexan al revés (percolador): cada búsqueda queda en los
+buckets (categoría, celda de la grilla) de lo que puede cumplir. Un
+servicio solo se compara con las búsquedas de los buckets de su categoría
+y su celda, más las que no filtran por categoría o por ubicación; el
+costo es proporcional a los candidatos, no al total de búsquedas. La
+grilla es la misma idea que la de viewports del feed SSE.
+
+La comparación corre en un hilo de fondo: el hilo que escribió el
+servicio solo encola el evento. Se avisa cuando un servicio activo pasa a
+cumplir una búsqueda (al crearse o al cambiar categoría, texto, ubicación
+o estado), nunca por servicios del mismo usuario. Los avisos se entregan
+a un Notifier intercambiable: log, webhook o uno propio asignado a
+`percolator.notifier`.
+
+Cada worker mantiene su propio índice; las búsquedas creadas o borradas
+en otros workers llegan por el bus de invalidación y se releen de la base.
+Los servicios se comparan solo en el worker que los escribió.
+"""
+
+import json
+import logging
+import math
+import queue
+import threading
+import urllib.request
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Mapping, Optional, Set, Tuple
+
+from app.core import events, metrics
+from app.core.config import settings
+from app.core.invalidation import RESYNC_ENTITY, Invalidation, bus
+from app.core.service_index import EARTH_RADIUS_KM
+
+logger = logging.getLogger("app.saved_search")
+
+Cell = Tuple[int, int]
+# (categoría en minúsculas o None, celda o None)
+Key = Tuple[Optional[str], Optional[Cell]]
+
+# Campos del servicio que pueden cambiar el resultado de una búsqueda
+MATCH_FIELDS = frozenset({"category", "service_name", "description", "latitude", "longitude", "is_active"})
+
+
+def _haversine(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    dlat = math.radians(lat2 - lat1)
+    dlng = math.radians(lng2 - lng1)
+    a = (math.sin(dlat / 2) ** 2
+         + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlng / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0)))
+
+
+@dataclass(frozen=True)
+class SavedQuery:
+    """Búsqueda guardada normalizada para comparar"""
+    id: int
+    user_id: int
+    name: str
+    category: Optional[str]  # en minúsculas
+    terms: Tuple[str, ...]  # en minúsculas; deben aparecer todas
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    radius_km: Optional[float] = None
+
+    @classmethod
+    def from_values(cls, values: Mapping[str, Any]) -> "SavedQuery":
+        category = (values.get("category") or "").strip().lower()
+        return cls(
+            id=values["id"],
+            user_id=values["user_id"],
+            name=values["name"],
+            category=category or None,
+            terms=tuple((values.get("keywords") or "").lower().split()),
+            latitude=values.get("latitude"),
+            longitude=values.get("longitude"),
+            radius_km=values.get("radius_km"),
+        )
+
+    def check(self, service: Mapping[str, Any]) -> Tuple[bool, Optional[float]]:
+        """Si el servicio (valores de columnas) la cumple, y a qué distancia del centro"""
+        if not service.get("is_active") or service.get("user_id") == self.user_id:
+            return False, None
+        category = (service.get("category") or "").lower()
+        if self.category is not None and category != self.category:
+            return False, None
+        if self.terms:
+            text = f"{service.get('service_name') or ''}\n{service.get('description') or ''}\n{category}".lower()
+            if not all(term in text for term in self.terms):
+                return False, None
+        if self.radius_km is None:
+            return True, None
+        distance = _haversine(self.latitude, self.longitude, service["latitude"], service["longitude"])
+        return distance <= self.radius_km, distance
+
+
+class PercolatorIndex:
+    """Búsquedas guardadas por (categoría, celda); no es thread-safe"""
+
+    def __init__(self, cell_degrees: float, max_cells: int):
+        self.cell_degrees = cell_degrees
+        self.max_cells = max_cells
+        self._queries: Dict[int, SavedQuery] = {}
+        self._keys: Dict[int, List[Key]] = {}
+        self._buckets: Dict[Key, Set[int]] = defaultdict(set)
+        self._by_user: Dict[int, Set[int]] = defaultdict(set)
+
+    def _cell(self, lat: float, lng: float) -> Cell:
+        return (math.floor(lat / self.cell_degrees), math.floor(lng / self.cell_degrees))
+
+    def _keys_for(self, query: SavedQuery) -> List[Key]:
+        if query.radius_km is None:
+            return [(query.category, None)]
+        dlat = math.degrees(query.radius_km / EARTH_RADIUS_KM)
+        cos_lat = math.cos(math.radians(query.latitude))
+        dlng = dlat / cos_lat if cos_lat > 1e-6 else 360.0
+        if query.longitude - dlng < -180 or query.longitude + dlng > 180:
+            # Cruza el antimeridiano: se compara con todo lo de su categoría
+            return [(query.category, None)]
+        lat0, lng0 = self._cell(query.latitude - dlat, query.longitude - dlng)
+        lat1, lng1 = self._cell(query.latitude + dlat, query.longitude + dlng)
+        if (lat1 - lat0 + 1) * (lng1 - lng0 + 1) > self.max_cells:
+            return [(query.category, None)]
+        return [(query.category, (i, j)) for i in range(lat0, lat1 + 1) for j in range(lng0, lng1 + 1)]
+
+    def add(self, query: SavedQuery) -> None:
+        self.remove(query.id)
+        keys = self._keys_for(query)
+        for key in keys:
+            self._buckets[key].add(query.id)
+        self._queries[query.id] = query
+        self._keys[query.id] = keys
+        self._by_user[query.user_id].add(query.id)
+
+    def remove(self, query_id: int) -> None:
+        query = self._queries.pop(query_id, None)
+        if query is None:
+            return
+        for key in self._keys.pop(query_id):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(query_id)
+                if not bucket:
+                    del self._buckets[key]
+        owned = self._by_user.get(query.user_id)
+        if owned is not None:
+            owned.discard(query_id)
+            if not owned:
+                del self._by_user[query.user_id]
+
+    def remove_user(self, user_id: int) -> None:
+        for query_id in list(self._by_user.get(user_id, ())):
+            self.remove(query_id)
+
+    def clear(self) -> None:
+        self._queries.clear()
+        self._keys.clear()
+        self._buckets.clear()
+        self._by_user.clear()
+
+    def candidates(self, category: Optional[str], lat: float, lng: float) -> List[SavedQuery]:
+        """Búsquedas que podrían cumplirse para un servicio en esa categoría y ubicación"""
+        category = (category or "").lower() or None
+        cell = self._cell(lat, lng)
+        ids: Set[int] = set()
+        for key in ((category, cell), (category, None), (None, cell), (None, None)):
+            bucket = self._buckets.get(key)
+            if bucket:
+                ids |= bucket
+        return [self._queries[i] for i in ids]
+
+    def __len__(self) -> int:
+        return len(self._queries)
+
+
+# --------------------------------------------
+# Entrega de avisos
+# --------------------------------------------
+
+@dataclass(frozen=True)
+class Match:
+    """Aviso: un servicio empezó a cumplir una búsqueda guardada"""
+    saved_search_id: int
+    saved_search_name: str
+    user_id: int
+    service_id: int
+    service_name: str
+    category: str
+    distance_km: Optional[float]
+    matched_at: str
+
+
+class Notifier(ABC):
+    """Destino de los avisos; las subclases implementan notify()"""
+
+    @abstractmethod
+    def notify(self, match: Match) -> None:
+        ...
+
+
+class NullNotifier(Notifier):
+    def notify(self, match: Match) -> None:
+        pass
+
+
+class LogNotifier(Notifier):
+    """Registra cada aviso en el log y, si se indica, como línea JSON en un archivo"""
+
+    def __init__(self, path: str = ""):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def notify(self, match: Match) -> None:
+        line = json.dumps(asdict(match), ensure_ascii=False)
+        logger.info("Aviso de búsqueda guardada: %s", line)
+        if self.path:
+            with self._lock, open(self.path, "a", encoding="utf-8") as fh:
+                fh.write(line + "\n")
+
+
+class WebhookNotifier(Notifier):
+    """POST del aviso en JSON; el receptor resuelve cómo contactar al usuario"""
+
+    def __init__(self, url: str, timeout: float = 5.0):
+        self.url = url
+        self.timeout = timeout
+
+    def notify(self, match: Match) -> None:
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(asdict(match)).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+
+def create_notifier() -> Notifier:
+    backend = settings.SAVED_SEARCH_NOTIFIER
+    if backend == "webhook":
+        return WebhookNotifier(settings.SAVED_SEARCH_WEBHOOK_URL)
+    if backend == "none":
+        return NullNotifier()
+    return LogNotifier(settings.SAVED_SEARCH_LOG_PATH)
+
+
+# --------------------------------------------
+# Percolador
+# --------------------------------------------
+
+class Percolator:
+    def __init__(self):
+        self.index = PercolatorIndex(settings.SAVED_SEARCH_CELL_DEGREES, settings.SAVED_SEARCH_MAX_CELLS)
+        self.notifier: Notifier = create_notifier()
+        # Protege el índice y `_loaded`; los cambios previos a la carga se
+        # ignoran porque la carga ya los lee de la base
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._queue: queue.Queue = queue.Queue(maxsize=settings.SAVED_SEARCH_QUEUE_SIZE)
+        self._thread: Optional[threading.Thread] = None
+
+    def ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        from sqlalchemy import select
+
+        from app.db.base import SavedSearch
+        from app.db.session import SessionLocal
+
+        with self._lock:
+            if self._loaded:
+                return
+            db = SessionLocal()
+            try:
+                rows = db.execute(select(*SavedSearch.__table__.columns)).mappings().all()
+            finally:
+                db.close()
+            self.index.clear()
+            for values in rows:
+                self.index.add(SavedQuery.from_values(values))
+            self._loaded = True
+        logger.info("Búsquedas guardadas cargadas: %d", len(rows))
+
+    def invalidate(self) -> None:
+        """La próxima coincidencia vuelve a leer todas las búsquedas"""
+        with self._lock:
+            self._loaded = False
+
+    # Cambios de búsquedas (se aplican en el hilo que los recibe)
+
+    def add(self, values: Mapping[str, Any]) -> None:
+        with self._lock:
+            if self._loaded:
+                self.index.add(SavedQuery.from_values(values))
+
+    def remove(self, search_id: int) -> None:
+        with self._lock:
+            if self._loaded:
+                self.index.remove(search_id)
+
+    def remove_user(self, user_id: int) -> None:
+        with self._lock:
+            if self._loaded:
+                self.index.remove_user(user_id)
+
+    def _reload(self, search_id: int) -> None:
+        from sqlalchemy import select
+
+        from app.db.base import SavedSearch
+        from app.db.session import SessionLocal
+
+        db = SessionLocal()
+        try:
+            values = db.execute(
+                select(*SavedSearch.__table__.columns).where(SavedSearch.id == search_id)
+            ).mappings().first()
+        finally:
+            db.close()
+        if values is None:
+            self.remove(search_id)
+        else:
+            self.add(values)
+
+    # Comparación de servicios
+
+    def percolate(self, event: events.ChangeEvent) -> List[Match]:
+        """Búsquedas que el servicio del evento empezó a cumplir"""
+        self.ensure_loaded()
+        service = event.values
+        with self._lock:
+            candidates = self.index.candidates(service["category"], service["latitude"], service["longitude"])
+        matches = []
+        matched_at = datetime.now(timezone.utc).isoformat()
+        for query in candidates:
+            ok, distance = query.check(service)
+            # En una actualización, solo si antes no la cumplía
+            if not ok or (event.previous and query.check(event.previous)[0]):
+                continue
+            matches.append(Match(
+                saved_search_id=query.id,
+                saved_search_name=query.name,
+                user_id=query.user_id,
+                service_id=event.entity_id,
+                service_name=service["service_name"],
+                category=service["category"],
+                distance_km=round(distance, 3) if distance is not None else None,
+                matched_at=matched_at,
+            ))
+        metrics.saved_search_candidates.inc("checked", amount=len(candidates))
+        metrics.saved_search_candidates.inc("matched", amount=len(matches))
+        return matches
+
+    def deliver(self, match: Match) -> None:
+        try:
+            self.notifier.notify(match)
+        except Exception:
+            metrics.saved_search_notifications.inc("failed")
+            logger.exception("No se pudo entregar el aviso de la búsqueda %s", match.saved_search_id)
+        else:
+            metrics.saved_search_notifications.inc("sent")
+
+    # Hilo de fondo
+
+    def enqueue_service(self, event: events.ChangeEvent) -> None:
+        self._enqueue(("service", event))
+
+    def enqueue_reload(self, search_id: int) -> None:
+        self._enqueue(("search", search_id))
+
+    def _enqueue(self, item: Tuple[str, Any]) -> None:
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            metrics.saved_search_notifications.inc("dropped")
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="saved-search", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        try:
+            self._queue.put(None, timeout=1)
+        except queue.Full:
+            pass
+        self._thread.join(timeout=5)
+        self._thread = None
+
+    def join(self) -> None:
+        """Espera a que se procese todo lo encolado"""
+        self._queue.join()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                kind, payload = item
+                if kind == "search":
+                    self._reload(payload)
+                else:
+                    for match in self.percolate(payload):
+                        self.deliver(match)
+            except Exception:
+                logger.exception("Error comparando búsquedas guardadas")
+            finally:
+                self._queue.task_done()
+
+
+percolator = Percolator()
+
+
+def _on_event(event: events.ChangeEvent) -> None:
+    if event.entity == "saved_searches":
+        if event.action == "delete":
+            percolator.remove(event.entity_id)
+        else:
+            percolator.add(event.values)
+    elif event.entity == "users" and event.action == "delete":
+        percolator.remove_user(event.entity_id)
+    elif event.entity == "services" and event.action != "delete":
+        if event.action == "create" or event.changed_fields & MATCH_FIELDS:
+            percolator.enqueue_service(event)
+
+
+def _on_invalidation(message: Invalidation) -> None:
+    if message.entity == RESYNC_ENTITY:
+        percolator.invalidate()
+        return
+    # Los cambios locales ya llegan por el stream de eventos
+    if message.origin == bus.origin or message.entity_id is None:
+        return
+    if message.entity == "saved_searches":
+        percolator.enqueue_reload(message.entity_id)
+    elif message.entity == "users" and message.action == "delete":
+        percolator.remove_user(message.entity_id)
+
+
+if settings.SAVED_SEARCH_ENABLED:
+    events.stream.subscribe(_on_event)
+    bus.subscribe(_on_invalidation)
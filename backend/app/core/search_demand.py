@@ -0,0 +1,242 @@
+"""
+Demanda de búsquedas: dónde y qué buscan los usuarios, incluidas las
+búsquedas que no encuentran nada.
+
+El request solo encola una tupla con `put_nowait` en una cola acotada: no
+toca la base ni espera a nadie, y si la cola está llena la búsqueda se
+descarta (y se cuenta en métricas). Un hilo de fondo vacía la cola cada
+SEARCH_DEMAND_FLUSH_SECONDS, agrupa en memoria por (geohash, categoría,
+hora) y suma los grupos en search_demand con un INSERT ... ON CONFLICT DO
+UPDATE por lote, igual que los contadores de servicios.
+
+El resumen se mantiene compacto: la ubicación se reduce a una celda
+geohash, la hora se trunca y el texto buscado no se guarda (su
+cardinalidad no tiene techo); si coincide con el nombre de una categoría
+cuenta como esa categoría. Las categorías desconocidas quedan vacías y
+las horas más antiguas que SEARCH_DEMAND_RETENTION_DAYS se purgan.
+"""
+
+import logging
+import queue
+import threading
+import time
+import unicodedata
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from app.core import geohash, metrics
+from app.core.config import settings
+
+logger = logging.getLogger("app.search_demand")
+
+# (geohash, categoría, hora)
+Key = Tuple[str, str, datetime]
+
+_PURGE_EVERY_SECONDS = 3600
+
+
+def _hour(timestamp: float) -> datetime:
+    return datetime.fromtimestamp(timestamp - timestamp % 3600, tz=timezone.utc)
+
+
+def normalize(name: Optional[str]) -> str:
+    """Minúsculas y sin tildes: «gasfiter» cuenta como «Gasfíter»"""
+    decomposed = unicodedata.normalize("NFKD", (name or "").strip().casefold())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def aggregate(items: List[tuple], categories: Dict[str, str]) -> Dict[Key, List[int]]:
+    """
+    Agrupa las búsquedas encoladas; `categories` va del nombre
+    normalizado al nombre canónico
+    """
+    precision = settings.SEARCH_DEMAND_GEOHASH_PRECISION
+    groups: Dict[Key, List[int]] = {}
+    for timestamp, category, search, lat, lng, empty in items:
+        name = categories.get(normalize(category))
+        if name is None:
+            name = categories.get(normalize(search), "")
+        cell = geohash.encode(lat, lng, precision) if lat is not None and lng is not None else ""
+        counts = groups.setdefault((cell, name, _hour(timestamp)), [0, 0])
+        counts[0] += 1
+        counts[1] += empty
+    return groups
+
+
+class DemandRecorder:
+    def __init__(self):
+        self._queue: queue.Queue = queue.Queue(maxsize=settings.SEARCH_DEMAND_QUEUE_SIZE)
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._purged_at = 0.0
+
+    def record(
+        self, category: Optional[str], search: Optional[str],
+        lat: Optional[float], lng: Optional[float], results: int
+    ) -> None:
+        """Registra una búsqueda; nunca bloquea"""
+        try:
+            self._queue.put_nowait((time.time(), category, search, lat, lng, results == 0))
+        except queue.Full:
+            metrics.search_demand_events.inc("dropped")
+
+    # --------------------------------------------
+    # Escritura en la base
+    # --------------------------------------------
+
+    def flush(self) -> int:
+        """Resume lo encolado en search_demand; devuelve cuántas búsquedas escribió"""
+        with self._flush_lock:
+            items = []
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if items:
+                try:
+                    _upsert(items)
+                except Exception:
+                    # No se reintenta: es estadística, no vale la pena crecer la cola
+                    metrics.search_demand_events.inc("dropped", amount=len(items))
+                    raise
+                metrics.search_demand_events.inc("flushed", amount=len(items))
+            if time.time() - self._purged_at >= _PURGE_EVERY_SECONDS:
+                _purge()
+                self._purged_at = time.time()
+        return len(items)
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._flush_loop, name="search-demand", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread = None
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("No se pudo escribir la demanda de búsquedas pendiente")
+
+    def _flush_loop(self) -> None:
+        while not self._stop.wait(settings.SEARCH_DEMAND_FLUSH_SECONDS):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("No se pudo escribir la demanda de búsquedas")
+
+
+def _canonical_categories(db) -> Dict[str, str]:
+    """Del nombre normalizado de cada categoría a su nombre canónico"""
+    from sqlalchemy import select
+
+    from app.db.base import Category
+
+    return {normalize(name): name for name in db.scalars(select(Category.name))}
+
+
+def _upsert(items: List[tuple]) -> None:
+    """Suma los grupos en search_demand (un INSERT ... ON CONFLICT por lote de 500)"""
+    from app.db.base import SearchDemand
+    from app.db.session import SessionLocal
+
+    db = SessionLocal()
+    try:
+        if db.get_bind().dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+
+        categories = _canonical_categories(db)
+        rows = [
+            {"geohash": cell, "category": category, "hour": hour, "searches": searches, "empty": empty}
+            for (cell, category, hour), (searches, empty) in aggregate(items, categories).items()
+        ]
+        for start in range(0, len(rows), 500):
+            stmt = insert(SearchDemand).values(rows[start:start + 500])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[SearchDemand.geohash, SearchDemand.category, SearchDemand.hour],
+                set_={
+                    "searches": SearchDemand.searches + stmt.excluded.searches,
+                    "empty": SearchDemand.empty + stmt.excluded.empty,
+                },
+            )
+            db.execute(stmt)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _purge() -> None:
+    from sqlalchemy import delete
+
+    from app.db.base import SearchDemand
+    from app.db.session import SessionLocal
+
+    cutoff = datetime.now(timezone.utc) - timedelta(days=settings.SEARCH_DEMAND_RETENTION_DAYS)
+    db = SessionLocal()
+    try:
+        db.execute(delete(SearchDemand).where(SearchDemand.hour < cutoff))
+        db.commit()
+    finally:
+        db.close()
+
+
+recorder = DemandRecorder()
+
+
+# --------------------------------------------
+# Lectura (mapa de calor)
+# --------------------------------------------
+
+def heatmap(
+    db, *, bbox: Optional[geohash.Bounds] = None, category: Optional[str] = None,
+    since: Optional[datetime] = None, precision: Optional[int] = None
+) -> List[Tuple[str, int, int]]:
+    """
+    Celdas con búsquedas: (geohash, búsquedas, sin resultados), de mayor a
+    menor demanda. Con `bbox` solo se leen los rangos de geohash que lo
+    cubren; con `precision` menor que la guardada las celdas se agrupan
+    por prefijo (mapa alejado).
+    """
+    from sqlalchemy import and_, func, or_, select
+
+    from app.db.base import SearchDemand
+
+    stored = settings.SEARCH_DEMAND_GEOHASH_PRECISION
+    precision = min(precision or stored, stored)
+    stmt = (
+        select(SearchDemand.geohash, func.sum(SearchDemand.searches), func.sum(SearchDemand.empty))
+        .where(SearchDemand.geohash != "")
+        .group_by(SearchDemand.geohash)
+    )
+    if bbox is not None:
+        # Rangos sobre la clave primaria (geohash primero) en lugar de
+        # decodificar todas las celdas
+        stmt = stmt.where(or_(*(
+            and_(SearchDemand.geohash >= prefix, SearchDemand.geohash < prefix + "~")
+            for prefix in geohash.cover(*bbox, precision=stored, max_cells=32)
+        )))
+    if category:
+        # Se guarda el nombre canónico: la categoría pedida se resuelve igual
+        # que al agrupar y se compara por igualdad (ILIKE no ignora tildes y
+        # toma % y _ del texto como comodines)
+        name = _canonical_categories(db).get(normalize(category))
+        if name is None:
+            return []
+        stmt = stmt.where(SearchDemand.category == name)
+    if since is not None:
+        stmt = stmt.where(SearchDemand.hour >= since)
+
+    cells: Dict[str, List[int]] = {}
+    for cell, searches, empty in db.execute(stmt):
+        if bbox is not None and not geohash.intersects(cell, *bbox):
+            continue
+        counts = cells.setdefault(cell[:precision], [0, 0])
+        counts[0] += searches
+        counts[1] += empty
+    ranked = sorted(cells.items(), key=lambda item: (-item[1][0], item[0]))
+    return [(cell, searches, empty) for cell, (searches, empty) in ranked[:settings.SEARCH_DEMAND_MAX_CELLS]]
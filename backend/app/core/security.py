@@ -1,33 +1,81 @@
+import time
+import uuid
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Optional
-from jose import JWTError, jwt
-from passlib.context import CryptContext
 from .config import settings
+from .metrics import bcrypt_in_flight
 
-# Configurar bcrypt
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# passlib y jose se importan al primer uso: solo los necesitan las rutas de
+# autenticación y no deben retrasar el arranque del worker
+
+@lru_cache(maxsize=None)
+def get_pwd_context():
+    """Contexto de bcrypt (se crea una sola vez, al primer uso)"""
+    from passlib.context import CryptContext
+    # min = max = default: cualquier hash con otro costo queda marcado para actualizar
+    rounds = settings.BCRYPT_ROUNDS
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=rounds,
+        bcrypt__max_rounds=rounds,
+    )
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verifica que la contraseña en texto plano coincida con el hash"""
     # Truncar la contraseña a 72 bytes para bcrypt
     if len(plain_password.encode('utf-8')) > 72:
         plain_password = plain_password[:72]
-    return pwd_context.verify(plain_password, hashed_password)
+    bcrypt_in_flight.inc()
+    try:
+        return get_pwd_context().verify(plain_password, hashed_password)
+    finally:
+        bcrypt_in_flight.dec()
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """True si el hash usa un costo (o esquema) distinto al configurado"""
+    return get_pwd_context().needs_update(hashed_password)
 
 def get_password_hash(password: str) -> str:
     """Genera un hash de la contraseña"""
     # Truncar la contraseña a 72 bytes para bcrypt
     if len(password.encode('utf-8')) > 72:
         password = password[:72]
-    return pwd_context.hash(password)
+    bcrypt_in_flight.inc()
+    try:
+        return get_pwd_context().hash(password)
+    finally:
+        bcrypt_in_flight.dec()
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
-    """Crea un token JWT con los datos proporcionados"""
-    to_encode = data.copy()
+    """
+    Crea un token JWT con los datos proporcionados. Agrega `jti` (para
+    revocarlo individualmente) e `iat` con fracción de segundo (para
+    compararlo con revocaciones por usuario).
+    """
+    to_encode = {"type": "access", "jti": uuid.uuid4().hex, "iat": time.time()}
+    to_encode.update(data)
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
+    from jose import jwt
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
+
+def create_refresh_token(data: dict) -> str:
+    """Crea un refresh token (solo sirve para obtener un nuevo par de tokens)"""
+    return create_access_token(
+        {**data, "type": "refresh"}, expires_delta=timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+    )
+
+def decode_access_token(token: str) -> Optional[dict]:
+    """Decodifica y valida un token JWT; devuelve None si es inválido o expiró"""
+    from jose import JWTError, jwt
+    try:
+        return jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        return None
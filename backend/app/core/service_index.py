@@ -0,0 +1,534 @@
+"""
+Índice columnar en memoria de servicios para búsquedas combinadas.
+
+Mantiene una copia de las columnas filtrables de todos los servicios en
+arrays NumPy contiguos (latitud/longitud en radianes, códigos de categoría
+y comuna, precio, rating, is_active, popularidad) más el texto de búsqueda
+en minúsculas. Una consulta combina cualquier subconjunto de predicados con máscaras
+vectorizadas: primero los filtros baratos (numéricos y bounding box), luego
+búsqueda de texto y haversine solo sobre los candidatos que quedan, y al
+final un top-k con argpartition.
+
+El texto es una lista de str y no un array: `term in text` de Python es
+varias veces más rápido que np.strings.find, y un array de ancho fijo
+ocuparía el largo de la descripción más larga por cada fila. Con el orden
+por id (el del listado) la búsqueda de texto se corta apenas completa la
+página.
+
+El índice se actualiza de forma incremental: los cambios de servicios y
+reseñas (de este worker por el stream de eventos, de otros por el bus)
+marcan servicios como sucios, y la siguiente consulta relee solo esas filas.
+Las bajas de reseñas en otros workers no indican el servicio afectado: ese
+rating se corrige en la reconstrucción periódica
+(SERVICE_INDEX_REBUILD_SECONDS), que corre en segundo plano.
+"""
+
+import logging
+import math
+import threading
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.core import events
+from app.core.config import settings
+from app.core.invalidation import RESYNC_ENTITY, Invalidation, bus
+
+# NumPy se importa al primer uso (construir o consultar el índice): el
+# import cuesta decenas de ms y no hace falta con SERVICE_INDEX_ENABLED=0
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger("app.service_index")
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Filas por tanda en la búsqueda de texto con corte temprano
+_TEXT_CHUNK = 4096
+
+# Columnas NumPy de _Arrays (el texto es una lista aparte)
+_NUMERIC = ("ids", "lat", "lng", "cos_lat", "category", "district", "price", "rating", "active", "popularity")
+
+# Columnas que se leen de la tabla, en este orden (más la popularidad de
+# service_stats, ver _select_rows)
+COLUMNS = (
+    "id", "latitude", "longitude", "category", "price", "rating",
+    "is_active", "service_name", "description", "district_id",
+)
+Row = Tuple[int, float, float, str, float, float, bool, str, str, Optional[str], float]
+
+
+@dataclass
+class _Arrays:
+    """Columnas del índice; solo las primeras `size` filas son válidas"""
+    ids: "np.ndarray"        # int64, -1 = fila borrada
+    lat: "np.ndarray"        # float64, radianes
+    lng: "np.ndarray"        # float64, radianes
+    cos_lat: "np.ndarray"    # float64, precalculado para haversine
+    category: "np.ndarray"   # int32, código en ServiceIndex._codes
+    district: "np.ndarray"   # int32, código en ServiceIndex._codes (-1 = sin comuna)
+    price: "np.ndarray"      # float64
+    rating: "np.ndarray"     # float64
+    active: "np.ndarray"     # bool (False también en filas borradas)
+    popularity: "np.ndarray" # float64, vistas + peso × contactos
+    text: List[str]          # nombre, descripción y categoría en minúsculas
+    size: int = 0
+    # Filas en orden de id (permite cortar la búsqueda de texto)
+    ordered: bool = True
+    max_id: int = -1
+
+    @classmethod
+    def empty(cls, capacity: int) -> "_Arrays":
+        import numpy as np
+
+        return cls(
+            ids=np.full(capacity, -1, dtype=np.int64),
+            lat=np.zeros(capacity),
+            lng=np.zeros(capacity),
+            cos_lat=np.zeros(capacity),
+            category=np.zeros(capacity, dtype=np.int32),
+            district=np.full(capacity, -1, dtype=np.int32),
+            price=np.zeros(capacity),
+            rating=np.zeros(capacity),
+            active=np.zeros(capacity, dtype=bool),
+            popularity=np.zeros(capacity),
+            text=[""] * capacity,
+        )
+
+    @property
+    def capacity(self) -> int:
+        return len(self.ids)
+
+    def grown(self, capacity: int) -> "_Arrays":
+        bigger = _Arrays.empty(capacity)
+        for name in _NUMERIC + ("text",):
+            getattr(bigger, name)[:self.size] = getattr(self, name)[:self.size]
+        bigger.size = self.size
+        bigger.ordered = self.ordered
+        bigger.max_id = self.max_id
+        return bigger
+
+
+class ServiceIndex:
+    def __init__(self):
+        # Se crean en la primera carga (build)
+        self._arrays: Optional[_Arrays] = None
+        self._rows: Dict[int, int] = {}
+        # Códigos de los textos comparados por igualdad (categorías y comunas)
+        self._codes: Dict[str, int] = {}
+        self._deleted = 0
+        self._dirty_services: Set[int] = set()
+        self._dirty_reviews: Set[int] = set()
+        # Marcas recibidas durante una reconstrucción: se vuelven a aplicar
+        # sobre los arrays nuevos (la lectura completa pudo no incluirlas)
+        self._marked_during_load: Optional[Tuple[Set[int], Set[int]]] = None
+        self._lock = threading.Lock()
+        # Una relectura (o reemplazo de arrays) a la vez; las consultas que
+        # ven marcas pendientes la esperan en lugar de responder con datos viejos
+        self._refresh_lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._loaded = threading.Event()
+        self._rebuilding = False
+        self._next_rebuild = 0.0
+
+    # --------------------------------------------
+    # Carga y actualización
+    # --------------------------------------------
+
+    def build(self, rows: Iterable[Row]) -> None:
+        """Reemplaza el contenido del índice con `rows` (carga completa)"""
+        import numpy as np
+
+        rows = list(rows)
+        arrays = _Arrays.empty(max(1024, len(rows) + len(rows) // 4))
+        codes: Dict[str, int] = {}
+        n = len(rows)
+        if n:
+            ids, lat, lng, category, price, rating, active, names, descriptions, district, popularity = zip(*rows)
+            arrays.ids[:n] = ids
+            arrays.lat[:n] = np.radians(np.asarray(lat, dtype=np.float64))
+            arrays.lng[:n] = np.radians(np.asarray(lng, dtype=np.float64))
+            arrays.cos_lat[:n] = np.cos(arrays.lat[:n])
+            arrays.category[:n] = [codes.setdefault(c.lower(), len(codes)) for c in category]
+            arrays.district[:n] = [-1 if d is None else codes.setdefault(d.lower(), len(codes)) for d in district]
+            arrays.price[:n] = price
+            arrays.rating[:n] = [r or 0.0 for r in rating]
+            arrays.active[:n] = [bool(a) for a in active]
+            arrays.popularity[:n] = [p or 0.0 for p in popularity]
+            arrays.text[:n] = [
+                f"{name}\n{description}\n{cat}".lower()
+                for name, description, cat in zip(names, descriptions, category)
+            ]
+        arrays.size = n
+        if n:
+            arrays.ordered = bool(np.all(np.diff(arrays.ids[:n]) > 0))
+            arrays.max_id = int(arrays.ids[:n].max())
+        with self._lock:
+            self._arrays = arrays
+            self._rows = {int(service_id): row for row, service_id in enumerate(arrays.ids[:n])}
+            self._codes = codes
+            self._deleted = 0
+        self._loaded.set()
+
+    def _code(self, value: str) -> int:
+        return self._codes.setdefault(value.lower(), len(self._codes))
+
+    def _upsert(self, row: Row) -> None:
+        """Inserta o actualiza una fila (con el lock tomado)"""
+        service_id, lat, lng, category, price, rating, active, name, description, district, popularity = row
+        index = self._rows.get(service_id)
+        arrays = self._arrays
+        if index is None:
+            if arrays.size == arrays.capacity:
+                arrays = self._arrays = arrays.grown(arrays.capacity * 2)
+            index = arrays.size
+            self._rows[service_id] = index
+            if service_id < arrays.max_id:
+                arrays.ordered = False
+            arrays.max_id = max(arrays.max_id, service_id)
+        lat_rad = math.radians(lat)
+        arrays.lat[index] = lat_rad
+        arrays.lng[index] = math.radians(lng)
+        arrays.cos_lat[index] = math.cos(lat_rad)
+        arrays.category[index] = self._code(category)
+        arrays.district[index] = -1 if district is None else self._code(district)
+        arrays.price[index] = price
+        arrays.rating[index] = rating or 0.0
+        arrays.active[index] = bool(active)
+        arrays.popularity[index] = popularity or 0.0
+        arrays.text[index] = f"{name}\n{description}\n{category}".lower()
+        # El id se escribe al final: una consulta concurrente no ve la fila a medias
+        arrays.ids[index] = service_id
+        if index == arrays.size:
+            arrays.size += 1
+
+    def _remove(self, service_id: int) -> None:
+        index = self._rows.pop(service_id, None)
+        if index is not None:
+            self._arrays.active[index] = False
+            self._arrays.ids[index] = -1
+            self._deleted += 1
+
+    def _compact(self) -> None:
+        """Descarta las filas borradas (con el lock tomado)"""
+        import numpy as np
+
+        arrays = self._arrays
+        ids = arrays.ids[:arrays.size]
+        keep = np.flatnonzero(ids >= 0)
+        # De paso restablece el orden por id
+        keep = keep[np.argsort(ids[keep], kind="stable")]
+        compacted = _Arrays.empty(max(1024, len(keep) + len(keep) // 4))
+        for name in _NUMERIC:
+            getattr(compacted, name)[:len(keep)] = getattr(arrays, name)[keep]
+        compacted.text[:len(keep)] = [arrays.text[i] for i in keep.tolist()]
+        compacted.size = len(keep)
+        compacted.max_id = int(compacted.ids[:len(keep)].max()) if len(keep) else -1
+        self._arrays = compacted
+        self._rows = {int(service_id): row for row, service_id in enumerate(compacted.ids[:len(keep)])}
+        self._deleted = 0
+
+    def mark_service(self, service_id: int) -> None:
+        with self._lock:
+            self._dirty_services.add(service_id)
+            if self._marked_during_load is not None:
+                self._marked_during_load[0].add(service_id)
+
+    def mark_review(self, review_id: int) -> None:
+        with self._lock:
+            self._dirty_reviews.add(review_id)
+            if self._marked_during_load is not None:
+                self._marked_during_load[1].add(review_id)
+
+    def set_popularity(self, scores: Dict[int, float]) -> None:
+        """Actualiza la popularidad (la escriben en lotes los contadores de vistas)"""
+        with self._lock:
+            arrays = self._arrays
+            for service_id, score in scores.items():
+                row = self._rows.get(service_id)
+                if row is not None:
+                    arrays.popularity[row] = score
+
+    @staticmethod
+    def _select_rows():
+        from sqlalchemy import func, select
+
+        from app.db.base import Service, ServiceStat
+
+        score = ServiceStat.views + settings.SERVICE_STATS_CONTACT_WEIGHT * ServiceStat.contacts
+        return (
+            select(*(getattr(Service, c) for c in COLUMNS), func.coalesce(score, 0.0))
+            .outerjoin(ServiceStat, ServiceStat.service_id == Service.id)
+        )
+
+    def _load_all(self) -> List[Row]:
+        from app.db.base import Service
+        from app.db.session import SessionLocal
+
+        db = SessionLocal()
+        try:
+            return db.execute(self._select_rows().order_by(Service.id)).all()
+        finally:
+            db.close()
+
+    def _refresh(self) -> None:
+        """Aplica las marcas pendientes; si otro hilo ya las está aplicando, lo espera"""
+        if self._dirty_services or self._dirty_reviews:
+            with self._refresh_lock:
+                self._apply_dirty()
+
+    def _apply_dirty(self) -> None:
+        """Relee de la base los servicios marcados como sucios (con _refresh_lock tomado)"""
+        from sqlalchemy import select
+
+        from app.db.base import Review, Service
+        from app.db.session import SessionLocal
+
+        with self._lock:
+            services, reviews = self._dirty_services, self._dirty_reviews
+            self._dirty_services, self._dirty_reviews = set(), set()
+        if not services and not reviews:
+            return
+        db = SessionLocal()
+        try:
+            if reviews:
+                services |= set(db.scalars(select(Review.service_id).where(Review.id.in_(reviews))))
+            rows = db.execute(
+                self._select_rows().where(Service.id.in_(services)).order_by(Service.id)
+            ).all() if services else []
+        finally:
+            db.close()
+        with self._lock:
+            found = set()
+            for row in rows:
+                found.add(row[0])
+                self._upsert(tuple(row))
+            for service_id in services - found:
+                self._remove(service_id)
+            if self._deleted > max(1024, self._arrays.size // 4):
+                self._compact()
+
+    def ensure_loaded(self) -> None:
+        """Carga el índice si todavía no existe (bloquea solo la primera vez)"""
+        if self._loaded.is_set():
+            return
+        with self._load_lock:
+            if not self._loaded.is_set():
+                self._rebuild()
+
+    def _rebuild(self) -> None:
+        started = time.perf_counter()
+        with self._lock:
+            # Los cambios anteriores a la lectura quedan incluidos en ella
+            before = (self._dirty_services, self._dirty_reviews)
+            self._dirty_services, self._dirty_reviews = set(), set()
+            self._marked_during_load = (set(), set())
+        try:
+            rows = self._load_all()
+            with self._refresh_lock:
+                self.build(rows)
+        except Exception:
+            with self._lock:
+                self._dirty_services |= before[0]
+                self._dirty_reviews |= before[1]
+            raise
+        finally:
+            with self._lock:
+                # Lo escrito durante la lectura pudo quedar fuera de ella, y una
+                # consulta concurrente pudo aplicarlo sobre los arrays anteriores
+                services, reviews = self._marked_during_load
+                self._marked_during_load = None
+                self._dirty_services |= services
+                self._dirty_reviews |= reviews
+        self._next_rebuild = time.monotonic() + settings.SERVICE_INDEX_REBUILD_SECONDS
+        logger.info(
+            "Índice de servicios: %d filas en %.1f ms",
+            self._arrays.size, (time.perf_counter() - started) * 1000,
+        )
+
+    def schedule_rebuild(self) -> None:
+        """La próxima consulta dispara una reconstrucción en segundo plano"""
+        self._next_rebuild = 0.0
+
+    def _maybe_rebuild_in_background(self) -> None:
+        if time.monotonic() < self._next_rebuild:
+            return
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+
+        def run():
+            try:
+                self._rebuild()
+            except Exception:
+                logger.exception("No se pudo reconstruir el índice de servicios")
+                self._next_rebuild = time.monotonic() + settings.SERVICE_INDEX_REBUILD_SECONDS
+            finally:
+                with self._lock:
+                    self._rebuilding = False
+
+        threading.Thread(target=run, name="service-index-rebuild", daemon=True).start()
+
+    # --------------------------------------------
+    # Consulta
+    # --------------------------------------------
+
+    def query(
+        self,
+        *,
+        category: Optional[str] = None,
+        search: Optional[str] = None,
+        district: Optional[str] = None,
+        lat: Optional[float] = None,
+        lng: Optional[float] = None,
+        radius_km: Optional[float] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        min_rating: Optional[float] = None,
+        active_only: bool = True,
+        sort: str = "id",
+        skip: int = 0,
+        limit: int = 100,
+    ) -> Tuple[List[int], Optional[List[float]]]:
+        """
+        IDs de la página pedida y, si se indicó una ubicación, sus
+        distancias en km. `sort`: "id", "distance", "rating" o "popular".
+        """
+        import numpy as np
+
+        self.ensure_loaded()
+        self._refresh()
+        self._maybe_rebuild_in_background()
+
+        arrays = self._arrays
+        n = arrays.size
+        mask = arrays.ids[:n] >= 0
+        if active_only:
+            mask &= arrays.active[:n]
+        if category:
+            code = self._codes.get(category.lower())
+            if code is None:
+                return [], ([] if lat is not None else None)
+            mask &= arrays.category[:n] == code
+        if district:
+            code = self._codes.get(district.lower())
+            if code is None:
+                return [], ([] if lat is not None else None)
+            mask &= arrays.district[:n] == code
+        if min_price is not None:
+            mask &= arrays.price[:n] >= min_price
+        if max_price is not None:
+            mask &= arrays.price[:n] <= max_price
+        if min_rating is not None:
+            mask &= arrays.rating[:n] >= min_rating
+
+        geo = lat is not None and lng is not None
+        if geo and radius_km is not None:
+            # Bounding box en latitud: descarta casi todo antes de haversine
+            delta = radius_km / EARTH_RADIUS_KM
+            lat0 = math.radians(lat)
+            mask &= (arrays.lat[:n] >= lat0 - delta) & (arrays.lat[:n] <= lat0 + delta)
+
+        rows = np.flatnonzero(mask)
+        if search:
+            # Sin otro orden, alcanza con las primeras skip + limit coincidencias
+            needed = skip + limit if sort == "id" and not geo and arrays.ordered else None
+            rows = self._match_text(arrays.text, rows, search.lower(), needed)
+
+        distances = None
+        if geo:
+            distances = self._haversine(arrays, rows, lat, lng)
+            if radius_km is not None:
+                inside = distances <= radius_km
+                rows, distances = rows[inside], distances[inside]
+
+        if sort == "distance" and distances is not None:
+            order = self._top_k(distances, skip + limit)
+        elif sort == "rating":
+            # Mayor rating primero; empate por id
+            order = np.lexsort((arrays.ids[rows], -arrays.rating[rows]))
+        elif sort == "popular":
+            order = np.lexsort((arrays.ids[rows], -arrays.popularity[rows]))
+        else:
+            order = self._top_k(arrays.ids[rows], skip + limit)
+        order = order[skip:skip + limit]
+        page = arrays.ids[rows[order]].tolist()
+        return page, (distances[order].round(3).tolist() if distances is not None else None)
+
+    @staticmethod
+    def _match_text(text: List[str], rows: "np.ndarray", term: str, needed: Optional[int]) -> "np.ndarray":
+        """Filas de `rows` cuyo texto contiene `term` (las primeras `needed`, si se indica)"""
+        import numpy as np
+
+        if needed is None:
+            return rows[np.fromiter((term in text[i] for i in rows.tolist()), dtype=bool, count=len(rows))]
+        matches: List["np.ndarray"] = []
+        found = 0
+        for start in range(0, len(rows), _TEXT_CHUNK):
+            chunk = rows[start:start + _TEXT_CHUNK]
+            hits = chunk[np.fromiter((term in text[i] for i in chunk.tolist()), dtype=bool, count=len(chunk))]
+            matches.append(hits)
+            found += len(hits)
+            if found >= needed:
+                break
+        return np.concatenate(matches) if matches else rows
+
+    @staticmethod
+    def _haversine(arrays: _Arrays, rows: "np.ndarray", lat: float, lng: float) -> "np.ndarray":
+        import numpy as np
+
+        lat0, lng0 = math.radians(lat), math.radians(lng)
+        dlat = arrays.lat[rows] - lat0
+        dlng = arrays.lng[rows] - lng0
+        a = np.sin(dlat / 2) ** 2 + math.cos(lat0) * arrays.cos_lat[rows] * np.sin(dlng / 2) ** 2
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+    @staticmethod
+    def _top_k(keys: "np.ndarray", k: int) -> "np.ndarray":
+        """Posiciones de las k menores claves, ordenadas (argpartition + sort de k)"""
+        import numpy as np
+
+        if k < len(keys):
+            candidates = np.argpartition(keys, k)[:k]
+            return candidates[np.argsort(keys[candidates], kind="stable")]
+        return np.argsort(keys, kind="stable")
+
+    def contains(self, service_id: int) -> bool:
+        """Si el servicio existe (activo o no)"""
+        self.ensure_loaded()
+        self._refresh()
+        return service_id in self._rows
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+
+index = ServiceIndex()
+
+
+def _on_event(event: events.ChangeEvent) -> None:
+    if event.entity == "services":
+        index.mark_service(event.entity_id)
+    elif event.entity == "reviews":
+        values = event.values or {}
+        if values.get("service_id") is not None:
+            index.mark_service(values["service_id"])
+
+
+def _on_invalidation(message: Invalidation) -> None:
+    if message.entity == RESYNC_ENTITY:
+        index.schedule_rebuild()
+        return
+    # Los cambios locales llegan con más detalle por el stream de eventos
+    if message.origin == bus.origin or message.entity_id is None:
+        return
+    if message.entity == "services":
+        index.mark_service(message.entity_id)
+    elif message.entity == "reviews":
+        index.mark_review(message.entity_id)
+
+
+if settings.SERVICE_INDEX_ENABLED:
+    events.stream.subscribe(_on_event)
+    bus.subscribe(_on_invalidation)
@@ -0,0 +1,218 @@
+"""
+Contadores de popularidad de servicios: vistas del detalle y clics de
+contacto.
+
+Un UPDATE por vista sobre la fila del servicio serializaría los requests
+sobre las filas más populares. En cambio los requests suman en memoria y
+un hilo de fondo escribe cada SERVICE_STATS_FLUSH_SECONDS las diferencias
+acumuladas en un solo INSERT ... ON CONFLICT DO UPDATE por lote sobre
+service_stats. Si el proceso muere se pierde a lo sumo ese intervalo; al apagarse se escribe lo
+pendiente.
+
+Cada hilo suma en su propio dict con un lock que solo comparte con el
+flush (sin contención en la práctica). Tras escribir, el flush resta lo
+escrito y borra las claves en cero: los dicts guardan solo lo del
+intervalo actual, y un incremento concurrente con el flush nunca se
+pierde. Los totales que devuelve el upsert actualizan la popularidad del
+índice en memoria (sort=popular).
+"""
+
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from app.core import metrics
+from app.core.config import settings
+
+logger = logging.getLogger("app.service_stats")
+
+KINDS = ("views", "contacts")
+
+Key = Tuple[int, str]
+
+
+def popularity(views: int, contacts: int) -> float:
+    return float(views) + settings.SERVICE_STATS_CONTACT_WEIGHT * float(contacts)
+
+
+class _Shard:
+    __slots__ = ("lock", "counts")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts: Dict[Key, int] = {}
+
+
+class ServiceCounters:
+    def __init__(self):
+        self._local = threading.local()
+        self._shards: List[_Shard] = []
+        self._shards_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _shard(self) -> _Shard:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = _Shard()
+            with self._shards_lock:
+                self._shards.append(shard)
+            return shard
+
+    def inc(self, service_id: int, kind: str) -> None:
+        shard = self._shard()
+        key = (service_id, kind)
+        with shard.lock:
+            counts = shard.counts
+            if key in counts:
+                counts[key] += 1
+                return
+            # El tope es por intervalo: el flush libera las claves escritas
+            if len(counts) < settings.SERVICE_STATS_MAX_KEYS:
+                counts[key] = 1
+                return
+        metrics.service_stats_dropped.inc(kind)
+
+    def record_view(self, service_id: int) -> None:
+        self.inc(service_id, "views")
+
+    def record_contact(self, service_id: int) -> None:
+        self.inc(service_id, "contacts")
+
+    def _pending(self) -> Dict[Key, int]:
+        """Incrementos sin escribir de todos los hilos"""
+        with self._shards_lock:
+            shards = list(self._shards)
+        pending: Dict[Key, int] = {}
+        for shard in shards:
+            with shard.lock:
+                for key, value in shard.counts.items():
+                    pending[key] = pending.get(key, 0) + value
+        return pending
+
+    def _subtract(self, written: Dict[Key, int]) -> None:
+        """Descuenta lo ya escrito, shard por shard, y borra las claves en cero"""
+        remaining = dict(written)
+        with self._shards_lock:
+            shards = list(self._shards)
+        for shard in shards:
+            with shard.lock:
+                counts = shard.counts
+                for key in [k for k in counts if remaining.get(k)]:
+                    taken = min(counts[key], remaining[key])
+                    remaining[key] -= taken
+                    if counts[key] == taken:
+                        del counts[key]
+                    else:
+                        counts[key] -= taken
+
+    def pending_for(self, service_id: int) -> Dict[str, int]:
+        """Vistas y contactos de este worker aún no escritos en la base (O(hilos))"""
+        with self._shards_lock:
+            shards = list(self._shards)
+        # dict.get es atómico: no hace falta el lock de cada shard para leer
+        return {
+            kind: sum(shard.counts.get((service_id, kind), 0) for shard in shards)
+            for kind in KINDS
+        }
+
+    # --------------------------------------------
+    # Escritura en la base
+    # --------------------------------------------
+
+    def flush(self) -> int:
+        """Escribe los incrementos pendientes; devuelve cuántos servicios tocó"""
+        with self._flush_lock:
+            pending = self._pending()
+            if not pending:
+                return 0
+            by_service: Dict[int, Dict[str, int]] = {}
+            for (service_id, kind), delta in pending.items():
+                by_service.setdefault(service_id, dict.fromkeys(KINDS, 0))[kind] += delta
+            totals = _upsert(by_service)
+            # Solo tras escribir: si la base falla, el próximo flush reintenta.
+            # Los servicios borrados también se descuentan (ya se descartaron)
+            self._subtract(pending)
+        for (service_id, kind), delta in pending.items():
+            if service_id in totals:
+                metrics.service_stats_flushed.inc(kind, amount=delta)
+            else:
+                metrics.service_stats_dropped.inc(kind, amount=delta)
+
+        from app.core.service_index import index
+        index.set_popularity({
+            service_id: popularity(views, contacts)
+            for service_id, (views, contacts) in totals.items()
+        })
+        return len(totals)
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._flush_loop, name="service-stats", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread = None
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("No se pudieron escribir los contadores pendientes")
+
+    def _flush_loop(self) -> None:
+        while not self._stop.wait(settings.SERVICE_STATS_FLUSH_SECONDS):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("No se pudieron escribir los contadores de servicios")
+
+
+def _upsert(by_service: Dict[int, Dict[str, int]]) -> Dict[int, Tuple[int, int]]:
+    """
+    Suma los incrementos en service_stats (un INSERT ... ON CONFLICT por
+    lote de 500) y devuelve los totales resultantes. Los servicios que ya
+    no existen se descartan.
+    """
+    from sqlalchemy import func, select
+
+    from app.db.base import Service, ServiceStat
+    from app.db.session import SessionLocal
+
+    db = SessionLocal()
+    try:
+        if db.get_bind().dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+
+        ids = list(by_service)
+        existing = set()
+        for start in range(0, len(ids), 500):
+            existing.update(db.scalars(select(Service.id).where(Service.id.in_(ids[start:start + 500]))))
+        rows = [
+            {"service_id": service_id, **counts}
+            for service_id, counts in by_service.items() if service_id in existing
+        ]
+        totals: Dict[int, Tuple[int, int]] = {}
+        for start in range(0, len(rows), 500):
+            stmt = insert(ServiceStat).values(rows[start:start + 500])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[ServiceStat.service_id],
+                set_={
+                    "views": ServiceStat.views + stmt.excluded.views,
+                    "contacts": ServiceStat.contacts + stmt.excluded.contacts,
+                    "updated_at": func.now(),
+                },
+            ).returning(ServiceStat.service_id, ServiceStat.views, ServiceStat.contacts)
+            for service_id, views, contacts in db.execute(stmt):
+                totals[service_id] = (views, contacts)
+        db.commit()
+        return totals
+    finally:
+        db.close()
+
+
+counters = ServiceCounters()
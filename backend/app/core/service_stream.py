@@ -0,0 +1,196 @@
+"""
+Feed de cambios de servicios por viewport (Server-Sent Events).
+
+Cada conexión SSE registra un Viewer con su bounding box en una grilla de
+celdas (ViewportIndex): un cambio solo se compara con los viewers de la
+celda de su ubicación anterior y nueva, no con todas las conexiones.
+Los viewports que cubren demasiadas celdas (mapa muy alejado) quedan en
+una lista aparte que sí se revisa completa.
+
+El hub consume el stream de eventos del dominio de este worker y las
+invalidaciones recibidas de otros workers por el bus; en ambos casos lee
+el servicio una sola vez y entrega el mismo payload a todos los viewers
+afectados.
+
+Los cambios de rating producidos por reseñas no se emiten: el cliente los
+obtiene al abrir el detalle o en la próxima recarga completa.
+"""
+
+import asyncio
+import json
+import logging
+import math
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.core import events, metrics
+from app.core.config import settings
+from app.core.invalidation import Invalidation, bus
+
+logger = logging.getLogger("app.service_stream")
+
+Coords = Tuple[float, float]
+Cell = Tuple[int, int]
+
+
+class Viewer:
+    """Conexión SSE suscrita a un bounding box (lat/lng en grados)"""
+
+    def __init__(self, min_lat: float, min_lng: float, max_lat: float, max_lng: float, queue_size: int):
+        self.min_lat, self.min_lng = min_lat, min_lng
+        self.max_lat, self.max_lng = max_lat, max_lng
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.cells: Optional[List[Cell]] = None
+
+    def contains(self, coords: Optional[Coords]) -> bool:
+        if coords is None:
+            return False
+        lat, lng = coords
+        return self.min_lat <= lat <= self.max_lat and self.min_lng <= lng <= self.max_lng
+
+    def send(self, event: str, data: str) -> None:
+        if self.queue.full():
+            # El cliente no da abasto: se descartan los deltas pendientes y
+            # se le pide recargar el listado completo
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(("reset", "{}"))
+            return
+        self.queue.put_nowait((event, data))
+
+
+class ViewportIndex:
+    """Grilla de celdas → viewers; se usa solo desde el event loop"""
+
+    def __init__(self, cell_degrees: float, max_cells: int):
+        self.cell_degrees = cell_degrees
+        self.max_cells = max_cells
+        self._cells: Dict[Cell, Set[Viewer]] = defaultdict(set)
+        self._wide: Set[Viewer] = set()
+        self.size = 0
+
+    def _cell(self, lat: float, lng: float) -> Cell:
+        return (math.floor(lat / self.cell_degrees), math.floor(lng / self.cell_degrees))
+
+    def add(self, viewer: Viewer) -> None:
+        lat0, lng0 = self._cell(viewer.min_lat, viewer.min_lng)
+        lat1, lng1 = self._cell(viewer.max_lat, viewer.max_lng)
+        if (lat1 - lat0 + 1) * (lng1 - lng0 + 1) > self.max_cells:
+            self._wide.add(viewer)
+        else:
+            viewer.cells = [(i, j) for i in range(lat0, lat1 + 1) for j in range(lng0, lng1 + 1)]
+            for cell in viewer.cells:
+                self._cells[cell].add(viewer)
+        self.size += 1
+
+    def remove(self, viewer: Viewer) -> None:
+        if viewer.cells is None:
+            self._wide.discard(viewer)
+        else:
+            for cell in viewer.cells:
+                bucket = self._cells.get(cell)
+                if bucket is not None:
+                    bucket.discard(viewer)
+                    if not bucket:
+                        del self._cells[cell]
+        self.size -= 1
+
+    def match(self, coords: Optional[Coords]) -> Set[Viewer]:
+        if coords is None:
+            return set()
+        candidates = self._cells.get(self._cell(*coords), set()) | self._wide
+        return {v for v in candidates if v.contains(coords)}
+
+
+def _load_service(service_id: int) -> Optional[str]:
+    """JSON del servicio (con dueño) si existe y está activo"""
+    from app.db.base import Service
+    from app.db.session import SessionLocal
+    from app.schemas.service import ServiceWithOwner
+
+    db = SessionLocal()
+    try:
+        service = db.get(Service, service_id)
+        if service is None or not service.is_active:
+            return None
+        return ServiceWithOwner.model_validate(service).model_dump_json()
+    finally:
+        db.close()
+
+
+class ServiceStreamHub:
+    def __init__(self):
+        self.index = ViewportIndex(settings.SERVICE_STREAM_CELL_DEGREES, settings.SERVICE_STREAM_MAX_CELLS)
+        self._subscription: Optional[events.QueueSubscription] = None
+        self._task: Optional[asyncio.Task] = None
+        bus.subscribe(self._on_remote)
+
+    def start(self) -> None:
+        """Se llama desde el lifespan (dentro del event loop)"""
+        self._subscription = events.stream.subscribe_queue(
+            maxsize=10000, predicate=lambda e: e.entity == "services"
+        )
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._subscription is not None:
+            self._subscription.close()
+            self._subscription = None
+
+    def register(self, viewer: Viewer) -> bool:
+        if self.index.size >= settings.SERVICE_STREAM_MAX_CONNECTIONS:
+            return False
+        self.index.add(viewer)
+        metrics.stream_connections.inc()
+        return True
+
+    def unregister(self, viewer: Viewer) -> None:
+        self.index.remove(viewer)
+        metrics.stream_connections.dec()
+
+    def _on_remote(self, message: Invalidation) -> None:
+        # Los cambios locales ya llegan por el stream de eventos
+        if message.origin == bus.origin or message.entity != "services" or self._subscription is None:
+            return
+        self._subscription.deliver(events.ChangeEvent(
+            entity=message.entity,
+            action=message.action,
+            entity_id=message.entity_id,
+            changed_fields=frozenset(),
+            old_coords=message.old_coords,
+            new_coords=message.new_coords,
+        ))
+
+    async def _run(self) -> None:
+        while True:
+            event = await self._subscription.get()
+            try:
+                await self._dispatch(event)
+            except Exception:
+                logger.exception("Error distribuyendo el cambio del servicio %s", event.entity_id)
+
+    async def _dispatch(self, event: events.ChangeEvent) -> None:
+        was_in = self.index.match(event.old_coords)
+        now_in = self.index.match(event.new_coords) if event.action != "delete" else set()
+        if not was_in and not now_in:
+            return
+        payload = await run_in_threadpool(_load_service, event.entity_id) if now_in else None
+        if payload is None:
+            # Borrado, desactivado o fuera de todos los viewports
+            now_in = set()
+        removed = json.dumps({"id": event.entity_id})
+        for viewer in was_in - now_in:
+            viewer.send("removed", removed)
+        for viewer in now_in:
+            viewer.send("updated" if viewer in was_in else "added", payload)
+
+
+hub = ServiceStreamHub()
@@ -0,0 +1,367 @@
+"""
+Servicios similares cercanos ("también te puede servir").
+
+El puntaje entre dos servicios combina:
+
+- texto: Jaccard entre las palabras (normalizadas, sin tildes ni palabras
+  vacías) de nombre + descripción,
+- categoría: misma categoría o no,
+- distancia: 1 / (1 + km / SIMILAR_DISTANCE_SCALE_KM).
+
+Servicios de otra categoría con poco texto en común no se consideran
+similares aunque estén al lado.
+
+Las listas se precalculan y se guardan en service_neighbors; el endpoint
+las lee con una consulta por índice. Para no comparar todos contra todos
+se agrupa por celda geohash (SIMILAR_GEOHASH_PRECISION) y cada servicio se
+compara solo con los de su celda y las 8 vecinas.
+
+Cálculo completo (despliegue inicial, cambio de pesos):
+
+    python -m app.core.similar
+
+Después se mantiene de forma incremental: cada servicio creado, editado
+o borrado en este worker entra a una cola y un hilo de fondo recalcula su
+lista, las listas que lo incluían y las de los vecinos donde entra. Si la
+cola se llena se descarta el cambio (queda para el próximo cálculo
+completo).
+"""
+
+import argparse
+import heapq
+import logging
+import math
+import queue
+import re
+import threading
+import unicodedata
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from app.core import events, geohash
+from app.core.config import settings
+from app.core.service_index import EARTH_RADIUS_KM
+
+logger = logging.getLogger("app.similar")
+
+# Campos del servicio que cambian su puntaje con otros
+SIMILAR_FIELDS = frozenset({"category", "service_name", "description", "latitude", "longitude", "is_active"})
+
+# Pesos del puntaje (suman 1)
+TEXT_WEIGHT = 0.5
+CATEGORY_WEIGHT = 0.3
+DISTANCE_WEIGHT = 0.2
+# Texto mínimo en común para recomendar un servicio de otra categoría
+MIN_TEXT_OTHER_CATEGORY = 0.2
+
+_WORD = re.compile(r"[a-z0-9ñ]+")
+_STOPWORDS = frozenset(
+    "de del la las el los en y o a al con para por sin un una unos unas se su sus mi tu que es "
+    "lo como mas muy todo todos tipo tipos servicio servicios".split()
+)
+
+# (puntaje, id del vecino)
+Neighbors = List[Tuple[float, int]]
+
+
+def tokens(text: str) -> FrozenSet[str]:
+    """Palabras sin tildes (la ñ se conserva), sin palabras vacías ni plurales simples"""
+    chars: List[str] = []
+    for c in unicodedata.normalize("NFKD", text.casefold()):
+        if not unicodedata.combining(c):
+            chars.append(c)
+        elif c == "\u0303" and chars and chars[-1] == "n":
+            chars[-1] = "ñ"
+    words = set()
+    for word in _WORD.findall("".join(chars)):
+        if len(word) < 3 or word in _STOPWORDS:
+            continue
+        # "gasfiters" y "gasfiter" cuentan igual
+        words.add(word[:-1] if len(word) > 4 and word.endswith("s") else word)
+    return frozenset(words)
+
+
+def _haversine(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    dlat = math.radians(lat2 - lat1)
+    dlng = math.radians(lng2 - lng1)
+    a = (math.sin(dlat / 2) ** 2
+         + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlng / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0)))
+
+
+@dataclass(frozen=True)
+class Doc:
+    """Servicio activo con lo necesario para compararlo"""
+    id: int
+    category: str
+    latitude: float
+    longitude: float
+    words: FrozenSet[str]
+    cell: str
+
+    @classmethod
+    def from_row(cls, row) -> "Doc":
+        service_id, category, lat, lng, name, description = row
+        return cls(
+            service_id, category.casefold(), lat, lng,
+            tokens(f"{name} {description}"),
+            geohash.encode(lat, lng, settings.SIMILAR_GEOHASH_PRECISION),
+        )
+
+
+def similarity(a: Doc, b: Doc) -> float:
+    """Puntaje en [0, 1]; 0 si no son similares"""
+    union = len(a.words | b.words)
+    text = len(a.words & b.words) / union if union else 0.0
+    same_category = a.category == b.category
+    if not same_category and text < MIN_TEXT_OTHER_CATEGORY:
+        return 0.0
+    distance = _haversine(a.latitude, a.longitude, b.latitude, b.longitude)
+    return (
+        TEXT_WEIGHT * text
+        + CATEGORY_WEIGHT * same_category
+        + DISTANCE_WEIGHT / (1 + distance / settings.SIMILAR_DISTANCE_SCALE_KM)
+    )
+
+
+def top_neighbors(doc: Doc, candidates: Iterable[Doc], k: int) -> Neighbors:
+    scored = ((similarity(doc, other), other.id) for other in candidates if other.id != doc.id)
+    # Empates por id: resultado estable entre cálculos
+    return heapq.nlargest(k, (s for s in scored if s[0] > 0), key=lambda s: (s[0], -s[1]))
+
+
+# --------------------------------------------
+# Lectura y escritura de la base
+# --------------------------------------------
+
+def _load_docs(db, ids: Optional[Iterable[int]] = None, bounds: Optional[geohash.Bounds] = None) -> List[Doc]:
+    from sqlalchemy import select
+
+    from app.db.base import Service
+
+    stmt = select(
+        Service.id, Service.category, Service.latitude, Service.longitude,
+        Service.service_name, Service.description,
+    ).where(Service.is_active == True)
+    if ids is not None:
+        stmt = stmt.where(Service.id.in_(list(ids)))
+    if bounds is not None:
+        min_lat, min_lng, max_lat, max_lng = bounds
+        stmt = stmt.where(
+            Service.latitude.between(min_lat, max_lat), Service.longitude.between(min_lng, max_lng)
+        )
+    return [Doc.from_row(row) for row in db.execute(stmt)]
+
+
+def _delete_lists(db, service_ids: Iterable[int]) -> None:
+    from sqlalchemy import delete
+
+    from app.db.base import ServiceNeighbor
+
+    ids = sorted(service_ids)
+    for start in range(0, len(ids), 500):
+        db.execute(delete(ServiceNeighbor).where(ServiceNeighbor.service_id.in_(ids[start:start + 500])))
+
+
+def _insert_lists(db, lists: Dict[int, Neighbors]) -> None:
+    from sqlalchemy import insert
+
+    from app.db.base import ServiceNeighbor
+
+    rows = [
+        {"service_id": service_id, "rank": rank, "neighbor_id": neighbor_id, "score": score}
+        for service_id, neighbors in lists.items()
+        for rank, (score, neighbor_id) in enumerate(neighbors)
+    ]
+    for start in range(0, len(rows), 1000):
+        db.execute(insert(ServiceNeighbor), rows[start:start + 1000])
+
+
+def rebuild(db) -> int:
+    """Recalcula todas las listas; devuelve cuántos servicios tienen vecinos"""
+    from sqlalchemy import delete
+
+    from app.db.base import ServiceNeighbor
+
+    docs = _load_docs(db)
+    by_cell: Dict[str, List[Doc]] = {}
+    for doc in docs:
+        by_cell.setdefault(doc.cell, []).append(doc)
+    lists: Dict[int, Neighbors] = {}
+    for cell, members in by_cell.items():
+        candidates = [other for c in geohash.block(cell) for other in by_cell.get(c, ())]
+        for doc in members:
+            neighbors = top_neighbors(doc, candidates, settings.SIMILAR_NEIGHBORS)
+            if neighbors:
+                lists[doc.id] = neighbors
+    db.execute(delete(ServiceNeighbor))
+    _insert_lists(db, lists)
+    db.commit()
+    return len(lists)
+
+
+class _Blocks:
+    """Servicios de la celda y sus vecinas, leídos una vez por celda"""
+
+    def __init__(self, db):
+        self.db = db
+        self._cache: Dict[str, List[Doc]] = {}
+
+    def get(self, cell: str) -> List[Doc]:
+        if cell not in self._cache:
+            cells = set(geohash.block(cell))
+            boxes = [geohash.bounds(c) for c in cells]
+            bounds = (
+                min(b[0] for b in boxes), min(b[1] for b in boxes),
+                max(b[2] for b in boxes), max(b[3] for b in boxes),
+            )
+            self._cache[cell] = [doc for doc in _load_docs(self.db, bounds=bounds) if doc.cell in cells]
+        return self._cache[cell]
+
+
+def refresh(db, service_ids: Iterable[int]) -> int:
+    """
+    Actualiza las listas afectadas por cambios en esos servicios; devuelve
+    cuántas listas reescribió. Se recalculan completas la del servicio y
+    las que lo incluían (puede haber salido o bajado); en las demás del
+    bloque solo se inserta el servicio si ahora entra entre los mejores.
+    """
+    from sqlalchemy import select
+
+    from app.db.base import ServiceNeighbor
+
+    k = settings.SIMILAR_NEIGHBORS
+    changed = set(service_ids)
+    table = ServiceNeighbor.__table__
+    stale = set(db.scalars(select(table.c.service_id).where(table.c.neighbor_id.in_(changed)))) - changed
+    blocks = _Blocks(db)
+
+    lists: Dict[int, Neighbors] = {}
+    entering: Dict[int, Neighbors] = {}
+    for doc in _load_docs(db, ids=changed | stale):
+        candidates = blocks.get(doc.cell)
+        lists[doc.id] = top_neighbors(doc, candidates, k)
+        if doc.id not in changed:
+            continue
+        for other in candidates:
+            if other.id in changed or other.id in stale:
+                continue
+            # El puntaje es simétrico: sirve para la lista del otro
+            score = similarity(doc, other)
+            if score > 0:
+                entering.setdefault(other.id, []).append((score, doc.id))
+
+    if entering:
+        current: Dict[int, Neighbors] = {service_id: [] for service_id in entering}
+        rows = db.execute(
+            select(table.c.service_id, table.c.score, table.c.neighbor_id)
+            .where(table.c.service_id.in_(list(entering)))
+            .order_by(table.c.service_id, table.c.rank)
+        )
+        for service_id, score, neighbor_id in rows:
+            current[service_id].append((score, neighbor_id))
+        for service_id, additions in entering.items():
+            merged = heapq.nlargest(k, current[service_id] + additions, key=lambda s: (s[0], -s[1]))
+            if merged != current[service_id]:
+                lists[service_id] = merged
+
+    # Los que ya no están activos quedan sin lista
+    _delete_lists(db, changed | stale | set(lists))
+    _insert_lists(db, lists)
+    db.commit()
+    return len(lists)
+
+
+# --------------------------------------------
+# Actualización en segundo plano
+# --------------------------------------------
+
+class Refresher:
+    def __init__(self):
+        self._queue: queue.Queue = queue.Queue(maxsize=settings.SIMILAR_QUEUE_SIZE)
+        self._thread: Optional[threading.Thread] = None
+
+    def enqueue(self, service_id: int) -> None:
+        try:
+            self._queue.put_nowait(service_id)
+        except queue.Full:
+            logger.warning("Cola de similares llena: se descarta el servicio %s", service_id)
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="similar-services", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        try:
+            self._queue.put(None, timeout=1)
+        except queue.Full:
+            pass
+        self._thread.join(timeout=5)
+        self._thread = None
+
+    def join(self) -> None:
+        """Espera a que se procese todo lo encolado"""
+        self._queue.join()
+
+    def _run(self) -> None:
+        from app.db.session import SessionLocal
+
+        while True:
+            items = [self._queue.get()]
+            # Lo que se acumuló mientras tanto va en la misma pasada
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            service_ids: Set[int] = {item for item in items if item is not None}
+            try:
+                if service_ids:
+                    db = SessionLocal()
+                    try:
+                        refresh(db, service_ids)
+                    finally:
+                        db.close()
+            except Exception:
+                logger.exception("Error actualizando servicios similares")
+            finally:
+                for _ in items:
+                    self._queue.task_done()
+            if None in items:
+                return
+
+
+refresher = Refresher()
+
+
+def _on_event(event: events.ChangeEvent) -> None:
+    # Los cambios de otros workers los procesa el worker que escribió
+    if event.entity != "services":
+        return
+    if event.action != "update" or event.changed_fields & SIMILAR_FIELDS:
+        refresher.enqueue(event.entity_id)
+
+
+if settings.SIMILAR_ENABLED:
+    events.stream.subscribe(_on_event)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Recalcula los servicios similares de todos los servicios")
+    parser.parse_args(argv)
+
+    from app.db.session import SessionLocal
+
+    db = SessionLocal()
+    try:
+        count = rebuild(db)
+    finally:
+        db.close()
+    print(f"Servicios con similares: {count}")
+
+
+if __name__ == "__main__":
+    main()
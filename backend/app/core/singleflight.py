@@ -0,0 +1,148 @@
+"""
+Coalescencia de lecturas idénticas concurrentes (single-flight).
+
+Cuando llegan a la vez muchos requests iguales con el caché frío (un
+enlace al mapa compartido masivamente), sin coalescer cada uno ejecuta la
+misma consulta y serialización. Con `SingleFlight` el primero de cada
+clave (líder) calcula y el resto (seguidores) espera su resultado o su
+excepción; cuando el líder termina la clave se libera y el siguiente
+request vuelve a calcular (o, normalmente, encuentra el caché lleno).
+
+Sirve tanto para endpoints síncronos (threadpool) como asíncronos, y los
+dos pueden mezclarse sobre la misma clave:
+
+- `do(key, fn)`: el líder ejecuta `fn()` en su hilo; los seguidores
+  bloquean su hilo hasta el resultado.
+- `do_async(key, fn)`: el líder ejecuta `await fn()` como tarea aparte
+  (si el request del líder se cancela, los seguidores igual reciben el
+  resultado); los seguidores esperan sin ocupar un hilo.
+
+Los seguidores esperan a lo más `timeout` segundos por clave y luego
+reciben SingleFlightTimeout (el líder sigue calculando). La clave debe
+incluir todo lo que cambie el resultado, incluida la generación del
+caché que haya encima: un request posterior a una invalidación no debe
+sumarse a un cálculo que empezó antes.
+"""
+
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple, TypeVar
+
+from app.core import metrics
+
+T = TypeVar("T")
+
+
+class SingleFlightTimeout(TimeoutError):
+    """El seguidor se cansó de esperar al líder"""
+
+
+def _resolve(future: asyncio.Future, value: Any, error: Optional[BaseException]) -> None:
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(value)
+
+
+class _Call:
+    """Cálculo en curso de una clave"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+        # Seguidores asíncronos: (loop, future) a resolver al terminar
+        self.waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+    def result(self) -> Any:
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key: Hashable) -> Tuple[_Call, bool]:
+        """El cálculo en curso de la clave, o uno nuevo si el llamador es el líder"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                metrics.singleflight_calls.inc(self.name, "follower")
+                return call, False
+            call = self._calls[key] = _Call()
+        metrics.singleflight_calls.inc(self.name, "leader")
+        return call, True
+
+    def _finish(self, key: Hashable, call: _Call, value: Any, error: Optional[BaseException]) -> None:
+        with self._lock:
+            call.value, call.error = value, error
+            call.done.set()
+            if self._calls.get(key) is call:
+                del self._calls[key]
+            waiters, call.waiters = call.waiters, []
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_resolve, future, value, error)
+            except RuntimeError:
+                # El loop del seguidor ya cerró
+                pass
+
+    def _timed_out(self, key: Hashable, timeout: Optional[float]) -> SingleFlightTimeout:
+        metrics.singleflight_calls.inc(self.name, "timeout")
+        return SingleFlightTimeout(f"{self.name}: sin resultado para {key!r} tras {timeout} s")
+
+    def do(self, key: Hashable, fn: Callable[[], T], timeout: Optional[float] = None) -> T:
+        """Ejecuta `fn()` una sola vez por clave entre los llamadores concurrentes"""
+        call, leader = self._join(key)
+        if not leader:
+            if not call.done.wait(timeout):
+                raise self._timed_out(key, timeout)
+            return call.result()
+        try:
+            value = fn()
+        except BaseException as error:
+            self._finish(key, call, None, error)
+            raise
+        self._finish(key, call, value, None)
+        return value
+
+    async def do_async(
+        self, key: Hashable, fn: Callable[[], Awaitable[T]], timeout: Optional[float] = None
+    ) -> T:
+        """Como `do`, para corrutinas; debe llamarse desde el event loop"""
+        call, leader = self._join(key)
+        if leader:
+            task = asyncio.ensure_future(fn())
+
+            def done(task: asyncio.Task) -> None:
+                if task.cancelled():
+                    self._finish(key, call, None, asyncio.CancelledError())
+                else:
+                    self._finish(key, call, task.result() if task.exception() is None else None,
+                                 task.exception())
+
+            task.add_done_callback(done)
+            # El request del líder puede cancelarse sin cancelar el cálculo
+            return await asyncio.shield(task)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            if call.done.is_set():
+                return call.result()
+            call.waiters.append((loop, future))
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            # wait_for cancela el future al vencer; si no, el TimeoutError es del líder
+            if not future.cancelled():
+                raise
+            raise self._timed_out(key, timeout) from None
+
+    def __len__(self) -> int:
+        return len(self._calls)
@@ -0,0 +1,124 @@
+"""
+Warm-up del worker tras el arranque.
+
+Corre en segundo plano desde el lifespan de la app: /health responde de
+inmediato y /ready devuelve 503 hasta que el warm-up termina, así el
+orquestador no enruta tráfico a un worker frío.
+"""
+
+import logging
+import threading
+import time
+
+from fastapi import FastAPI
+
+from app.core.config import settings
+
+logger = logging.getLogger("app.warmup")
+
+_complete = threading.Event()
+
+
+def is_complete() -> bool:
+    return _complete.is_set()
+
+
+def mark_complete() -> None:
+    _complete.set()
+
+
+def _open_pool_connections() -> None:
+    """Abre conexiones del pool por adelantado (handshake TCP/TLS/auth)"""
+    from app.db.session import engine
+
+    size = getattr(engine.pool, "size", lambda: 1)()
+    connections = []
+    try:
+        for _ in range(max(1, min(settings.WARMUP_POOL_CONNECTIONS, size))):
+            connections.append(engine.connect())
+    finally:
+        for conn in connections:
+            conn.close()
+
+
+def _prime_caches() -> None:
+    """Llena los cachés de categorías y del listado de servicios por defecto"""
+    from app.api.v1.endpoints.categories import list_categories
+    from app.api.v1.endpoints.services import list_services
+    from app.db.session import SessionLocal
+
+    db = SessionLocal()
+    try:
+        list_categories(db)
+        list_services(db)
+    finally:
+        db.close()
+
+
+def _load_service_index() -> None:
+    """Carga el índice en memoria del listado de servicios"""
+    from app.core.service_index import index
+
+    if settings.SERVICE_INDEX_ENABLED:
+        index.ensure_loaded()
+
+
+def _load_price_stats() -> None:
+    """Arma los sketches de precios por categoría y zona"""
+    from app.core.price_stats import stats
+
+    if settings.PRICE_STATS_ENABLED:
+        stats.ensure_loaded()
+
+
+def _load_districts() -> None:
+    """Carga los límites de comunas (R-tree) usados al guardar servicios"""
+    from app.core.districts import districts
+
+    districts.ensure_loaded()
+
+
+def _load_saved_searches() -> None:
+    """Carga el índice inverso de búsquedas guardadas"""
+    from app.core.saved_search import percolator
+
+    if settings.SAVED_SEARCH_ENABLED:
+        percolator.ensure_loaded()
+
+
+def _prebuild_validators(app: FastAPI) -> None:
+    """
+    Genera el esquema OpenAPI (recorre y construye los JSON schema de todos los
+    modelos Pydantic) y carga jose y el backend de bcrypt, que se importan
+    de forma diferida.
+    """
+    from app.core.security import decode_access_token, get_pwd_context
+
+    app.openapi()
+    decode_access_token("warmup")
+    get_pwd_context().handler().get_backend()
+
+
+def run_warmup(app: FastAPI) -> None:
+    started = time.perf_counter()
+    steps = (
+        ("pool", _open_pool_connections),
+        ("service_index", _load_service_index),
+        ("saved_searches", _load_saved_searches),
+        ("price_stats", _load_price_stats),
+        ("districts", _load_districts),
+        ("caches", _prime_caches),
+        ("validators", lambda: _prebuild_validators(app)),
+    )
+    try:
+        for name, step in steps:
+            step_started = time.perf_counter()
+            try:
+                step()
+            except Exception:
+                # Un paso fallido no debe impedir servir: solo se pierde el warm-up
+                logger.exception("Warm-up: falló el paso %s", name)
+            logger.info("Warm-up: %s en %.1f ms", name, (time.perf_counter() - step_started) * 1000)
+    finally:
+        mark_complete()
+        logger.info("Warm-up completo en %.1f ms", (time.perf_counter() - started) * 1000)
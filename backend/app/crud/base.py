@@ -1,13 +1,45 @@
-from typing import Any, Dict, Generic, List, Optional, Type, TypeVar, Union
+from functools import lru_cache
+from typing import Any, Dict, Generic, List, Optional, Sequence, Tuple, Type, TypeVar, Union
 from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
+from sqlalchemy import bindparam, inspect, select
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from app.core import events
 from app.db.base import Base
 
 ModelType = TypeVar("ModelType", bound=Base)
 CreateSchemaType = TypeVar("CreateSchemaType", bound=BaseModel)
 UpdateSchemaType = TypeVar("UpdateSchemaType", bound=BaseModel)
 
+
+@lru_cache(maxsize=None)
+def column_keys(model: Type[Any]) -> Tuple[str, ...]:
+    """Atributos de columna del modelo (introspección del mapper, una vez por modelo)"""
+    return tuple(attr.key for attr in inspect(model).column_attrs)
+
+
+def column_values(obj: Any) -> Dict[str, Any]:
+    """Valores actuales de las columnas mapeadas de una instancia"""
+    return {key: getattr(obj, key) for key in column_keys(type(obj))}
+
+
+def commit_written(db: Session, db_obj: Any) -> Dict[str, Any]:
+    """
+    Confirma la escritura de `db_obj` sin volver a leerlo: el flush trae las
+    columnas generadas por la base con INSERT/UPDATE ... RETURNING
+    (eager_defaults en los modelos), y tras el commit, que expira la
+    sesión, los valores se vuelven a fijar como ya confirmados. Devuelve
+    los valores de las columnas.
+    """
+    db.flush()
+    values = column_values(db_obj)
+    db.commit()
+    for key, value in values.items():
+        set_committed_value(db_obj, key, value)
+    return values
+
+
 class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
     """Clase base para operaciones CRUD"""
     
@@ -19,24 +51,47 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         * `model`: Clase del modelo SQLAlchemy
         """
         self.model = model
+        # Las consultas fijas se construyen una vez y se reutilizan con
+        # parámetros: SQLAlchemy no vuelve a armar el SELECT ni a calcular su
+        # clave de caché de compilación en cada llamada
+        self._multi_stmt = select(model).offset(bindparam("skip")).limit(bindparam("limit"))
+
+    def _emit(
+        self,
+        action: str,
+        db_obj: Any,
+        before: Optional[Dict[str, Any]] = None,
+        after: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """Publica el cambio (ya confirmado) en el stream de eventos del dominio"""
+        if after is None and action != "delete":
+            after = column_values(db_obj)
+        values = after if after is not None else before
+        events.emit(db_obj.__tablename__, action, values["id"], before, after)
+
+    def _query(self, db: Session, columns: Optional[Sequence[str]] = None):
+        """Query del modelo completo o solo de las columnas indicadas"""
+        if columns:
+            return db.query(*(getattr(self.model, c) for c in columns))
+        return db.query(self.model)
 
     def get(self, db: Session, id: Any) -> Optional[ModelType]:
-        """Obtener un registro por ID"""
-        return db.query(self.model).filter(self.model.id == id).first()
+        """Obtener un registro por ID (sin consulta si ya está en la sesión)"""
+        return db.get(self.model, id)
 
     def get_multi(
         self, db: Session, *, skip: int = 0, limit: int = 100
     ) -> List[ModelType]:
         """Obtener múltiples registros"""
-        return db.query(self.model).offset(skip).limit(limit).all()
+        return db.scalars(self._multi_stmt, {"skip": skip, "limit": limit}).all()
 
     def create(self, db: Session, *, obj_in: CreateSchemaType) -> ModelType:
         """Crear un nuevo registro"""
         obj_in_data = jsonable_encoder(obj_in)
         db_obj = self.model(**obj_in_data)
         db.add(db_obj)
-        db.commit()
-        db.refresh(db_obj)
+        after = commit_written(db, db_obj)
+        self._emit("create", db_obj, after=after)
         return db_obj
 
     def update(
@@ -46,23 +101,38 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         db_obj: ModelType,
         obj_in: Union[UpdateSchemaType, Dict[str, Any]]
     ) -> ModelType:
-        """Actualizar un registro existente"""
-        obj_data = jsonable_encoder(db_obj)
+        """Actualizar un registro existente (solo las columnas que cambian)"""
+        before = column_values(db_obj)
         if isinstance(obj_in, dict):
             update_data = obj_in
         else:
             update_data = obj_in.model_dump(exclude_unset=True)
-        for field in obj_data:
-            if field in update_data:
-                setattr(db_obj, field, update_data[field])
+        changed = {
+            field: value for field, value in update_data.items()
+            if field in before and before[field] != value
+        }
+        if not changed:
+            # Sin cambios no hay UPDATE; se confirma lo que hubiera pendiente
+            if db.new or db.dirty or db.deleted:
+                db.commit()
+            return db_obj
+        for field, value in changed.items():
+            setattr(db_obj, field, value)
         db.add(db_obj)
-        db.commit()
-        db.refresh(db_obj)
+        after = commit_written(db, db_obj)
+        self._emit("update", db_obj, before, after)
         return db_obj
 
     def remove(self, db: Session, *, id: int) -> ModelType:
         """Eliminar un registro"""
-        obj = db.query(self.model).get(id)
+        obj = db.get(self.model, id)
         db.delete(obj)
+        # Session.delete ya aplicó las cascadas: se capturan los valores de
+        # todo lo que se va a borrar para emitir un evento por cada fila
+        removed = [(o, column_values(o)) for o in db.deleted if o is not obj]
+        snapshot = column_values(obj)
         db.commit()
+        self._emit("delete", obj, snapshot)
+        for cascaded, values in removed:
+            self._emit("delete", cascaded, values)
         return obj
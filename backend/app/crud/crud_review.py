@@ -1,20 +1,40 @@
-from typing import List, Optional
+from typing import List, Optional, Sequence
+from sqlalchemy import bindparam, select
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 from fastapi import HTTPException
-from app.crud.base import CRUDBase
+from app.crud.base import CRUDBase, column_values, commit_written
 from app.db.base import Review
 from app.schemas.review import ReviewCreate, ReviewUpdate
 
+# Consultas fijas construidas una vez (ver CRUDBase)
+_BY_SERVICE = (
+    select(Review).where(Review.service_id == bindparam("service_id"))
+    .offset(bindparam("skip")).limit(bindparam("limit"))
+)
+_BY_USER = (
+    select(Review).where(Review.reviewer_user_id == bindparam("user_id"))
+    .offset(bindparam("skip")).limit(bindparam("limit"))
+)
+_FOR_SERVICE_AND_USER = select(Review).where(
+    Review.service_id == bindparam("service_id"),
+    Review.reviewer_user_id == bindparam("user_id")
+).limit(1)
+
 class CRUDReview(CRUDBase[Review, ReviewCreate, ReviewUpdate]):
     """Operaciones CRUD para Reseña"""
     
     def get_by_service(
-        self, db: Session, *, service_id: int, skip: int = 0, limit: int = 100
+        self, db: Session, *, service_id: int, skip: int = 0, limit: int = 100,
+        columns: Optional[Sequence[str]] = None
     ) -> List[Review]:
-        """Obtener todas las reseñas de un servicio"""
+        """Obtener todas las reseñas de un servicio (o solo las columnas indicadas)"""
+        if not columns:
+            return db.scalars(
+                _BY_SERVICE, {"service_id": service_id, "skip": skip, "limit": limit}
+            ).all()
         return (
-            db.query(Review)
+            self._query(db, columns)
             .filter(Review.service_id == service_id)
             .offset(skip)
             .limit(limit)
@@ -22,11 +42,16 @@ class CRUDReview(CRUDBase[Review, ReviewCreate, ReviewUpdate]):
         )
     
     def get_by_user(
-        self, db: Session, *, user_id: int, skip: int = 0, limit: int = 100
+        self, db: Session, *, user_id: int, skip: int = 0, limit: int = 100,
+        columns: Optional[Sequence[str]] = None
     ) -> List[Review]:
-        """Obtener todas las reseñas hechas por un usuario"""
+        """Obtener todas las reseñas hechas por un usuario (o solo las columnas indicadas)"""
+        if not columns:
+            return db.scalars(
+                _BY_USER, {"user_id": user_id, "skip": skip, "limit": limit}
+            ).all()
         return (
-            db.query(Review)
+            self._query(db, columns)
             .filter(Review.reviewer_user_id == user_id)
             .offset(skip)
             .limit(limit)
@@ -37,14 +62,9 @@ class CRUDReview(CRUDBase[Review, ReviewCreate, ReviewUpdate]):
         self, db: Session, *, service_id: int, user_id: int
     ) -> Optional[Review]:
         """Obtener la reseña de un usuario específico para un servicio"""
-        return (
-            db.query(Review)
-            .filter(
-                Review.service_id == service_id,
-                Review.reviewer_user_id == user_id
-            )
-            .first()
-        )
+        return db.scalars(
+            _FOR_SERVICE_AND_USER, {"service_id": service_id, "user_id": user_id}
+        ).first()
     
     def create_with_user(
         self, db: Session, *, obj_in: ReviewCreate, user_id: int
@@ -66,8 +86,7 @@ class CRUDReview(CRUDBase[Review, ReviewCreate, ReviewUpdate]):
         db.add(db_obj)
         
         try:
-            db.commit()
-            db.refresh(db_obj)
+            after = commit_written(db, db_obj)
         except IntegrityError:
             db.rollback()
             raise HTTPException(
@@ -75,6 +94,7 @@ class CRUDReview(CRUDBase[Review, ReviewCreate, ReviewUpdate]):
                 detail="Ya existe una reseña para este servicio"
             )
         
+        self._emit("create", db_obj, after=after)
         return db_obj
     
     def update_user_review(
@@ -91,10 +111,13 @@ class CRUDReview(CRUDBase[Review, ReviewCreate, ReviewUpdate]):
                 detail="No tienes una reseña para este servicio"
             )
         
+        if review.rating == rating:
+            return review
+        before = column_values(review)
         review.rating = rating
         db.add(review)
-        db.commit()
-        db.refresh(review)
+        after = commit_written(db, review)
+        self._emit("update", review, before, after)
         return review
 
 review = CRUDReview(Review)
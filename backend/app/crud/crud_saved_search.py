@@ -0,0 +1,37 @@
+from typing import List
+from sqlalchemy import bindparam, func, select
+from sqlalchemy.orm import Session
+from app.crud.base import CRUDBase, commit_written
+from app.db.base import SavedSearch
+from app.schemas.saved_search import SavedSearchCreate
+
+# Consultas fijas construidas una vez (ver CRUDBase)
+_BY_USER = (
+    select(SavedSearch).where(SavedSearch.user_id == bindparam("user_id"))
+    .order_by(SavedSearch.id)
+)
+_COUNT_BY_USER = select(func.count()).select_from(SavedSearch).where(
+    SavedSearch.user_id == bindparam("user_id")
+)
+
+class CRUDSavedSearch(CRUDBase[SavedSearch, SavedSearchCreate, SavedSearchCreate]):
+    """Operaciones CRUD para Búsqueda guardada"""
+
+    def get_by_user(self, db: Session, *, user_id: int) -> List[SavedSearch]:
+        """Búsquedas guardadas de un usuario"""
+        return db.scalars(_BY_USER, {"user_id": user_id}).all()
+
+    def count_by_user(self, db: Session, *, user_id: int) -> int:
+        return db.scalar(_COUNT_BY_USER, {"user_id": user_id})
+
+    def create_with_user(
+        self, db: Session, *, obj_in: SavedSearchCreate, user_id: int
+    ) -> SavedSearch:
+        """Crear búsqueda guardada del usuario (el evento la suma al percolador)"""
+        db_obj = SavedSearch(**obj_in.model_dump(), user_id=user_id)
+        db.add(db_obj)
+        after = commit_written(db, db_obj)
+        self._emit("create", db_obj, after=after)
+        return db_obj
+
+saved_search = CRUDSavedSearch(SavedSearch)
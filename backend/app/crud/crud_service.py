@@ -1,9 +1,42 @@
-from typing import List, Optional
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+from sqlalchemy import bindparam, delete, or_, select
 from sqlalchemy.orm import Session
-from app.crud.base import CRUDBase
-from app.db.base import Service
+from app.core.config import settings
+from app.crud.base import CRUDBase, commit_written
+from app.db.base import Service, ServiceNeighbor, ServiceStat, ServiceTombstone
 from app.schemas.service import ServiceCreate, ServiceUpdate
 
+# Margen para comparar marcas de agua (ver get_changes)
+_EPSILON = timedelta(microseconds=1)
+
+# Consultas fijas construidas una vez (ver CRUDBase)
+_BY_USER = (
+    select(Service).where(Service.user_id == bindparam("user_id"))
+    .offset(bindparam("skip")).limit(bindparam("limit"))
+)
+_BY_CATEGORY = (
+    select(Service)
+    .where(
+        Service.category.ilike(bindparam("category")),  # Case-insensitive match
+        Service.is_active == True
+    )
+    .offset(bindparam("skip")).limit(bindparam("limit"))
+)
+_ACTIVE = (
+    select(Service).where(Service.is_active == True)
+    .offset(bindparam("skip")).limit(bindparam("limit"))
+)
+_SEARCH = (
+    select(Service)
+    .where(
+        Service.is_active == True,
+        (Service.service_name.ilike(bindparam("term")) |
+         Service.description.ilike(bindparam("term")))
+    )
+    .offset(bindparam("skip")).limit(bindparam("limit"))
+)
+
 class CRUDService(CRUDBase[Service, ServiceCreate, ServiceUpdate]):
     """Operaciones CRUD para Servicio"""
     
@@ -11,57 +44,26 @@ class CRUDService(CRUDBase[Service, ServiceCreate, ServiceUpdate]):
         self, db: Session, *, user_id: int, skip: int = 0, limit: int = 100
     ) -> List[Service]:
         """Obtener servicios de un usuario específico"""
-        return (
-            db.query(Service)
-            .filter(Service.user_id == user_id)
-            .offset(skip)
-            .limit(limit)
-            .all()
-        )
+        return db.scalars(_BY_USER, {"user_id": user_id, "skip": skip, "limit": limit}).all()
     
     def get_by_category(
         self, db: Session, *, category: str, skip: int = 0, limit: int = 100
     ) -> List[Service]:
         """Obtener servicios por categoría (case-insensitive)"""
-        return (
-            db.query(Service)
-            .filter(
-                Service.category.ilike(category),  # Case-insensitive match
-                Service.is_active == True
-            )
-            .offset(skip)
-            .limit(limit)
-            .all()
-        )
+        return db.scalars(_BY_CATEGORY, {"category": category, "skip": skip, "limit": limit}).all()
     
     def get_active_services(
         self, db: Session, *, skip: int = 0, limit: int = 100
     ) -> List[Service]:
         """Obtener solo servicios activos"""
-        return (
-            db.query(Service)
-            .filter(Service.is_active == True)
-            .offset(skip)
-            .limit(limit)
-            .all()
-        )
+        return db.scalars(_ACTIVE, {"skip": skip, "limit": limit}).all()
     
     def search(
         self, db: Session, *, query: str, skip: int = 0, limit: int = 100
     ) -> List[Service]:
         """Buscar servicios por nombre o descripción"""
         search_term = f"%{query}%"
-        return (
-            db.query(Service)
-            .filter(
-                Service.is_active == True,
-                (Service.service_name.ilike(search_term) | 
-                 Service.description.ilike(search_term))
-            )
-            .offset(skip)
-            .limit(limit)
-            .all()
-        )
+        return db.scalars(_SEARCH, {"term": search_term, "skip": skip, "limit": limit}).all()
     
     def create_with_owner(
         self, db: Session, *, obj_in: ServiceCreate, owner_id: int
@@ -70,8 +72,55 @@ class CRUDService(CRUDBase[Service, ServiceCreate, ServiceUpdate]):
         obj_in_data = obj_in.model_dump()
         db_obj = Service(**obj_in_data, user_id=owner_id)
         db.add(db_obj)
-        db.commit()
-        db.refresh(db_obj)
+        after = commit_written(db, db_obj)
+        self._emit("create", db_obj, after=after)
         return db_obj
 
+    def remove(self, db: Session, *, id: int) -> Service:
+        """Eliminar servicio (el tombstone lo registra un evento del mapper)"""
+        # Purgar tombstones vencidos en la misma transacción
+        cutoff = datetime.now(timezone.utc) - timedelta(days=settings.SERVICE_TOMBSTONE_RETENTION_DAYS)
+        db.query(ServiceTombstone).filter(
+            ServiceTombstone.deleted_at < cutoff
+        ).delete(synchronize_session=False)
+        # Los contadores y similares se van con el servicio (SQLite no aplica la FK en cascada)
+        db.execute(delete(ServiceStat).where(ServiceStat.service_id == id))
+        db.execute(delete(ServiceNeighbor).where(ServiceNeighbor.service_id == id))
+        return super().remove(db, id=id)
+
+    def get_changes(
+        self, db: Session, *, after: Optional[Tuple[datetime, int]], limit: int = 500
+    ) -> Tuple[List[Service], List[int], bool]:
+        """
+        Servicios creados o modificados después del cursor (updated_at, id),
+        en orden, y los IDs eliminados en el mismo rango. Devuelve también si
+        quedan más páginas.
+        """
+        query = db.query(Service)
+        tombstones = db.query(ServiceTombstone.service_id)
+        if after is not None:
+            # Comparaciones con margen de 1 µs: SQLite guarda CURRENT_TIMESTAMP
+            # sin fracción y compara como texto, así la igualdad funciona en
+            # ambos motores. El rango sobre updated_at usa el índice (updated_at, id).
+            watermark, last_id = after
+            lower, upper = watermark - _EPSILON, watermark + _EPSILON
+            query = query.filter(
+                Service.updated_at > lower,
+                or_(Service.updated_at >= upper, Service.id > last_id),
+            )
+            tombstones = tombstones.filter(ServiceTombstone.deleted_at > lower)
+        services = query.order_by(Service.updated_at, Service.id).limit(limit + 1).all()
+        has_more = len(services) > limit
+        services = services[:limit]
+
+        deleted: List[int] = []
+        if after is not None:
+            if has_more:
+                # Las bajas posteriores a esta página llegan con la siguiente
+                tombstones = tombstones.filter(
+                    ServiceTombstone.deleted_at < services[-1].updated_at + _EPSILON
+                )
+            deleted = [service_id for (service_id,) in tombstones.distinct()]
+        return services, deleted, has_more
+
 service = CRUDService(Service)
@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+from app.core import events
+from app.core.config import settings
+from app.crud.base import CRUDBase
+from app.db.base import RevokedToken
+
+def _insert(db: Session):
+    """INSERT con ON CONFLICT del dialecto de la base"""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(RevokedToken)
+
+class CRUDRevokedToken(CRUDBase[RevokedToken, BaseModel, BaseModel]):
+    """Operaciones CRUD para revocaciones de tokens"""
+
+    def _purge(self, db: Session, now: datetime) -> None:
+        """Borra las revocaciones vencidas (su clave puede volver a usarse)"""
+        db.query(RevokedToken).filter(RevokedToken.expires_at < now).delete(synchronize_session=False)
+
+    def revoke_jti(self, db: Session, *, jti: str, expires_at: datetime) -> Optional[int]:
+        """
+        Revoca un token puntual (logout o rotación del refresh token) y
+        confirma. Devuelve el id de la revocación, o None si el token ya
+        estaba revocado: es un solo INSERT, así que de dos rotaciones
+        concurrentes del mismo refresh token gana una sola.
+        """
+        now = datetime.now(timezone.utc)
+        self._purge(db, now)
+        values = {"key": f"jti:{jti}", "revoked_at": now, "expires_at": expires_at}
+        stmt = (
+            _insert(db).values(**values)
+            .on_conflict_do_nothing(index_elements=[RevokedToken.key])
+            .returning(RevokedToken.id)
+        )
+        revocation_id = db.execute(stmt).scalar()
+        db.commit()
+        if revocation_id is not None:
+            events.emit(RevokedToken.__tablename__, "create", revocation_id, None, {"id": revocation_id, **values})
+        return revocation_id
+
+    def revoke_user(self, db: Session, *, user_id: int) -> None:
+        """
+        Revoca todos los tokens emitidos hasta ahora para el usuario (sin
+        confirmar: lo confirma quien llama, junto con el cambio que la motiva).
+        Si ya había una revocación del usuario se adelanta a ahora.
+        """
+        now = datetime.now(timezone.utc)
+        self._purge(db, now)
+        # Ningún token emitido antes de ahora sigue vigente después de esto
+        values = {
+            "key": f"uid:{user_id}", "revoked_at": now,
+            "expires_at": now + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS),
+        }
+        stmt = _insert(db).values(**values)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[RevokedToken.key],
+            set_={"revoked_at": stmt.excluded.revoked_at, "expires_at": stmt.excluded.expires_at},
+        ))
+
+revoked_token = CRUDRevokedToken(RevokedToken)
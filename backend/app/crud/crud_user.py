@@ -1,16 +1,27 @@
 from typing import Any, Dict, Optional, Union
+from sqlalchemy import bindparam, delete, insert, or_, select
 from sqlalchemy.orm import Session
-from app.core.security import get_password_hash, verify_password
-from app.crud.base import CRUDBase
-from app.db.base import User
+from app.core import events
+from app.core.invalidation import bus
+from app.core.security import get_password_hash, password_needs_rehash, verify_password
+from app.crud.base import CRUDBase, column_keys, column_values, commit_written
+from app.crud.crud_token import revoked_token
+from app.db.base import Review, SavedSearch, Service, ServiceNeighbor, ServiceStat, ServiceTombstone, User, update_service_ratings
 from app.schemas.user import UserCreate, UserUpdate
 
+# Consultas fijas construidas una vez (ver CRUDBase)
+_BY_EMAIL = select(User).where(User.email == bindparam("email")).limit(1)
+
+def _columns(model):
+    """Columnas mapeadas del modelo, para leer filas como dicts sin cargar instancias"""
+    return [getattr(model, key) for key in column_keys(model)]
+
 class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
     """Operaciones CRUD para Usuario"""
     
     def get_by_email(self, db: Session, *, email: str) -> Optional[User]:
         """Obtener usuario por email"""
-        return db.query(User).filter(User.email == email).first()
+        return db.scalars(_BY_EMAIL, {"email": email}).first()
 
     def create(self, db: Session, *, obj_in: UserCreate) -> User:
         """Crear usuario con contraseña hasheada"""
@@ -21,8 +32,8 @@ class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
             phone=obj_in.phone,
         )
         db.add(db_obj)
-        db.commit()
-        db.refresh(db_obj)
+        after = commit_written(db, db_obj)
+        self._emit("create", db_obj, after=after)
         return db_obj
 
     def update(
@@ -39,8 +50,72 @@ class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
             del update_data["password"]
             update_data["password_hash"] = hashed_password
         
+        # Cambio de contraseña o desactivación: invalidar las sesiones abiertas
+        # (un cambio de email llega a los claims con la próxima renovación)
+        if "password_hash" in update_data or update_data.get("is_active") is False:
+            revoked_token.revoke_user(db, user_id=db_obj.id)
+        
         return super().update(db, db_obj=db_obj, obj_in=update_data)
 
+    def remove(self, db: Session, *, id: int) -> Optional[User]:
+        """
+        Eliminar usuario con sus servicios y reseñas e invalidar sus tokens.
+        Devuelve None si el usuario ya no existe (p. ej. un borrado concurrente).
+
+        Borra por conjunto (DELETE ... WHERE) en lugar de cargar cada fila
+        en la sesión y borrarla una a una, y recalcula de una vez el rating
+        de los servicios de otros usuarios que pierden reseñas. Se emite
+        igual un evento por cada fila borrada; al resto de workers les
+        llegan agrupados (ver invalidation.bus.batch).
+        """
+        user = db.get(User, id)
+        if user is None:
+            return None
+        before = column_values(user)
+        owned = select(Service.id).where(Service.user_id == id)
+        in_scope = or_(Review.reviewer_user_id == id, Review.service_id.in_(owned))
+
+        # Lo que se borra, para los eventos (una consulta por tabla)
+        services = db.execute(select(*_columns(Service)).where(Service.user_id == id)).mappings().all()
+        reviews = db.execute(select(*_columns(Review)).where(in_scope)).mappings().all()
+        owned_ids = {s["id"] for s in services}
+        rerated = sorted({r["service_id"] for r in reviews} - owned_ids)
+
+        no_sync = {"synchronize_session": False}
+        db.execute(insert(ServiceTombstone).from_select(["service_id"], owned))
+        db.execute(delete(Review).where(in_scope), execution_options=no_sync)
+        # Las FK en cascada no aplican en SQLite (sin PRAGMA foreign_keys)
+        db.execute(delete(ServiceStat).where(ServiceStat.service_id.in_(owned)), execution_options=no_sync)
+        db.execute(delete(ServiceNeighbor).where(ServiceNeighbor.service_id.in_(owned)), execution_options=no_sync)
+        db.execute(delete(Service).where(Service.user_id == id), execution_options=no_sync)
+        db.execute(delete(SavedSearch).where(SavedSearch.user_id == id), execution_options=no_sync)
+        update_service_ratings(db.connection(), rerated)
+        # Sale de la sesión con sus valores cargados: se devuelve como respuesta
+        db.expunge(user)
+        db.execute(delete(User).where(User.id == id), execution_options=no_sync)
+        revoked_token.revoke_user(db, user_id=id)
+        db.commit()
+
+        with bus.batch():
+            self._emit("delete", user, before)
+            for values in services:
+                events.emit(Service.__tablename__, "delete", values["id"], dict(values), None)
+            for values in reviews:
+                events.emit(Review.__tablename__, "delete", values["id"], dict(values), None)
+        return user
+
+    def purge(self, *, user_id: int) -> None:
+        """
+        Eliminar un usuario ya desactivado (ver remove). Pensado para correr
+        fuera del request: abre su propia sesión.
+        """
+        from app.db.session import SessionLocal
+        db = SessionLocal()
+        try:
+            self.remove(db, id=user_id)
+        finally:
+            db.close()
+
     def authenticate(self, db: Session, *, email: str, password: str) -> Optional[User]:
         """Autenticar usuario"""
         user = self.get_by_email(db, email=email)
@@ -50,6 +125,27 @@ class CRUDUser(CRUDBase[User, UserCreate, UserUpdate]):
             return None
         return user
 
+    def needs_rehash(self, user: User) -> bool:
+        """Verificar si el hash de la contraseña usa otro costo que el configurado"""
+        return password_needs_rehash(user.password_hash)
+
+    def rehash_password(self, *, user_id: int, old_hash: str, password: str) -> None:
+        """
+        Recalcula el hash con el costo configurado. Pensado para correr fuera
+        del request (abre su propia sesión); si la contraseña cambió mientras
+        tanto, no se toca.
+        """
+        from app.db.session import SessionLocal
+        new_hash = get_password_hash(password)
+        db = SessionLocal()
+        try:
+            db.query(User).filter(User.id == user_id, User.password_hash == old_hash).update(
+                {User.password_hash: new_hash}, synchronize_session=False
+            )
+            db.commit()
+        finally:
+            db.close()
+
     def is_active(self, user: User) -> bool:
         """Verificar si el usuario está activo"""
         return user.is_active
@@ -1,10 +1,15 @@
 from sqlalchemy import (
-    Column, Integer, String, Boolean, DateTime, Float, ForeignKey, Text, UniqueConstraint, event
+    BigInteger, Column, Integer, String, Boolean, DateTime, Float, ForeignKey, Index, Text, UniqueConstraint, event
 )
 from sqlalchemy.orm import relationship, declarative_base, Session
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, null
 
-Base = declarative_base()
+class _BaseMixin:
+    # Las columnas que genera la base (id, created_at, updated_at) vuelven
+    # en el mismo INSERT/UPDATE ... RETURNING en lugar de un SELECT aparte
+    __mapper_args__ = {"eager_defaults": True}
+
+Base = declarative_base(cls=_BaseMixin)
 
 class User(Base):
     """Modelo de Usuario"""
@@ -16,7 +21,8 @@ class User(Base):
     full_name = Column(String, nullable=False)
     phone = Column(String)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # NULL explícito al crear: sin él, eager_defaults relee la columna tras el INSERT
+    updated_at = Column(DateTime(timezone=True), default=null(), onupdate=func.now())
     is_active = Column(Boolean, default=True)
     
     # Relaciones
@@ -40,7 +46,7 @@ class Service(Base):
     __tablename__ = "services"
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True, nullable=False)
     service_name = Column(String, nullable=False)
     description = Column(Text, nullable=False)
     category = Column(String, index=True, nullable=False)
@@ -50,6 +56,8 @@ class Service(Base):
     address = Column(Text, nullable=False)
     latitude = Column(Float, nullable=False)
     longitude = Column(Float, nullable=False)
+    # Comuna según las coordenadas (ver assign_service_district)
+    district_id = Column(String, index=True)
     
     # Información de contacto
     contact_method = Column(String, nullable=False)  # 'email' o 'phone'
@@ -65,23 +73,110 @@ class Service(Base):
     # Estado
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # Se fija también al crear: es la marca de agua de /services/changes
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
     # Relaciones
     owner = relationship("User", back_populates="services")
     reviews = relationship("Review", back_populates="service", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index("ix_services_updated_at_id", "updated_at", "id"),
+    )
+
+
+class ServiceTombstone(Base):
+    """Servicio eliminado, para que la sincronización incremental lo informe"""
+    __tablename__ = "service_tombstones"
+
+    id = Column(Integer, primary_key=True)
+    service_id = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+
+class ServiceStat(Base):
+    """
+    Contadores de popularidad de un servicio. No se escriben por request:
+    app.core.service_stats los acumula en memoria y los suma en lotes.
+    """
+    __tablename__ = "service_stats"
+
+    service_id = Column(
+        Integer, ForeignKey("services.id", ondelete="CASCADE"), primary_key=True, autoincrement=False
+    )
+    views = Column(BigInteger, nullable=False, default=0)
+    contacts = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class ServiceNeighbor(Base):
+    """
+    Servicios similares cercanos precalculados (ver app.core.similar): los
+    SIMILAR_NEIGHBORS mejores de cada servicio, en orden de `rank`.
+    """
+    __tablename__ = "service_neighbors"
+
+    service_id = Column(
+        Integer, ForeignKey("services.id", ondelete="CASCADE"), primary_key=True, autoincrement=False
+    )
+    rank = Column(Integer, primary_key=True, autoincrement=False)
+    # Sin FK en cascada: al borrar un servicio, las listas que lo incluían se
+    # buscan por este índice para recalcularlas (el endpoint omite los borrados)
+    neighbor_id = Column(Integer, nullable=False, index=True)
+    score = Column(Float, nullable=False)
+
+
+class SavedSearch(Base):
+    """
+    Búsqueda guardada: categoría, palabras clave y/o círculo geográfico.
+    Cuando se publica o cambia un servicio que la cumple se avisa al dueño
+    (ver app.core.saved_search).
+    """
+    __tablename__ = "saved_searches"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True, nullable=False)
+    name = Column(String, nullable=False)
+    category = Column(String)
+    keywords = Column(String)
+    latitude = Column(Float)
+    longitude = Column(Float)
+    radius_km = Column(Float)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class SearchDemand(Base):
+    """
+    Resumen de búsquedas por celda geohash × categoría × hora (ver
+    app.core.search_demand). `geohash` vacío: búsquedas sin ubicación;
+    `category` vacía: sin categoría reconocible. `empty` cuenta las que no
+    devolvieron resultados (demanda sin oferta).
+    """
+    __tablename__ = "search_demand"
+
+    geohash = Column(String, primary_key=True)
+    category = Column(String, primary_key=True)
+    hour = Column(DateTime(timezone=True), primary_key=True)
+    searches = Column(BigInteger, nullable=False, default=0)
+    empty = Column(BigInteger, nullable=False, default=0)
+
+    __table_args__ = (
+        # Purga por antigüedad sin recorrer la tabla
+        Index("ix_search_demand_hour", "hour"),
+    )
+
 
 class Review(Base):
     """Modelo de Reseña"""
     __tablename__ = "reviews"
     
     id = Column(Integer, primary_key=True, index=True)
-    service_id = Column(Integer, ForeignKey("services.id"), nullable=False)
-    reviewer_user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    service_id = Column(Integer, ForeignKey("services.id", ondelete="CASCADE"), nullable=False)
+    reviewer_user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True, nullable=False)
     rating = Column(Float, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # NULL explícito al crear: sin él, eager_defaults relee la columna tras el INSERT
+    updated_at = Column(DateTime(timezone=True), default=null(), onupdate=func.now())
     
     # Relaciones
     service = relationship("Service", back_populates="reviews")
@@ -93,6 +188,22 @@ class Review(Base):
     )
 
 
+class RevokedToken(Base):
+    """
+    Revocación de tokens: `key` es "jti:<id del token>" (logout) o
+    "uid:<id de usuario>" (invalida los tokens emitidos antes de revoked_at).
+    Las filas vencidas (expires_at) ya no afectan a ningún token vigente.
+    `key` es única: rotar un refresh token es insertar su "jti:", y si ya
+    estaba, otro request lo usó primero.
+    """
+    __tablename__ = "revoked_tokens"
+
+    id = Column(Integer, primary_key=True)
+    key = Column(String, unique=True, index=True, nullable=False)
+    revoked_at = Column(DateTime(timezone=True), index=True, nullable=False)
+    expires_at = Column(DateTime(timezone=True), index=True, nullable=False)
+
+
 # ============================================
 # Eventos para actualizar ratings automáticamente
 # ============================================
@@ -113,7 +224,10 @@ def update_service_rating_after_insert(mapper, connection, target):
     
     # Actualizar servicio
     connection.execute(
-        text("UPDATE services SET rating = :rating, total_reviews = :total WHERE id = :service_id"),
+        text(
+            "UPDATE services SET rating = :rating, total_reviews = :total, "
+            "updated_at = CURRENT_TIMESTAMP WHERE id = :service_id"
+        ),
         {"rating": float(avg_rating or 0.0), "total": int(total), "service_id": service_id}
     )
 
@@ -139,12 +253,66 @@ def update_service_rating_after_delete(mapper, connection, target):
     
     # Actualizar servicio
     connection.execute(
-        text("UPDATE services SET rating = :rating, total_reviews = :total WHERE id = :service_id"),
+        text(
+            "UPDATE services SET rating = :rating, total_reviews = :total, "
+            "updated_at = CURRENT_TIMESTAMP WHERE id = :service_id"
+        ),
         {"rating": float(avg_rating or 0.0), "total": int(total), "service_id": service_id}
     )
 
 
+def update_service_ratings(connection, service_ids) -> None:
+    """
+    Recalcula rating y total de reseñas de varios servicios con un solo
+    UPDATE por tanda (subconsultas correlacionadas), para bajas masivas
+    """
+    from sqlalchemy import bindparam, select, update
+
+    reviews = Review.__table__
+    services = Service.__table__
+    stmt = (
+        update(services)
+        .where(services.c.id.in_(bindparam("ids", expanding=True)))
+        .values(
+            rating=func.coalesce(
+                select(func.avg(reviews.c.rating))
+                .where(reviews.c.service_id == services.c.id).scalar_subquery(),
+                0.0,
+            ),
+            total_reviews=select(func.count())
+            .where(reviews.c.service_id == services.c.id).scalar_subquery(),
+            updated_at=func.current_timestamp(),
+        )
+    )
+    service_ids = list(service_ids)
+    for start in range(0, len(service_ids), 500):
+        connection.execute(stmt, {"ids": service_ids[start:start + 500]})
+
+
+def record_service_tombstone(mapper, connection, target):
+    """Registra la baja del servicio (también si se borra en cascada con su dueño)"""
+    connection.execute(ServiceTombstone.__table__.insert().values(service_id=target.id))
+
+
+def assign_service_district(mapper, connection, target):
+    """Asigna la comuna al crear el servicio o al cambiar sus coordenadas"""
+    from sqlalchemy import inspect
+
+    from app.core.districts import districts
+
+    state = inspect(target)
+    if (
+        state.pending
+        or state.attrs.latitude.history.has_changes()
+        or state.attrs.longitude.history.has_changes()
+    ):
+        target.district_id = districts.locate(target.latitude, target.longitude)
+
+
 # Registrar eventos
 event.listen(Review, 'after_insert', update_service_rating_after_insert)
 event.listen(Review, 'after_update', update_service_rating_after_update)
 event.listen(Review, 'after_delete', update_service_rating_after_delete)
+event.listen(Service, 'after_delete', record_service_tombstone)
+event.listen(Service, 'before_insert', assign_service_district)
+event.listen(Service, 'before_update', assign_service_district)
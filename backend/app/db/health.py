@@ -0,0 +1,41 @@
+import logging
+import threading
+import time
+from typing import Optional, Tuple
+
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.db.session import engine
+
+logger = logging.getLogger("app.db")
+_lock = threading.Lock()
+_last_check: Optional[Tuple[float, bool, Optional[str]]] = None
+
+
+def check_database() -> Tuple[bool, Optional[str]]:
+    """
+    Verifica conectividad con la base de datos (SELECT 1).
+
+    El resultado se cachea READINESS_CACHE_SECONDS para que los probes del
+    orquestador no agreguen carga; un solo hilo ejecuta el check a la vez.
+    """
+    global _last_check
+    now = time.monotonic()
+    cached = _last_check
+    if cached and now - cached[0] < settings.READINESS_CACHE_SECONDS:
+        return cached[1], cached[2]
+
+    with _lock:
+        cached = _last_check
+        if cached and time.monotonic() - cached[0] < settings.READINESS_CACHE_SECONDS:
+            return cached[1], cached[2]
+        try:
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            result = (True, None)
+        except Exception as e:
+            logger.error("Readiness: base de datos no disponible: %s", e)
+            result = (False, str(e))
+        _last_check = (time.monotonic(), *result)
+        return result
@@ -1,12 +1,51 @@
+from sqlalchemy import inspect, text
 from sqlalchemy.orm import Session
-from .base import Base, Category
+from .base import Base, Category, RevokedToken, Service, ServiceNeighbor
 from .session import engine
+from app.core.districts import backfill as backfill_districts, districts
+from app.core import similar
 
 def init_db(db: Session) -> None:
     """Inicializa la base de datos y carga las categorías"""
     # Crear todas las tablas
     Base.metadata.create_all(bind=engine)
 
+    # create_all no agrega columnas ni índices a tablas existentes; updated_at
+    # antes solo se fijaba al modificar, y la sincronización incremental lo necesita
+    if "district_id" not in {c["name"] for c in inspect(engine).get_columns("services")}:
+        db.execute(text("ALTER TABLE services ADD COLUMN district_id VARCHAR"))
+        db.commit()
+    for index in Service.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+    db.execute(text("UPDATE services SET updated_at = created_at WHERE updated_at IS NULL"))
+    db.commit()
+
+    # revoked_tokens.key pasó a ser única (rotación atómica del refresh
+    # token): se deja la revocación más reciente de cada clave
+    key_index = next(
+        (i for i in inspect(engine).get_indexes("revoked_tokens") if i["name"] == "ix_revoked_tokens_key"), None
+    )
+    if key_index is not None and not key_index["unique"]:
+        db.execute(text(
+            "DELETE FROM revoked_tokens WHERE id NOT IN "
+            "(SELECT MAX(id) FROM revoked_tokens GROUP BY key)"
+        ))
+        db.execute(text("DROP INDEX ix_revoked_tokens_key"))
+        db.commit()
+        for index in RevokedToken.__table__.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+    # Comuna de los servicios que aún no la tienen (si hay límites cargados)
+    districts.ensure_loaded()
+    if len(districts):
+        changed = backfill_districts(db)
+        if changed:
+            print(f"✓ Comuna asignada a {changed} servicios")
+
+    # Primer cálculo de servicios similares; después se mantienen solos
+    if db.query(Service.id).first() and not db.query(ServiceNeighbor.service_id).first():
+        print(f"✓ Servicios similares calculados para {similar.rebuild(db)} servicios")
+
     # Verificar si ya existen categorías
     if db.query(Category).first():
         print("✓ Las categorías ya están cargadas")
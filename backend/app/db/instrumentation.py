@@ -0,0 +1,185 @@
+import json
+import logging
+import queue
+import random
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+
+logger = logging.getLogger("app.db")
+
+# Estadísticas del request en curso. El middleware coloca un objeto mutable;
+# los endpoints sync corren en el threadpool con una copia del contexto, así
+# que los hooks del engine modifican ese mismo objeto.
+_current_stats: ContextVar[Optional["QueryStats"]] = ContextVar("query_stats", default=None)
+_explaining: ContextVar[bool] = ContextVar("explaining", default=False)
+
+
+@dataclass
+class QueryStats:
+    """Métricas de base de datos acumuladas durante un request"""
+    count: int = 0
+    total_ms: float = 0.0
+    slowest_ms: float = 0.0
+    slowest_statement: Optional[str] = None
+    statements: Counter = field(default_factory=Counter)
+
+    def record(self, statement: str, elapsed_ms: float) -> None:
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.statements[statement] += 1
+        if elapsed_ms > self.slowest_ms:
+            self.slowest_ms = elapsed_ms
+            self.slowest_statement = statement
+
+    @property
+    def most_repeated(self) -> int:
+        return max(self.statements.values(), default=0)
+
+    def server_timing(self) -> str:
+        """Valor para la cabecera Server-Timing"""
+        return (
+            f'db;dur={self.total_ms:.2f};desc="{self.count} queries", '
+            f"db-slowest;dur={self.slowest_ms:.2f}"
+        )
+
+
+def start_request() -> tuple:
+    """Comienza a acumular estadísticas; devuelve (stats, token) para reset"""
+    stats = QueryStats()
+    return stats, _current_stats.set(stats)
+
+
+def end_request(token) -> None:
+    _current_stats.reset(token)
+
+
+def log_request(method: str, path: str, status_code: int, elapsed_ms: float, stats: QueryStats) -> None:
+    """Línea de log estructurada (JSON) con el costo de base de datos del request"""
+    payload = {
+        "event": "request",
+        "method": method,
+        "path": path,
+        "status": status_code,
+        "duration_ms": round(elapsed_ms, 2),
+        "db_queries": stats.count,
+        "db_ms": round(stats.total_ms, 2),
+        "db_slowest_ms": round(stats.slowest_ms, 2),
+    }
+    if stats.most_repeated >= settings.REPEATED_QUERY_WARNING:
+        # La misma sentencia repetida muchas veces suele ser un N+1
+        statement, times = stats.statements.most_common(1)[0]
+        payload["possible_n_plus_one"] = {"times": times, "statement": statement}
+        logger.warning(json.dumps(payload, ensure_ascii=False))
+    elif random.random() < settings.QUERY_LOG_SAMPLE_RATE:
+        logger.info(json.dumps(payload, ensure_ascii=False))
+
+
+def _explain(conn, statement: str, parameters) -> Optional[str]:
+    """Obtiene el plan de ejecución de una consulta lenta"""
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    token = _explaining.set(True)
+    try:
+        rows = conn.exec_driver_sql(prefix + statement, parameters).fetchall()
+        return "\n".join(" ".join(str(col) for col in row) for row in rows)
+    except Exception as e:  # el EXPLAIN nunca debe romper el registro
+        return f"(EXPLAIN falló: {e})"
+    finally:
+        _explaining.reset(token)
+
+
+class SlowQueryExplainer:
+    """
+    Registra las consultas lentas con su plan. El EXPLAIN corre en un hilo
+    de fondo con su propia conexión, no en la del request: la consulta
+    original no espera un segundo viaje a la base. La cola es acotada (si
+    se llena, la consulta se registra sin plan) y cada sentencia se explica
+    a lo más una vez cada SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS.
+    """
+
+    def __init__(self):
+        self._queue: queue.Queue = queue.Queue(maxsize=100)
+        self._explained_at: dict = {}
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, engine: Engine, statement: str, parameters, elapsed_ms: float, explain: bool) -> None:
+        """Encola la consulta lenta; nunca bloquea"""
+        if explain:
+            now = time.monotonic()
+            last = self._explained_at.get(statement)
+            explain = last is None or now - last >= settings.SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS
+            if explain:
+                if len(self._explained_at) > 1000:
+                    self._explained_at.clear()
+                self._explained_at[statement] = now
+        if explain:
+            self._ensure_started()
+            try:
+                self._queue.put_nowait((engine, statement, parameters, elapsed_ms))
+                return
+            except queue.Full:
+                pass
+        _log_slow_query(statement, elapsed_ms, None)
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="slow-query-explain", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            engine, statement, parameters, elapsed_ms = self._queue.get()
+            try:
+                with engine.connect() as conn:
+                    plan = _explain(conn, statement, parameters)
+            except Exception as e:
+                plan = f"(EXPLAIN falló: {e})"
+            _log_slow_query(statement, elapsed_ms, plan)
+
+
+def _log_slow_query(statement: str, elapsed_ms: float, plan: Optional[str]) -> None:
+    logger.warning(json.dumps({
+        "event": "slow_query",
+        "duration_ms": round(elapsed_ms, 2),
+        "statement": statement,
+        "plan": plan,
+    }, ensure_ascii=False))
+
+
+explainer = SlowQueryExplainer()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _explaining.get():
+        return
+    elapsed_ms = (time.perf_counter() - context._query_started) * 1000
+
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.record(statement, elapsed_ms)
+
+    if elapsed_ms >= settings.SLOW_QUERY_THRESHOLD_MS:
+        is_select = statement.lstrip().upper().startswith("SELECT")
+        explainer.submit(conn.engine, statement, parameters, elapsed_ms, is_select and not executemany)
+
+
+def install(engine: Engine) -> None:
+    """Registra los hooks de medición sobre el engine"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
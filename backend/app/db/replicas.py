@@ -0,0 +1,126 @@
+"""
+Réplicas de lectura.
+
+Las sesiones de las rutas de solo lectura (get_read_db) consultan una
+réplica elegida en round-robin entre las sanas; el resto, y cualquier
+escritura (flush), va al primario. Una réplica que falla (error de
+conexión) sale de rotación hasta que el chequeo periódico vuelve a
+responder.
+
+Read-your-writes: cuando un usuario autenticado confirma una escritura, sus
+lecturas van al primario durante REPLICA_STICKY_SECONDS. La marca se
+difunde por el bus de invalidación para que valga en todos los workers.
+"""
+
+import itertools
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+from app.core.invalidation import Invalidation, bus
+
+logger = logging.getLogger("app.db")
+
+# Entidad de los mensajes del bus que marcan a un usuario como escritor reciente
+WRITES_ENTITY = "db_writes"
+
+
+class Replica:
+    def __init__(self, name: str, engine: Engine):
+        self.name = name
+        self.engine = engine
+        self.healthy = True
+        event.listen(engine, "handle_error", self._on_error)
+
+    def _on_error(self, context) -> None:
+        if context.is_disconnect or context.connection is None:
+            if self.healthy:
+                logger.warning("Réplica %s fuera de rotación: %s", self.name, context.original_exception)
+            self.healthy = False
+
+    def check(self) -> bool:
+        try:
+            with self.engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            if not self.healthy:
+                logger.info("Réplica %s de vuelta en rotación", self.name)
+            self.healthy = True
+        except Exception:
+            self.healthy = False
+        return self.healthy
+
+
+class ReplicaSet:
+    def __init__(self, replicas: List[Replica]):
+        self.replicas = replicas
+        self._cycle = itertools.count()
+        self._sticky: Dict[int, float] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        bus.subscribe(self._on_invalidation)
+
+    def __bool__(self) -> bool:
+        return bool(self.replicas)
+
+    def pick(self, user_id: Optional[int] = None) -> Optional[Engine]:
+        """Engine de una réplica sana, o None si la lectura debe ir al primario"""
+        if user_id is not None and self.is_sticky(user_id):
+            return None
+        healthy = [r for r in self.replicas if r.healthy]
+        if not healthy:
+            return None
+        return healthy[next(self._cycle) % len(healthy)].engine
+
+    def is_sticky(self, user_id: int) -> bool:
+        until = self._sticky.get(user_id)
+        return until is not None and until > time.monotonic()
+
+    def mark_writer(self, user_id: int) -> None:
+        self._mark(user_id)
+        bus.publish(WRITES_ENTITY, user_id, "update")
+
+    def _mark(self, user_id: int) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if len(self._sticky) > 10000:
+                self._sticky = {k: v for k, v in self._sticky.items() if v > now}
+            self._sticky[user_id] = now + settings.REPLICA_STICKY_SECONDS
+
+    def _on_invalidation(self, message: Invalidation) -> None:
+        # Los mensajes propios ya se marcaron en mark_writer
+        if message.entity == WRITES_ENTITY and message.origin != bus.origin and message.entity_id is not None:
+            self._mark(message.entity_id)
+
+    def start(self) -> None:
+        if self.replicas and self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._health_loop, name="replica-health", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread = None
+
+    def _health_loop(self) -> None:
+        while not self._stop.wait(settings.REPLICA_HEALTH_CHECK_SECONDS):
+            for replica in self.replicas:
+                replica.check()
+
+
+def cache_fill_ttl(db, cache) -> Optional[float]:
+    """
+    TTL para guardar en `cache` un valor leído con la sesión `db`. Si vino
+    de una réplica y el caché se invalidó hace menos de
+    REPLICA_STICKY_SECONDS, la réplica puede no tener aún el cambio: se
+    guarda solo por lo que resta de esa ventana. None = TTL normal.
+    """
+    if db.info.get("replica") is None:
+        return None
+    remaining = cache.cleared_at + settings.REPLICA_STICKY_SECONDS - time.monotonic()
+    return remaining if remaining > 0 else None
@@ -1,31 +1,101 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from typing import Optional
+
+from fastapi import Request
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker
 from app.core.config import settings
+from app.db import instrumentation
+from app.db.replicas import Replica, ReplicaSet
+
+def _create_engine(url: str):
+    # Configuración condicional según el motor de base de datos
+    if url.startswith("sqlite"):
+        # SQLite: requiere check_same_thread=False para FastAPI
+        engine = create_engine(
+            url,
+            connect_args={"check_same_thread": False}
+        )
+    else:
+        # PostgreSQL: usa pool_pre_ping para reconexiones automáticas
+        # Forzar uso de psycopg (v3) en lugar de psycopg2
+        if url.startswith("postgresql://") and "+psycopg" not in url:
+            url = url.replace("postgresql://", "postgresql+psycopg://")
+
+        # Sentencias preparadas del lado del servidor: psycopg prepara una
+        # consulta después de DB_PREPARE_THRESHOLD ejecuciones en la misma
+        # conexión ("none" las desactiva, necesario detrás de PgBouncer en
+        # modo transacción)
+        connect_args = {}
+        if url.startswith("postgresql+psycopg://"):
+            connect_args["prepare_threshold"] = settings.db_prepare_threshold
+        engine = create_engine(
+            url,
+            pool_pre_ping=True,
+            connect_args=connect_args
+        )
+
+    if settings.QUERY_INSTRUMENTATION:
+        instrumentation.install(engine)
+    return engine
+
+engine = _create_engine(settings.SQLALCHEMY_DATABASE_URL)
+
+replicas = ReplicaSet([
+    Replica(f"replica{i}", _create_engine(url))
+    for i, url in enumerate(settings.database_replica_urls)
+])
+
+class RoutingSession(Session):
+    """
+    Sesión que lee de la réplica asignada en `info["replica"]` (si hay) y
+    escribe siempre en el primario
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        replica = self.info.get("replica")
+        if replica is not None and not self._flushing:
+            return replica
+        return super().get_bind(mapper=mapper, clause=clause, **kw)
+
+SessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, bind=engine)
+
+@event.listens_for(RoutingSession, "after_flush")
+def _record_write(session, flush_context):
+    session.info["wrote"] = True
+
+@event.listens_for(RoutingSession, "after_commit")
+def _mark_writer(session):
+    # Read-your-writes: el autor lee del primario por un rato
+    if session.info.pop("wrote", False) and session.info.get("user_id") is not None:
+        replicas.mark_writer(session.info["user_id"])
+
+def _request_user_id(request: Request) -> Optional[int]:
+    """Id del usuario del token (sin validar revocación: solo decide a qué base leer)"""
+    authorization = request.headers.get("authorization", "")
+    if authorization[:7].lower() != "bearer ":
+        return None
+    from app.core.security import decode_access_token
+    payload = decode_access_token(authorization[7:])
+    return payload.get("uid") if payload else None
+
+def get_db(request: Request):
+    """Dependencia para obtener la sesión de base de datos (primario)"""
+    db = SessionLocal()
+    if replicas:
+        db.info["user_id"] = _request_user_id(request)
+    try:
+        yield db
+    finally:
+        db.close()
 
-# Configuración condicional según el motor de base de datos
-if settings.SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
-    # SQLite: requiere check_same_thread=False para FastAPI
-    engine = create_engine(
-        settings.SQLALCHEMY_DATABASE_URL,
-        connect_args={"check_same_thread": False}
-    )
-else:
-    # PostgreSQL: usa pool_pre_ping para reconexiones automáticas
-    # Forzar uso de psycopg (v3) en lugar de psycopg2
-    db_url = settings.SQLALCHEMY_DATABASE_URL
-    if db_url.startswith("postgresql://") and "+psycopg" not in db_url:
-        db_url = db_url.replace("postgresql://", "postgresql+psycopg://")
-    
-    engine = create_engine(
-        db_url,
-        pool_pre_ping=True
-    )
-
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-def get_db():
-    """Dependencia para obtener la sesión de base de datos"""
+def get_read_db(request: Request):
+    """
+    Dependencia para rutas de solo lectura: usa una réplica si hay alguna
+    sana y el usuario no escribió recientemente
+    """
     db = SessionLocal()
+    if replicas:
+        db.info["replica"] = replicas.pick(_request_user_id(request))
     try:
         yield db
     finally:
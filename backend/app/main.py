@@ -1,36 +1,72 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 
 from app.api.v1.api import api_router
+from app.core import (
+    admission, metrics, profiling, saved_search, search_demand, service_stats, service_stream, similar, warmup
+)
+from app.core.invalidation import bus
+from app.core.singleflight import SingleFlight, SingleFlightTimeout
 from app.core.config import settings
+from app.db import instrumentation
+from app.db.health import check_database
+from app.db.session import replicas
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Inicia el bus de invalidación, el chequeo de réplicas, el feed SSE, el
+    flush de contadores de servicios y de demanda de búsquedas, el
+    percolador de búsquedas guardadas y la actualización de servicios
+    similares, y lanza el warm-up en segundo plano
+    """
+    bus.start()
+    replicas.start()
+    service_stream.hub.start()
+    service_stats.counters.start()
+    if settings.SEARCH_DEMAND_ENABLED:
+        search_demand.recorder.start()
+    if settings.SAVED_SEARCH_ENABLED:
+        saved_search.percolator.start()
+    if settings.SIMILAR_ENABLED:
+        similar.refresher.start()
+    task = None
+    if settings.WARMUP_ENABLED:
+        task = asyncio.create_task(run_in_threadpool(warmup.run_warmup, app))
+    else:
+        warmup.mark_complete()
+    yield
+    if task is not None and not task.done():
+        await task
+    await service_stream.hub.stop()
+    saved_search.percolator.stop()
+    similar.refresher.stop()
+    # Escribe lo pendiente antes de soltar las conexiones
+    service_stats.counters.stop()
+    search_demand.recorder.stop()
+    replicas.stop()
+    bus.stop()
 
 app = FastAPI(
     title="Mapa de Servicios API",
     version="1.0.0",
-    description="API REST para el sistema de mapa de servicios locales"
+    description="API REST para el sistema de mapa de servicios locales",
+    lifespan=lifespan
 )
 
-# Seguridad mínima para MVP:
-# - CORS abierto solo en desarrollo; restringido en producción a CORS_ORIGINS
-if settings.ENVIRONMENT == "development":
-    app.add_middleware(
-        CORSMiddleware,
-        allow_origins=["*"],
-        allow_credentials=True,
-        allow_methods=["*"],
-        allow_headers=["*"]
-    )
-else:
-    if not settings.CORS_ORIGINS:
-        raise RuntimeError("CORS_ORIGINS vacío en producción. Define la variable de entorno CORS_ORIGINS.")
-    app.add_middleware(
-        CORSMiddleware,
-        allow_origins=settings.CORS_ORIGINS,
-        allow_credentials=True,
-        allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
-        allow_headers=["Authorization", "Content-Type"],
-        expose_headers=["Content-Type"],
-        max_age=600
+@app.exception_handler(SingleFlightTimeout)
+async def single_flight_timeout(request: Request, exc: SingleFlightTimeout):
+    """Un request idéntico en curso no terminó a tiempo: el cliente reintenta"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Servicio ocupado, reintenta en unos segundos"},
+        headers={"Retry-After": "1"},
     )
 
 # Cabeceras de seguridad básicas
@@ -59,6 +95,62 @@ async def security_headers(request: Request, call_next):
         )
     return response
 
+# Conteo de consultas y tiempo de base de datos por request
+if settings.QUERY_INSTRUMENTATION:
+    @app.middleware("http")
+    async def query_instrumentation(request: Request, call_next):
+        stats, token = instrumentation.start_request()
+        started = time.perf_counter()
+        try:
+            response = await call_next(request)
+        finally:
+            instrumentation.end_request(token)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        response.headers["Server-Timing"] = (
+            f"{stats.server_timing()}, app;dur={elapsed_ms:.2f}"
+        )
+        instrumentation.log_request(
+            request.method, request.url.path, response.status_code, elapsed_ms, stats
+        )
+        return response
+
+# Profiling por request con la cabecera X-Profile-Token (solo si está habilitado)
+if settings.PROFILING_ENABLED:
+    app.middleware("http")(profiling.profile_request_middleware)
+
+# Rate limiting y tope de concurrencia: rechaza antes de ejecutar nada más
+if settings.ADMISSION_ENABLED:
+    app.add_middleware(admission.AdmissionMiddleware)
+
+# Seguridad mínima para MVP:
+# - CORS abierto solo en desarrollo; restringido en producción a CORS_ORIGINS
+# - Se agrega después de la admisión para envolverla: los 429/503 también
+#   llevan Access-Control-Allow-Origin y el navegador puede leer Retry-After
+if settings.ENVIRONMENT == "development":
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"]
+    )
+else:
+    if not settings.CORS_ORIGINS:
+        raise RuntimeError("CORS_ORIGINS vacío en producción. Define la variable de entorno CORS_ORIGINS.")
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=settings.CORS_ORIGINS,
+        allow_credentials=True,
+        allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
+        allow_headers=["Authorization", "Content-Type"],
+        expose_headers=["Content-Type", "Retry-After"],
+        max_age=600
+    )
+
+# Métricas por ruta; se agrega al final para envolver todo el stack
+if settings.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+
 # Incluir router de API v1
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
@@ -76,3 +168,26 @@ def read_root():
 def health_check():
     """Endpoint de health check"""
     return {"status": "healthy"}
+
+# Los probes simultáneos comparten un hilo del threadpool en lugar de
+# ocupar uno cada uno esperando el lock de check_database
+_readiness_flight = SingleFlight("readiness")
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: warm-up terminado y conexión a la base de datos (cacheada)"""
+    if not warmup.is_complete():
+        return JSONResponse(status_code=503, content={"status": "warming_up"})
+    ok, _ = await _readiness_flight.do_async(
+        "database", lambda: run_in_threadpool(check_database),
+        timeout=settings.SINGLE_FLIGHT_TIMEOUT_SECONDS
+    )
+    if not ok:
+        return JSONResponse(status_code=503, content={"status": "unavailable"})
+    return {"status": "ready"}
+
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    def metrics_endpoint():
+        """Métricas en formato de texto de Prometheus"""
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
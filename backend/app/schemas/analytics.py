@@ -0,0 +1,9 @@
+from pydantic import BaseModel
+
+class DemandCell(BaseModel):
+    """Celda del mapa de calor de búsquedas (centro de la celda geohash)"""
+    geohash: str
+    latitude: float
+    longitude: float
+    searches: int
+    empty: int
@@ -0,0 +1,9 @@
+from pydantic import BaseModel
+
+class District(BaseModel):
+    """Schema de Comuna (de los límites cargados en app.core.districts)"""
+    id: str
+    name: str
+
+    class Config:
+        from_attributes = True
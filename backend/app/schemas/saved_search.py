@@ -0,0 +1,58 @@
+from pydantic import BaseModel, field_validator, model_validator
+from datetime import datetime
+from typing import Optional
+from app.core.config import settings
+
+# Propiedades compartidas
+class SavedSearchBase(BaseModel):
+    """Schema base de Búsqueda guardada"""
+    name: str
+    category: Optional[str] = None
+    keywords: Optional[str] = None  # todas las palabras deben aparecer
+    # Círculo geográfico (los tres juntos o ninguno)
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    radius_km: Optional[float] = None
+
+# Propiedades para crear una búsqueda guardada
+class SavedSearchCreate(SavedSearchBase):
+    """Schema para crear una búsqueda guardada"""
+
+    @field_validator('name')
+    @classmethod
+    def name_must_not_be_empty(cls, v):
+        v = v.strip()
+        if not v:
+            raise ValueError('El nombre es requerido')
+        return v
+
+    @field_validator('category', 'keywords')
+    @classmethod
+    def blank_as_none(cls, v):
+        return v.strip() or None if v is not None else None
+
+    @model_validator(mode='after')
+    def check_filters(self):
+        geo = (self.latitude, self.longitude, self.radius_km)
+        if any(v is not None for v in geo) and any(v is None for v in geo):
+            raise ValueError('latitude, longitude y radius_km deben indicarse juntos')
+        if self.radius_km is not None:
+            if not -90 <= self.latitude <= 90 or not -180 <= self.longitude <= 180:
+                raise ValueError('Coordenadas inválidas')
+            if self.radius_km <= 0 or self.radius_km > settings.SAVED_SEARCH_MAX_RADIUS_KM:
+                raise ValueError(
+                    f'El radio debe ser mayor a 0 y a lo más {settings.SAVED_SEARCH_MAX_RADIUS_KM:g} km'
+                )
+        if self.category is None and self.keywords is None and self.radius_km is None:
+            raise ValueError('Indica al menos una categoría, palabras clave o un radio')
+        return self
+
+# Propiedades para devolver a través de la API
+class SavedSearch(SavedSearchBase):
+    """Schema de Búsqueda guardada completo"""
+    id: int
+    user_id: int
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
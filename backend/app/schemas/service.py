@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel, EmailStr, field_validator
 from datetime import datetime
 from app.schemas.user import UserPublic
@@ -59,6 +59,7 @@ class Service(ServiceBase):
     """Schema de Servicio completo"""
     id: int
     user_id: int
+    district_id: Optional[str] = None  # comuna, asignada según las coordenadas
     rating: float
     total_reviews: int
     is_active: bool
@@ -79,3 +80,34 @@ class Service(ServiceBase):
 class ServiceWithOwner(Service):
     """Schema de Servicio con información pública del propietario"""
     owner: UserPublic  # Solo expone ID y nombre completo
+
+# Respuesta de la sincronización incremental
+class ServiceChanges(BaseModel):
+    """
+    Cambios desde una marca de agua. El cliente aplica primero `deleted` y
+    luego `services`, y guarda `next` para la próxima llamada. Si `reset` es
+    True la marca de agua expiró y debe sincronizar desde cero.
+    """
+    services: List[ServiceWithOwner]
+    deleted: List[int]
+    next: str
+    has_more: bool
+    reset: bool = False
+
+# Contadores de popularidad
+class ServiceStats(BaseModel):
+    """Vistas del detalle y clics de contacto (incluye lo aún no escrito de este worker)"""
+    service_id: int
+    views: int
+    contacts: int
+
+# Precios típicos por categoría y zona
+class PriceStats(BaseModel):
+    """Cuartiles de precio de una categoría y modalidad (aproximados, ver relative_error)"""
+    category: str
+    price_modality: str
+    count: int
+    p25: float
+    p50: float
+    p75: float
+    relative_error: float
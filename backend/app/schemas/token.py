@@ -1,10 +1,29 @@
+from typing import Optional
 from pydantic import BaseModel
 
 class Token(BaseModel):
     """Schema para el token de acceso"""
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = None
 
 class TokenData(BaseModel):
     """Schema para los datos del token"""
     email: str | None = None
+
+class Principal(BaseModel):
+    """Usuario autenticado según los claims del token (sin consultar la base)"""
+    id: int
+    email: str
+    is_active: bool
+    jti: Optional[str] = None
+    exp: Optional[float] = None
+
+class RefreshRequest(BaseModel):
+    """Schema para renovar o cerrar la sesión con el refresh token"""
+    refresh_token: str
+
+class LogoutRequest(BaseModel):
+    """Schema para cerrar la sesión (el refresh token es opcional)"""
+    refresh_token: Optional[str] = None
@@ -0,0 +1 @@
+# Benchmarks de rendimiento para la API de Mapa de Servicios
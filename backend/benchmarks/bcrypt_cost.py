@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Calibración del costo de bcrypt y throughput de login por costo.
+
+Para cada costo mide cuánto tarda verificar una contraseña (lo mismo que
+paga cada login) en este hardware, y de ahí los logins/segundo por core.
+Con --processes además mide el throughput real con varios procesos en
+paralelo. Con --target-ms recomienda el mayor costo cuya verificación
+entra en la latencia objetivo (el valor para BCRYPT_ROUNDS).
+
+Uso (desde backend/):
+    python -m benchmarks.bcrypt_cost --target-ms 250
+    python -m benchmarks.bcrypt_cost --min-cost 10 --max-cost 14 --processes 4
+    python -m benchmarks.bcrypt_cost --output bcrypt.json
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import statistics
+import time
+from typing import Dict, List, Optional
+
+PASSWORD = "contraseña-de-prueba"
+
+
+def _context(cost: int):
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], bcrypt__rounds=cost)
+
+
+def _verify_loop(hashed: str, count: int) -> float:
+    context = _context(4)  # El costo de la verificación lo define el hash
+    started = time.perf_counter()
+    for _ in range(count):
+        context.verify(PASSWORD, hashed)
+    return time.perf_counter() - started
+
+
+def measure_cost(cost: int, min_seconds: float) -> Dict[str, float]:
+    """Latencia de verificación (mediana) y logins/s en un core"""
+    hashed = _context(cost).hash(PASSWORD)
+    samples: List[float] = []
+    started = time.perf_counter()
+    # Al menos 3 muestras; más mientras no se cumpla el tiempo mínimo
+    while len(samples) < 3 or time.perf_counter() - started < min_seconds:
+        samples.append(_verify_loop(hashed, 1))
+    median_ms = statistics.median(samples) * 1000
+    return {
+        "cost": cost,
+        "samples": len(samples),
+        "verify_ms": round(median_ms, 2),
+        "logins_per_second_per_core": round(1000 / median_ms, 2),
+    }
+
+
+def measure_parallel(cost: int, processes: int, per_process: int) -> float:
+    """Logins/s totales con `processes` procesos verificando a la vez"""
+    hashed = _context(cost).hash(PASSWORD)
+    with mp.Pool(processes) as pool:
+        started = time.perf_counter()
+        pool.starmap(_verify_loop, [(hashed, per_process)] * processes)
+        elapsed = time.perf_counter() - started
+    return round(processes * per_process / elapsed, 2)
+
+
+def recommend(rows: List[Dict[str, float]], target_ms: float) -> Optional[int]:
+    """Mayor costo que verifica dentro de la latencia objetivo"""
+    fitting = [row["cost"] for row in rows if row["verify_ms"] <= target_ms]
+    return max(fitting) if fitting else None
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Calibración del costo de bcrypt")
+    parser.add_argument("--min-cost", type=int, default=8)
+    parser.add_argument("--max-cost", type=int, default=14)
+    parser.add_argument("--min-seconds", type=float, default=1.0,
+                        help="Tiempo mínimo de medición por costo")
+    parser.add_argument("--processes", type=int, default=0,
+                        help="Medir también el throughput con N procesos en paralelo")
+    parser.add_argument("--target-ms", type=float, help="Latencia objetivo de un login")
+    parser.add_argument("--output", help="Guardar el reporte en JSON")
+    args = parser.parse_args(argv)
+
+    rows = []
+    print(f"{'costo':>5}  {'verify ms':>10}  {'logins/s/core':>13}" + ("  logins/s total" if args.processes else ""))
+    for cost in range(args.min_cost, args.max_cost + 1):
+        row = measure_cost(cost, args.min_seconds)
+        if args.processes:
+            # Suficientes verificaciones por proceso para ~min_seconds
+            per_process = max(2, int(args.min_seconds * row["logins_per_second_per_core"]))
+            row["processes"] = args.processes
+            row["logins_per_second_total"] = measure_parallel(cost, args.processes, per_process)
+        rows.append(row)
+        line = f"{cost:>5}  {row['verify_ms']:>10.2f}  {row['logins_per_second_per_core']:>13.2f}"
+        if args.processes:
+            line += f"  {row['logins_per_second_total']:>15.2f}"
+        print(line)
+
+    report = {"cpu_count": os.cpu_count(), "results": rows}
+    if args.target_ms:
+        cost = recommend(rows, args.target_ms)
+        report["target_ms"] = args.target_ms
+        report["recommended_cost"] = cost
+        if cost is None:
+            print(f"\n⚠️  Ningún costo medido verifica en menos de {args.target_ms} ms")
+        else:
+            print(f"\n✅ Costo recomendado para {args.target_ms} ms: BCRYPT_ROUNDS={cost}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
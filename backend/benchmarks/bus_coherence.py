@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Coherencia y latencia del bus de invalidación entre procesos.
+
+Levanta N procesos, cada uno con su propio bus y un caché local; uno de
+ellos publica M invalidaciones y se verifica que todos los demás las
+reciban (y vacíen su caché), midiendo la latencia de propagación.
+
+Uso (desde backend/):
+    python -m benchmarks.bus_coherence --workers 4 --messages 500
+    python -m benchmarks.bus_coherence --backend postgres --database-url postgresql://localhost/bench
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+
+def _worker(index, backend, socket_dir, ready, start, results, publisher, messages):
+    os.environ["INVALIDATION_BACKEND"] = backend
+    os.environ["INVALIDATION_SOCKET_DIR"] = socket_dir
+    from app.core.invalidation import create_bus
+
+    bus = create_bus()
+    cache = {"services": "cached"}
+    received = []
+
+    def on_invalidation(message):
+        cache.clear()
+        received.append((message.entity_id, time.time()))
+
+    bus.subscribe(on_invalidation)
+    bus.start()
+    ready.put(index)
+    start.wait()
+
+    sent_at = {}
+    if index == publisher:
+        for i in range(messages):
+            sent_at[i] = time.time()
+            bus.publish("services", i, "update")
+            cache["services"] = "cached"  # repoblar para detectar la próxima invalidación
+            time.sleep(0.001)
+    deadline = time.time() + 10
+    while index != publisher and len(received) < messages and time.time() < deadline:
+        time.sleep(0.01)
+    bus.stop()
+    results.put((index, received, sent_at, "services" in cache))
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Coherencia del bus de invalidación")
+    parser.add_argument("--backend", default="socket", choices=["socket", "postgres"])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--database-url", help="Requerido para el backend postgres")
+    args = parser.parse_args(argv)
+
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    socket_dir = tempfile.mkdtemp(prefix="mapa-bus-")
+    ctx = mp.get_context("spawn")
+    ready, results, start = ctx.Queue(), ctx.Queue(), ctx.Event()
+    publisher = 0
+    processes = [
+        ctx.Process(target=_worker, args=(i, args.backend, socket_dir, ready, start, results,
+                                          publisher, args.messages))
+        for i in range(args.workers)
+    ]
+    for p in processes:
+        p.start()
+    for _ in processes:
+        ready.get(timeout=30)
+    start.set()
+
+    outcomes = [results.get(timeout=60) for _ in processes]
+    for p in processes:
+        p.join(timeout=10)
+
+    sent_at = next(sent for index, _, sent, _ in outcomes if index == publisher)
+    latencies, failures = [], 0
+    for index, received, _, still_cached in outcomes:
+        if index == publisher:
+            continue
+        got = {entity_id for entity_id, _ in received}
+        missing = args.messages - len(got)
+        if missing or still_cached:
+            failures += 1
+        latencies.extend((at - sent_at[entity_id]) * 1000 for entity_id, at in received)
+        print(f"  worker {index}: {len(got)}/{args.messages} recibidas, caché vaciado: {not still_cached}")
+
+    if latencies:
+        ordered = sorted(latencies)
+        print(f"\n⏱️  propagación p50 {statistics.median(ordered):.2f} ms, "
+              f"p99 {ordered[int(len(ordered) * 0.99) - 1]:.2f} ms, máx {ordered[-1]:.2f} ms")
+    print("✅ Coherente" if failures == 0 else f"❌ {failures} workers incoherentes")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Costo del lado de Python de las consultas calientes del CRUD.
+
+Compara, para cada consulta, la versión anterior (cadena `db.query(...)`
+que se reconstruye en cada llamada) con la actual (`select()` construido
+una vez y reutilizado con bindparams, o `Session.get`) y con el piso del
+driver: la misma sentencia ya compilada ejecutada directo con
+`exec_driver_sql`. La diferencia con ese piso es lo que cuesta construir,
+compilar (o buscar en caché) y materializar la consulta en Python.
+
+Uso (desde backend/):
+    python -m benchmarks.query_overhead
+    python -m benchmarks.query_overhead --iterations 5000 --scale small
+    python -m benchmarks.query_overhead --database-url postgresql://localhost/bench --reset
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+
+def _timed(fn: Callable[[int], object], iterations: int, before: Callable[[], None]) -> float:
+    """Mediana en µs por llamada"""
+    samples: List[float] = []
+    for i in range(iterations):
+        before()
+        started = time.perf_counter()
+        fn(i)
+        samples.append((time.perf_counter() - started) * 1e6)
+    return statistics.median(samples)
+
+
+def build_cases(db, rng: random.Random):
+    from app.crud import crud_review, crud_service, crud_user
+    from app.db.base import Review, Service, User
+
+    emails = [e for (e,) in db.query(User.email).all()]
+    service_ids = [s for (s,) in db.query(Service.id).all()]
+    categories = [c for (c,) in db.query(Service.category).distinct().all()]
+    pairs = db.query(Review.service_id, Review.reviewer_user_id).limit(1000).all()
+    pick = lambda values: [rng.choice(values) for _ in range(997)]  # noqa: E731
+    emails, service_ids, categories, pairs = pick(emails), pick(service_ids), pick(categories), pick(pairs)
+
+    def at(values, i):
+        return values[i % len(values)]
+
+    return {
+        "user_by_email": (
+            lambda i: db.query(User).filter(User.email == at(emails, i)).first(),
+            lambda i: crud_user.user.get_by_email(db, email=at(emails, i)),
+            lambda i: db.query(User).filter(User.email == at(emails, i)).limit(1).statement,
+        ),
+        "service_by_id": (
+            lambda i: db.query(Service).filter(Service.id == at(service_ids, i)).first(),
+            lambda i: crud_service.service.get(db, at(service_ids, i)),
+            lambda i: db.query(Service).filter(Service.id == at(service_ids, i)).limit(1).statement,
+        ),
+        "review_for_service": (
+            lambda i: db.query(Review).filter(
+                Review.service_id == at(pairs, i)[0], Review.reviewer_user_id == at(pairs, i)[1]
+            ).first(),
+            lambda i: crud_review.review.get_user_review_for_service(
+                db, service_id=at(pairs, i)[0], user_id=at(pairs, i)[1]
+            ),
+            lambda i: db.query(Review).filter(
+                Review.service_id == at(pairs, i)[0], Review.reviewer_user_id == at(pairs, i)[1]
+            ).limit(1).statement,
+        ),
+        "services_by_category": (
+            lambda i: db.query(Service).filter(
+                Service.category.ilike(at(categories, i)), Service.is_active == True
+            ).offset(0).limit(20).all(),
+            lambda i: crud_service.service.get_by_category(db, category=at(categories, i), limit=20),
+            lambda i: db.query(Service).filter(
+                Service.category.ilike(at(categories, i)), Service.is_active == True
+            ).offset(0).limit(20).statement,
+        ),
+    }
+
+
+def driver_floor(db, statement_for: Callable[[int], object], iterations: int) -> float:
+    """Misma sentencia precompilada, ejecutada directo en el driver"""
+    connection = db.connection()
+    dialect = connection.dialect
+    compiled = [statement_for(i).compile(dialect=dialect) for i in range(min(iterations, 997))]
+    prepared = []
+    for c in compiled:
+        params = c.construct_params()
+        prepared.append((c.string, tuple(params[k] for k in c.positiontup) if c.positional else params))
+
+    def run(i):
+        sql, params = prepared[i % len(prepared)]
+        connection.exec_driver_sql(sql, params).fetchall()
+
+    return _timed(run, iterations, lambda: None)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Costo en Python de las consultas del CRUD")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--scale", default="tiny")
+    parser.add_argument("--database-url", help="Por defecto un SQLite temporal")
+    parser.add_argument("--reset", action="store_true", help="Borrar y volver a sembrar las tablas")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Guardar el reporte en JSON")
+    args = parser.parse_args(argv)
+
+    os.environ["DATABASE_URL"] = args.database_url or (
+        f"sqlite:///{tempfile.mkdtemp(prefix='mapa-queries-')}/queries.db"
+    )
+    # Sin hooks de instrumentación: se mide solo el ORM
+    os.environ["QUERY_INSTRUMENTATION"] = "0"
+    from app.db.base import Base, Service
+    from app.db.init_db import init_db
+    from app.db.session import SessionLocal, engine
+    from benchmarks.seed import SCALES, seed
+
+    if args.reset:
+        Base.metadata.drop_all(bind=engine)
+    db = SessionLocal()
+    try:
+        init_db(db)
+        if not db.query(Service.id).first():
+            seed(db, SCALES[args.scale], rng_seed=args.seed)
+        cases = build_cases(db, random.Random(args.seed))
+
+        print(f"{'consulta':<22}{'antes µs':>10}{'ahora µs':>10}{'driver µs':>11}{'Python antes':>14}{'Python ahora':>14}")
+        report: Dict[str, Dict[str, float]] = {}
+        for name, (legacy, current, statement_for) in cases.items():
+            # Sin identity map previo, para que ambas versiones materialicen las filas
+            legacy_us = _timed(legacy, args.iterations, db.expunge_all)
+            current_us = _timed(current, args.iterations, db.expunge_all)
+            floor_us = driver_floor(db, statement_for, args.iterations)
+            row = {
+                "legacy_us": round(legacy_us, 1),
+                "current_us": round(current_us, 1),
+                "driver_us": round(floor_us, 1),
+                "legacy_python_us": round(legacy_us - floor_us, 1),
+                "current_python_us": round(current_us - floor_us, 1),
+            }
+            report[name] = row
+            print(f"{name:<22}{row['legacy_us']:>10.1f}{row['current_us']:>10.1f}{row['driver_us']:>11.1f}"
+                  f"{row['legacy_python_us']:>14.1f}{row['current_python_us']:>14.1f}")
+    finally:
+        db.close()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump({"database": engine.dialect.name, "iterations": args.iterations, "queries": report}, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+"""
+Benchmark de las rutas calientes de la API.
+
+Siembra un dataset sintético, ejecuta cada escenario con concurrencia
+configurable y reporta throughput, latencias p50/p95/p99 y consultas SQL
+por request. Los resultados se guardan en JSON para comparar regresiones.
+
+Ejemplos (desde backend/):
+    python -m benchmarks.run --scale small
+    python -m benchmarks.run --scale medium --server uvicorn
+    python -m benchmarks.run --database-url postgresql://localhost/bench --reset
+    python -m benchmarks.run --compare benchmarks/results/baseline.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+SERVER_TIMING_QUERIES = re.compile(r'db;dur=[\d.]+;desc="(\d+) queries"')
+
+
+@dataclass
+class Scenario:
+    """Escenario de benchmark: nombre, cantidad de requests y generador"""
+    name: str
+    requests: int
+    call: Callable[[httpx.AsyncClient, int], Awaitable[httpx.Response]]
+    expected_status: int = 200
+
+
+@dataclass
+class ScenarioResult:
+    name: str
+    latencies_ms: List[float] = field(default_factory=list)
+    errors: int = 0
+    wall_seconds: float = 0.0
+    queries: Optional[int] = None
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        ok = len(self.latencies_ms)
+        total = ok + self.errors
+        ordered = sorted(self.latencies_ms)
+        return {
+            "requests": total,
+            "errors": self.errors,
+            "throughput_rps": round(total / self.wall_seconds, 2) if self.wall_seconds else None,
+            "mean_ms": round(statistics.fmean(ordered), 3) if ordered else None,
+            "p50_ms": _percentile(ordered, 50),
+            "p95_ms": _percentile(ordered, 95),
+            "p99_ms": _percentile(ordered, 99),
+            "max_ms": round(ordered[-1], 3) if ordered else None,
+            "queries_per_request": round(self.queries / total, 2) if self.queries is not None and total else None,
+        }
+
+
+def _percentile(ordered: List[float], pct: float) -> Optional[float]:
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return round(ordered[index], 3)
+
+
+class QueryCounter:
+    """
+    Cuenta sentencias SQL ejecutadas por el engine (solo modo in-process).
+    Contra un servidor remoto se usa la cabecera Server-Timing.
+    """
+
+    def __init__(self):
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def attach(self, engine) -> None:
+        from sqlalchemy import event
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args) -> None:
+        with self._lock:
+            self._count += 1
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+
+# ============================================
+# Preparación de datos
+# ============================================
+
+def prepare_database(args) -> Dict[str, object]:
+    """Crea tablas, siembra el dataset y devuelve datos de apoyo para escenarios"""
+    from app.db.base import Base, Service
+    from app.db.init_db import init_db
+    from app.db.session import SessionLocal, engine
+    from benchmarks.seed import SCALES, Scale, create_bench_reviewers, seed
+
+    if args.reset:
+        Base.metadata.drop_all(bind=engine)
+
+    scale = SCALES[args.scale]
+    if args.users or args.services or args.reviews:
+        scale = Scale(
+            users=args.users or scale.users,
+            services=args.services or scale.services,
+            reviews=args.reviews or scale.reviews,
+        )
+
+    db = SessionLocal()
+    try:
+        init_db(db)
+        started = time.perf_counter()
+        if args.skip_seed:
+            counts = {}
+        else:
+            counts = seed(db, scale, rng_seed=args.seed)
+        print(f"🌱 Dataset: {counts or 'existente'} en {time.perf_counter() - started:.1f}s")
+        reviewers = create_bench_reviewers(db, args.concurrency)
+        service_ids = [
+            sid for (sid,) in db.query(Service.id).filter(Service.is_active == True).all()
+        ]
+    finally:
+        db.close()
+
+    if not service_ids:
+        raise RuntimeError("No hay servicios activos para ejecutar el benchmark")
+    return {"scale": scale.__dict__, "service_ids": service_ids, "reviewers": reviewers}
+
+
+async def login(client: httpx.AsyncClient, email: str) -> str:
+    from benchmarks.seed import BENCH_PASSWORD
+
+    response = await client.post(
+        "/api/v1/login/access-token",
+        data={"username": email, "password": BENCH_PASSWORD},
+    )
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+async def build_scenarios(client: httpx.AsyncClient, data: Dict[str, object], args) -> List[Scenario]:
+    rng = random.Random(args.seed)
+    service_ids: List[int] = data["service_ids"]
+    reviewers: List[str] = data["reviewers"]
+    tokens = [await login(client, email) for email in reviewers]
+    review_targets = rng.sample(service_ids, min(len(service_ids), args.requests))
+    categories = ["Electricista", "Gasfíter", "Programador web", "Peluquero"]
+    n = args.requests
+    api = "/api/v1"
+
+    async def list_services(c, i):
+        return await c.get(f"{api}/services/")
+
+    async def list_services_category(c, i):
+        return await c.get(f"{api}/services/", params={"category": categories[i % len(categories)]})
+
+    async def list_services_search(c, i):
+        return await c.get(f"{api}/services/", params={"search": "urgencias", "category": "Electricista"})
+
+    async def service_detail(c, i):
+        return await c.get(f"{api}/services/{service_ids[i % len(service_ids)]}")
+
+    async def login_scenario(c, i):
+        from benchmarks.seed import BENCH_PASSWORD
+        return await c.post(
+            f"{api}/login/access-token",
+            data={"username": reviewers[i % len(reviewers)], "password": BENCH_PASSWORD},
+        )
+
+    async def create_review(c, i):
+        # Cada reviewer cubre una porción de servicios distinta: nunca repite par
+        token = tokens[i % len(tokens)]
+        target = review_targets[(i // len(tokens)) % len(review_targets)]
+        return await c.post(
+            f"{api}/reviews/",
+            json={"service_id": target, "rating": float(1 + i % 5)},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+
+    async def list_categories(c, i):
+        return await c.get(f"{api}/categories/")
+
+    review_requests = min(n, len(tokens) * len(review_targets))
+    return [
+        Scenario("services_list", n, list_services),
+        Scenario("services_list_category", n, list_services_category),
+        Scenario("services_list_search", n, list_services_search),
+        Scenario("service_detail", n, service_detail),
+        Scenario("categories_list", n, list_categories),
+        Scenario("login", max(1, n // args.login_divisor), login_scenario),
+        Scenario("review_create", review_requests, create_review, expected_status=201),
+    ]
+
+
+# ============================================
+# Ejecución
+# ============================================
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    scenario: Scenario,
+    concurrency: int,
+    counter: Optional[QueryCounter],
+) -> ScenarioResult:
+    result = ScenarioResult(scenario.name)
+    indexes = iter(range(scenario.requests))
+    header_queries = []
+
+    async def worker():
+        for i in indexes:
+            started = time.perf_counter()
+            try:
+                response = await scenario.call(client, i)
+                ok = response.status_code == scenario.expected_status
+                match = SERVER_TIMING_QUERIES.search(response.headers.get("server-timing", ""))
+                if match:
+                    header_queries.append(int(match.group(1)))
+            except httpx.HTTPError:
+                ok = False
+            elapsed = (time.perf_counter() - started) * 1000
+            if ok:
+                result.latencies_ms.append(elapsed)
+            else:
+                result.errors += 1
+
+    queries_before = counter.count if counter else None
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result.wall_seconds = time.perf_counter() - started
+    if counter:
+        result.queries = counter.count - queries_before
+    elif header_queries:
+        result.queries = sum(header_queries)
+    else:
+        print(
+            f"⚠️  {scenario.name}: sin Server-Timing en las respuestas, no se cuentan consultas "
+            "(¿QUERY_INSTRUMENTATION=0 en el servidor?)",
+            file=sys.stderr,
+        )
+    return result
+
+
+async def run_all(client: httpx.AsyncClient, data, args, counter) -> Dict[str, Dict]:
+    scenarios = await build_scenarios(client, data, args)
+    selected = set(args.only.split(",")) if args.only else None
+    results = {}
+    for scenario in scenarios:
+        if selected and scenario.name not in selected:
+            continue
+        # Calentamiento corto para no medir la primera compilación de consultas
+        for i in range(min(args.warmup, scenario.requests)):
+            if scenario.expected_status == 200:
+                await scenario.call(client, i)
+        result = await run_scenario(client, scenario, args.concurrency, counter)
+        results[scenario.name] = result.summary()
+        _print_row(scenario.name, results[scenario.name])
+    return results
+
+
+async def run_in_process(data, args) -> Dict[str, Dict]:
+    from app.db.session import engine
+    from app.main import app
+
+    counter = QueryCounter()
+    counter.attach(engine)
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            return await run_all(client, data, args, counter)
+
+
+async def run_against_url(url: str, data, args) -> Dict[str, Dict]:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=60, limits=limits) as client:
+        return await run_all(client, data, args, None)
+
+
+def spawn_uvicorn(args) -> subprocess.Popen:
+    """Lanza uvicorn local apuntando a la misma base de datos"""
+    command = [
+        sys.executable, "-m", "uvicorn", "app.main:app",
+        "--host", "127.0.0.1", "--port", str(args.port),
+        "--workers", str(args.workers), "--log-level", "warning",
+    ]
+    process = subprocess.Popen(command, env=os.environ.copy())
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{args.port}/health", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("uvicorn no respondió /health en 30s")
+
+
+# ============================================
+# Reportes
+# ============================================
+
+def _print_row(name: str, summary: Dict) -> None:
+    qpr = summary["queries_per_request"]
+    print(
+        f"  {name:<24} {summary['throughput_rps'] or 0:>9.1f} req/s  "
+        f"p50 {summary['p50_ms'] or 0:>8.2f}ms  p95 {summary['p95_ms'] or 0:>8.2f}ms  "
+        f"p99 {summary['p99_ms'] or 0:>8.2f}ms  "
+        f"q/req {qpr if qpr is not None else '-':>5}  errores {summary['errors']}"
+    )
+
+
+def compare(results: Dict[str, Dict], baseline_path: str) -> None:
+    with open(baseline_path, encoding="utf-8") as fh:
+        baseline = json.load(fh)["scenarios"]
+    print(f"\n📈 Comparación contra {baseline_path}")
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        for metric in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms", "queries_per_request"):
+            old, new = previous.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            delta = (new - old) / old * 100
+            print(f"  {name:<24} {metric:<20} {old:>10} → {new:<10} ({delta:+.1f}%)")
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(results: Dict[str, Dict], data, args, target: str) -> str:
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    path = args.output or os.path.join(RESULTS_DIR, f"{stamp}-{args.scale}-{target}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    payload = {
+        "meta": {
+            "timestamp": stamp,
+            "git_revision": _git_revision(),
+            "target": target,
+            "database": os.environ["DATABASE_URL"].split("@")[-1],
+            "scale": data["scale"],
+            "concurrency": args.concurrency,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "scenarios": results,
+    }
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(payload, fh, indent=2, ensure_ascii=False)
+    return path
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de la API de Mapa de Servicios")
+    parser.add_argument("--scale", default="small", choices=["tiny", "small", "medium", "large"])
+    parser.add_argument("--users", type=int, help="Sobrescribe la cantidad de usuarios de la escala")
+    parser.add_argument("--services", type=int, help="Sobrescribe la cantidad de servicios")
+    parser.add_argument("--reviews", type=int, help="Sobrescribe la cantidad de reseñas")
+    parser.add_argument("--database-url", help="Por defecto un SQLite temporal")
+    parser.add_argument("--reset", action="store_true", help="Elimina las tablas antes de sembrar")
+    parser.add_argument("--skip-seed", action="store_true", help="Reutiliza los datos existentes")
+    parser.add_argument("--server", default="inprocess", choices=["inprocess", "uvicorn"])
+    parser.add_argument("--url", help="Ejecutar contra un servidor ya levantado (misma base de datos)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--requests", type=int, default=500, help="Requests por escenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--login-divisor", type=int, default=10,
+                        help="Login usa requests/N (bcrypt domina el tiempo)")
+    parser.add_argument("--only", help="Escenarios separados por coma")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Ruta del JSON de resultados")
+    parser.add_argument("--compare", help="JSON previo contra el que comparar")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    # La URL debe fijarse antes de importar app.core.config
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        tmpdir = tempfile.mkdtemp(prefix="mapa-bench-")
+        os.environ["DATABASE_URL"] = f"sqlite:///{tmpdir}/bench.db"
+    os.environ.setdefault("ENVIRONMENT", "development")
+    # El benchmark dispara miles de requests desde una IP: sin rate limiting
+    os.environ.setdefault("ADMISSION_ENABLED", "0")
+    # Las consultas por request se leen del header Server-Timing
+    os.environ.setdefault("QUERY_INSTRUMENTATION", "1")
+
+    data = prepare_database(args)
+    target = "url" if args.url else args.server
+    print(f"🏁 Ejecutando escenarios ({target}, concurrencia {args.concurrency})")
+
+    if args.url:
+        results = asyncio.run(run_against_url(args.url, data, args))
+    elif args.server == "uvicorn":
+        process = spawn_uvicorn(args)
+        try:
+            results = asyncio.run(run_against_url(f"http://127.0.0.1:{args.port}", data, args))
+        finally:
+            process.terminate()
+            process.wait(timeout=10)
+    else:
+        results = asyncio.run(run_in_process(data, args))
+
+    path = save_results(results, data, args, target)
+    print(f"\n💾 Resultados guardados en {path}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
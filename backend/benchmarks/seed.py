@@ -0,0 +1,196 @@
+"""
+Generación de un dataset sintético para benchmarks.
+
+Crea usuarios, servicios agrupados alrededor de coordenadas reales de
+ciudades chilenas (igual que initial_data.py lo hace para Santiago) y
+reseñas únicas por (servicio, usuario). Usa inserts masivos de SQLAlchemy
+Core para que sembrar 100k filas tome segundos y no minutos.
+"""
+
+import random
+from dataclasses import dataclass
+from typing import Dict, List
+
+from sqlalchemy import insert, text
+from sqlalchemy.orm import Session
+
+from app.core.security import get_password_hash
+from app.db.base import Category, Review, Service, User
+
+BENCH_PASSWORD = "benchmark"
+BATCH_SIZE = 5000
+
+# (ciudad, latitud, longitud, peso relativo)
+CITIES = [
+    ("Santiago", -33.4372, -70.6506, 0.55),
+    ("Valparaíso", -33.0472, -71.6127, 0.12),
+    ("Concepción", -36.8270, -73.0503, 0.10),
+    ("La Serena", -29.9027, -71.2519, 0.08),
+    ("Antofagasta", -23.6509, -70.3975, 0.08),
+    ("Temuco", -38.7359, -72.5904, 0.07),
+]
+
+PRICE_MODALITIES = ["por_hora", "por_dia", "por_servicio", "por_proyecto"]
+
+SEARCH_WORDS = [
+    "instalaciones", "reparación", "urgencias", "domicilio", "mantención",
+    "certificado", "profesional", "económico", "rápido", "garantía",
+]
+
+
+@dataclass
+class Scale:
+    """Tamaño del dataset sintético"""
+    users: int
+    services: int
+    reviews: int
+
+
+SCALES: Dict[str, Scale] = {
+    "tiny": Scale(users=50, services=300, reviews=1_000),
+    "small": Scale(users=200, services=2_000, reviews=10_000),
+    "medium": Scale(users=2_000, services=20_000, reviews=100_000),
+    "large": Scale(users=10_000, services=100_000, reviews=500_000),
+}
+
+
+def _batched(rows: List[dict], size: int = BATCH_SIZE):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def _bulk_insert(db: Session, model, rows: List[dict]) -> None:
+    for batch in _batched(rows):
+        db.execute(insert(model), batch)
+
+
+def _sync_sequences(db: Session) -> None:
+    """En Postgres, avanza las secuencias tras insertar IDs explícitos"""
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    for table in ("users", "services"):
+        db.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+            f"(SELECT COALESCE(MAX(id), 1) FROM {table}))"
+        ))
+
+
+def _category_names(db: Session) -> List[str]:
+    names = [name for (name,) in db.query(Category.name).all()]
+    if not names:
+        raise RuntimeError("No hay categorías: ejecuta init_db antes de sembrar")
+    return names
+
+
+def seed(db: Session, scale: Scale, *, rng_seed: int = 42) -> Dict[str, int]:
+    """
+    Inserta el dataset sintético y recalcula ratings en una sola pasada.
+
+    Los usuarios comparten la contraseña BENCH_PASSWORD (se hashea una sola
+    vez; bcrypt por usuario haría la siembra inviable a gran escala).
+    """
+    rng = random.Random(rng_seed)
+    categories = _category_names(db)
+    password_hash = get_password_hash(BENCH_PASSWORD)
+
+    first_user_id = (db.execute(text("SELECT COALESCE(MAX(id), 0) FROM users")).scalar() or 0) + 1
+    users = [
+        {
+            "id": first_user_id + i,
+            "email": f"bench{first_user_id + i}@example.com",
+            "password_hash": password_hash,
+            "full_name": f"Usuario Benchmark {first_user_id + i}",
+            "phone": f"+569{rng.randint(10_000_000, 99_999_999)}",
+            "is_active": True,
+        }
+        for i in range(scale.users)
+    ]
+    _bulk_insert(db, User, users)
+    user_ids = [u["id"] for u in users]
+
+    first_service_id = (db.execute(text("SELECT COALESCE(MAX(id), 0) FROM services")).scalar() or 0) + 1
+    weights = [c[3] for c in CITIES]
+    services = []
+    owners: Dict[int, int] = {}
+    for i in range(scale.services):
+        city, lat, lng, _ = rng.choices(CITIES, weights=weights)[0]
+        category = rng.choice(categories)
+        owner_id = rng.choice(user_ids)
+        service_id = first_service_id + i
+        owners[service_id] = owner_id
+        words = " ".join(rng.sample(SEARCH_WORDS, 3))
+        phone_contact = rng.random() < 0.5
+        services.append({
+            "id": service_id,
+            "user_id": owner_id,
+            "service_name": f"{category} {words.split()[0]} {service_id}",
+            "description": f"{category} en {city}: {words}.",
+            "category": category,
+            "price": float(rng.randrange(5_000, 80_000, 500)),
+            "price_modality": rng.choice(PRICE_MODALITIES),
+            "schedule": "Lunes a Viernes 9:00-18:00",
+            "address": f"Dirección {service_id}, {city}",
+            "latitude": rng.gauss(lat, 0.03),
+            "longitude": rng.gauss(lng, 0.03),
+            "contact_method": "phone" if phone_contact else "email",
+            "contact_email": None if phone_contact else f"bench{owner_id}@example.com",
+            "contact_phone": f"+569{rng.randint(10_000_000, 99_999_999)}" if phone_contact else None,
+            "contact_country_code": "+56" if phone_contact else None,
+            "whatsapp_available": phone_contact and rng.random() < 0.7,
+            "rating": 0.0,
+            "total_reviews": 0,
+            "is_active": rng.random() < 0.95,
+        })
+    _bulk_insert(db, Service, services)
+    service_ids = list(owners)
+
+    # Pares únicos (servicio, reviewer) sin reseñas del propio dueño
+    max_pairs = len(service_ids) * max(len(user_ids) - 1, 0)
+    target_reviews = min(scale.reviews, max_pairs)
+    seen = set()
+    reviews = []
+    while len(reviews) < target_reviews:
+        service_id = rng.choice(service_ids)
+        reviewer_id = rng.choice(user_ids)
+        if reviewer_id == owners[service_id] or (service_id, reviewer_id) in seen:
+            continue
+        seen.add((service_id, reviewer_id))
+        reviews.append({
+            "service_id": service_id,
+            "reviewer_user_id": reviewer_id,
+            "rating": float(rng.randint(1, 5)),
+        })
+    # Los inserts de Core no disparan los eventos de mapper de Review,
+    # así que el rating agregado se recalcula en un único UPDATE
+    _bulk_insert(db, Review, reviews)
+    db.execute(text(
+        "UPDATE services SET "
+        "rating = COALESCE((SELECT AVG(r.rating) FROM reviews r WHERE r.service_id = services.id), 0), "
+        "total_reviews = (SELECT COUNT(*) FROM reviews r WHERE r.service_id = services.id)"
+    ))
+    _sync_sequences(db)
+    db.commit()
+    return {"users": len(users), "services": len(services), "reviews": len(reviews)}
+
+
+def create_bench_reviewers(db: Session, count: int) -> List[str]:
+    """
+    Crea usuarios sin servicios ni reseñas para el escenario de creación de
+    reseñas; así cualquier par (reviewer, servicio) es válido.
+    """
+    password_hash = get_password_hash(BENCH_PASSWORD)
+    first_id = (db.execute(text("SELECT COALESCE(MAX(id), 0) FROM users")).scalar() or 0) + 1
+    rows = [
+        {
+            "id": first_id + i,
+            "email": f"reviewer{first_id + i}@example.com",
+            "password_hash": password_hash,
+            "full_name": f"Reviewer Benchmark {first_id + i}",
+            "is_active": True,
+        }
+        for i in range(count)
+    ]
+    _bulk_insert(db, User, rows)
+    _sync_sequences(db)
+    db.commit()
+    return [r["email"] for r in rows]
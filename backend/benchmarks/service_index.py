@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Índice columnar de servicios (app.core.service_index) con N servicios
+sintéticos (1M por defecto).
+
+Mide la carga del índice y, para varias combinaciones de filtros (las que
+arma el frontend: categoría, texto, radio, precio, rating y orden por
+distancia o popularidad), la latencia de `ServiceIndex.query` contra la misma búsqueda
+hecha fila por fila en Python, que es lo que hacía `performSearch` sobre
+el listado completo. Verifica además que ambas devuelvan los mismos IDs.
+
+No usa la base de datos: las filas se generan en memoria.
+
+Uso (desde backend/):
+    python -m benchmarks.service_index
+    python -m benchmarks.service_index --services 200000 --iterations 50
+    python -m benchmarks.service_index --output service_index.json
+"""
+
+import argparse
+import json
+import math
+import random
+import statistics
+import time
+from typing import Callable, Dict, List
+
+from app.core.service_index import EARTH_RADIUS_KM, ServiceIndex
+
+CATEGORIES = [
+    "Gasfiter", "Electricista", "Carpintero", "Pintor", "Cerrajero", "Jardinero",
+    "Clases particulares", "Peluquería", "Mecánico", "Limpieza", "Mudanzas", "Costura",
+]
+WORDS = ["rápido", "económico", "urgencias", "garantía", "domicilio", "24 horas", "experiencia", "certificado"]
+# Santiago y alrededores
+CENTER = (-33.45, -70.65)
+
+
+def synthetic_rows(n: int, rng: random.Random) -> List[tuple]:
+    rows = []
+    for i in range(1, n + 1):
+        category = rng.choice(CATEGORIES)
+        rows.append((
+            i,
+            CENTER[0] + rng.uniform(-1.5, 1.5),
+            CENTER[1] + rng.uniform(-1.5, 1.5),
+            category,
+            float(rng.randrange(5, 500) * 100),
+            round(rng.uniform(0, 5), 1) if rng.random() < 0.6 else 0.0,
+            rng.random() < 0.9,
+            f"{category} {rng.choice(WORDS)} {i}",
+            " ".join(rng.sample(WORDS, 3)),
+            None,
+            float(rng.randrange(0, 1000)) if rng.random() < 0.3 else 0.0,
+        ))
+    return rows
+
+
+def _haversine(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    dlat = math.radians(lat2 - lat1)
+    dlng = math.radians(lng2 - lng1)
+    a = (math.sin(dlat / 2) ** 2
+         + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlng / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0)))
+
+
+def baseline(rows: List[tuple], *, category=None, search=None, lat=None, lng=None, radius_km=None,
+             min_price=None, max_price=None, min_rating=None, sort="id", skip=0, limit=100) -> List[int]:
+    """La misma búsqueda recorriendo las filas una a una"""
+    term = search.lower() if search else None
+    matches = []
+    for service_id, s_lat, s_lng, s_category, price, rating, active, name, description, _, popularity in rows:
+        if not active:
+            continue
+        if category and s_category.lower() != category.lower():
+            continue
+        if min_price is not None and price < min_price:
+            continue
+        if max_price is not None and price > max_price:
+            continue
+        if min_rating is not None and rating < min_rating:
+            continue
+        if term and term not in f"{name}\n{description}\n{s_category}".lower():
+            continue
+        distance = _haversine(lat, lng, s_lat, s_lng) if lat is not None else None
+        if radius_km is not None and distance > radius_km:
+            continue
+        matches.append((service_id, distance, rating, popularity))
+    if sort == "distance":
+        matches.sort(key=lambda m: (m[1], m[0]))
+    elif sort == "rating":
+        matches.sort(key=lambda m: (-m[2], m[0]))
+    elif sort == "popular":
+        matches.sort(key=lambda m: (-m[3], m[0]))
+    return [m[0] for m in matches[skip:skip + limit]]
+
+
+def cases(rng: random.Random) -> Dict[str, Callable[[], dict]]:
+    def near() -> dict:
+        return {"lat": CENTER[0] + rng.uniform(-0.5, 0.5), "lng": CENTER[1] + rng.uniform(-0.5, 0.5)}
+
+    return {
+        "category": lambda: {"category": rng.choice(CATEGORIES)},
+        "search": lambda: {"search": rng.choice(WORDS)},
+        # Sin corte temprano: recorre el texto de todos los candidatos
+        "search_by_rating": lambda: {"search": rng.choice(WORDS), "sort": "rating"},
+        "radius_distance": lambda: {**near(), "radius_km": 5.0, "sort": "distance"},
+        "category_radius_price": lambda: {
+            **near(), "category": rng.choice(CATEGORIES), "radius_km": 10.0,
+            "min_price": 2000.0, "max_price": 20000.0, "sort": "distance",
+        },
+        "all_filters": lambda: {
+            **near(), "category": rng.choice(CATEGORIES), "search": rng.choice(WORDS),
+            "radius_km": 20.0, "max_price": 30000.0, "min_rating": 3.0, "sort": "distance",
+        },
+        "rating_sort": lambda: {"min_rating": 4.0, "sort": "rating"},
+        "category_popular": lambda: {"category": rng.choice(CATEGORIES), "sort": "popular"},
+        "nearest_overall": lambda: {**near(), "sort": "distance", "limit": 20},
+    }
+
+
+def _median_ms(fn: Callable[[], object], iterations: int) -> float:
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark del índice columnar de servicios")
+    parser.add_argument("--services", type=int, default=1_000_000)
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--baseline-iterations", type=int, default=3,
+                        help="Repeticiones de la versión fila por fila (es lenta)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Guardar el reporte en JSON")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    print(f"Generando {args.services:,} servicios...")
+    rows = synthetic_rows(args.services, rng)
+
+    index = ServiceIndex()
+    started = time.perf_counter()
+    index.build(rows)
+    build_ms = (time.perf_counter() - started) * 1000
+    # Sin lecturas de la base durante el benchmark
+    index._next_rebuild = float("inf")
+    print(f"Carga del índice: {build_ms:.0f} ms")
+
+    print(f"{'consulta':<24}{'índice ms':>11}{'Python ms':>11}{'speedup':>9}")
+    report: Dict[str, Dict[str, float]] = {}
+    for name, make in cases(rng).items():
+        # Los mismos parámetros para ambas versiones
+        params = make()
+        expected = baseline(rows, **params)
+        got, _ = index.query(**params)
+        if got != expected:
+            raise SystemExit(f"{name}: el índice devolvió {got[:5]}..., se esperaba {expected[:5]}...")
+        index_ms = _median_ms(lambda: index.query(**params), args.iterations)
+        python_ms = _median_ms(lambda: baseline(rows, **params), args.baseline_iterations)
+        report[name] = {
+            "index_ms": round(index_ms, 2),
+            "python_ms": round(python_ms, 1),
+            "speedup": round(python_ms / index_ms, 1),
+        }
+        print(f"{name:<24}{index_ms:>11.2f}{python_ms:>11.1f}{python_ms / index_ms:>8.1f}x")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump({"services": args.services, "build_ms": round(build_ms, 1), "queries": report}, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Medición del arranque en frío del worker.
+
+Reporta el tiempo de `import app.main` (mediana de N procesos nuevos), los
+módulos más costosos según `python -X importtime` y, levantando uvicorn,
+el tiempo hasta el primer 200 de /health y de /ready.
+
+Uso (desde backend/):
+    python -m benchmarks.startup
+    python -m benchmarks.startup --runs 10 --top 30 --output startup.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+IMPORT_SNIPPET = (
+    "import time; t = time.perf_counter(); import app.main; "
+    "print(time.perf_counter() - t)"
+)
+
+
+def _env(database_url: str) -> Dict[str, str]:
+    env = os.environ.copy()
+    env["DATABASE_URL"] = database_url
+    env.setdefault("ENVIRONMENT", "development")
+    return env
+
+
+def measure_import(env: Dict[str, str], runs: int) -> Dict[str, float]:
+    samples = []
+    for _ in range(runs):
+        output = subprocess.check_output([sys.executable, "-c", IMPORT_SNIPPET], env=env, text=True)
+        samples.append(float(output.strip().splitlines()[-1]) * 1000)
+    return {
+        "median_ms": round(statistics.median(samples), 1),
+        "min_ms": round(min(samples), 1),
+        "max_ms": round(max(samples), 1),
+    }
+
+
+def import_report(env: Dict[str, str], top: int) -> List[Dict[str, object]]:
+    """Módulos ordenados por tiempo acumulado (incluye sus dependencias)"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        env=env, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        rows.append({
+            "module": parts[2].strip(),
+            "self_ms": round(int(parts[0]) / 1000, 1),
+            "cumulative_ms": round(int(parts[1]) / 1000, 1),
+        })
+    rows.sort(key=lambda r: r["cumulative_ms"], reverse=True)
+    return rows[:top]
+
+
+def _wait_for(url: str, deadline: float) -> Optional[float]:
+    started = time.perf_counter()
+    while time.perf_counter() < deadline:
+        try:
+            if httpx.get(url, timeout=0.5).status_code == 200:
+                return (time.perf_counter() - started) * 1000
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.01)
+    return None
+
+
+def measure_server(env: Dict[str, str], port: int) -> Dict[str, Optional[float]]:
+    """Tiempo desde el lanzamiento de uvicorn hasta /health y /ready en 200"""
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    try:
+        deadline = time.perf_counter() + 60
+        health = _wait_for(f"http://127.0.0.1:{port}/health", deadline)
+        health_ms = (time.perf_counter() - started) * 1000 if health is not None else None
+        ready = _wait_for(f"http://127.0.0.1:{port}/ready", deadline)
+        ready_ms = (time.perf_counter() - started) * 1000 if ready is not None else None
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+    return {
+        "health_ms": round(health_ms, 1) if health_ms else None,
+        "ready_ms": round(ready_ms, 1) if ready_ms else None,
+    }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Medición del arranque en frío")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--database-url", help="Por defecto un SQLite temporal")
+    parser.add_argument("--output", help="Guardar el reporte en JSON")
+    args = parser.parse_args(argv)
+
+    database_url = args.database_url or f"sqlite:///{tempfile.mkdtemp(prefix='mapa-startup-')}/startup.db"
+    env = _env(database_url)
+    # Crear las tablas fuera de la medición (el warm-up las consulta)
+    subprocess.check_call(
+        [sys.executable, "-c", "from app.db.init_db import init_db; from app.db.session import SessionLocal; "
+                               "db = SessionLocal(); init_db(db); db.close()"],
+        env=env, stdout=subprocess.DEVNULL,
+    )
+
+    report = {
+        "import": measure_import(env, args.runs),
+        "server": measure_server(env, args.port),
+        "slowest_imports": import_report(env, args.top),
+    }
+    print(f"⏱️  import app.main: {report['import']['median_ms']} ms (mediana de {args.runs})")
+    print(f"⏱️  uvicorn → /health: {report['server']['health_ms']} ms, /ready: {report['server']['ready_ms']} ms")
+    print("\n📦 Imports más costosos (acumulado):")
+    for row in report["slowest_imports"]:
+        print(f"  {row['cumulative_ms']:>8.1f} ms  {row['self_ms']:>7.1f} ms  {row['module']}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -52,6 +52,7 @@ export function transformServiceToFrontend(service) {
         serviceName: service.service_name,
         description: service.description,
         category: service.category,
+        districtId: service.district_id,
         price: service.price,
         priceModality: service.price_modality,
         schedule: service.schedule,
@@ -86,6 +87,8 @@ export function transformServiceToFrontend(service) {
 /**
  * Obtiene servicios desde el backend con filtros opcionales
  * @param {Object} filters - Filtros para aplicar a la búsqueda
+ *   (search, category, district, lat, lng, radiusKm, minPrice, maxPrice, minRating,
+ *   sort: 'id' | 'distance' | 'rating', skip, limit)
  * @returns {Promise<Array>} - Array de servicios
  */
 export async function getServices(filters = {}) {
@@ -96,6 +99,16 @@ export async function getServices(filters = {}) {
         const params = new URLSearchParams();
         if (filters.category) params.append('category', filters.category);
         if (filters.search) params.append('search', filters.search);
+        if (filters.district) params.append('district', filters.district);
+        if (filters.lat != null && filters.lng != null) {
+            params.append('lat', filters.lat);
+            params.append('lng', filters.lng);
+        }
+        if (filters.radiusKm != null) params.append('radius_km', filters.radiusKm);
+        if (filters.minPrice != null) params.append('min_price', filters.minPrice);
+        if (filters.maxPrice != null) params.append('max_price', filters.maxPrice);
+        if (filters.minRating != null) params.append('min_rating', filters.minRating);
+        if (filters.sort) params.append('sort', filters.sort);
         if (filters.skip) params.append('skip', filters.skip);
         if (filters.limit) params.append('limit', filters.limit);
         
@@ -121,6 +134,33 @@ export async function getServices(filters = {}) {
     }
 }
 
+/**
+ * Obtiene los cambios de servicios desde una marca de agua (sincronización incremental)
+ * @param {string|null} since - Valor `next` de la respuesta anterior (null = desde cero)
+ * @returns {Promise<Object>} - { services, deleted, next, hasMore, reset }
+ */
+export async function getServiceChanges(since = null) {
+    const params = new URLSearchParams();
+    if (since) params.append('since', since);
+
+    const url = params.toString()
+        ? `${API_BASE_URL}/services/changes?${params.toString()}`
+        : `${API_BASE_URL}/services/changes`;
+    const response = await fetch(url, {
+        method: 'GET',
+        headers: getHeaders(false)
+    });
+    const changes = await handleResponse(response);
+
+    return {
+        services: changes.services.map(transformServiceToFrontend),
+        deleted: changes.deleted,
+        next: changes.next,
+        hasMore: changes.has_more,
+        reset: changes.reset
+    };
+}
+
 /**
  * Crea un nuevo servicio en el backend
  * NOTA: Esta función ya no se usa directamente, se usa AuthService.createService
@@ -258,6 +298,57 @@ export async function getServiceById(serviceId) {
     }
 }
 
+/**
+ * Envía una vista o clic de contacto sin esperar respuesta. sendBeacon
+ * sobrevive a la navegación (mailto:, tel:, WhatsApp en otra pestaña)
+ * y no retrasa la UI; si no está disponible se usa fetch con keepalive.
+ * @param {number|string} serviceId - ID del servicio
+ * @param {string} kind - 'view' o 'contact'
+ */
+function trackServiceEvent(serviceId, kind) {
+    const url = `${API_BASE_URL}/services/${serviceId}/${kind}`;
+    try {
+        if (navigator.sendBeacon && navigator.sendBeacon(url)) return;
+        fetch(url, { method: 'POST', keepalive: true }).catch(() => {});
+    } catch (error) {
+        // Las métricas nunca deben romper la interfaz
+    }
+}
+
+/**
+ * Registra que se abrió el detalle de un servicio
+ * @param {number|string} serviceId - ID del servicio
+ */
+export function trackServiceView(serviceId) {
+    trackServiceEvent(serviceId, 'view');
+}
+
+/**
+ * Registra un clic en un botón de contacto del servicio
+ * @param {number|string} serviceId - ID del servicio
+ */
+export function trackServiceContact(serviceId) {
+    trackServiceEvent(serviceId, 'contact');
+}
+
+/**
+ * Obtiene las comunas disponibles para filtrar (vacío si el backend no
+ * tiene límites de comunas cargados)
+ * @returns {Promise<Array>} - Array de { id, name }
+ */
+export async function getDistricts() {
+    try {
+        const response = await fetch(`${API_BASE_URL}/districts/`, {
+            method: 'GET',
+            headers: getHeaders(false)
+        });
+        return await handleResponse(response);
+    } catch (error) {
+        console.error('❌ Error obteniendo comunas:', error);
+        return [];
+    }
+}
+
 /**
  * Obtiene las categorías disponibles
  * @returns {Promise<Array>} - Array de categorías
@@ -341,6 +432,27 @@ export async function getServiceReviews(serviceId) {
     }
 }
 
+/**
+ * Obtiene servicios similares cercanos a un servicio (precalculados en el backend)
+ * @param {number} serviceId - ID del servicio
+ * @returns {Promise<Array>} - Servicios similares, del más al menos parecido
+ */
+export async function getSimilarServices(serviceId) {
+    try {
+        const response = await fetch(`${API_BASE_URL}/services/${serviceId}/similar`, {
+            method: 'GET',
+            headers: getHeaders(false)
+        });
+
+        const services = await handleResponse(response);
+        return services.map(transformServiceToFrontend);
+
+    } catch (error) {
+        console.error('❌ Error obteniendo servicios similares:', error);
+        return [];
+    }
+}
+
 /**
  * Crea una nueva review para un servicio
  * @param {Object} reviewData - Datos de la review {serviceId, rating}
@@ -9,8 +9,21 @@ import { API_BASE_URL } from './config.js';
 
 // Token de autenticación (se guarda en localStorage)
 let authToken = localStorage.getItem('authToken') || null;
+// Refresh token: renueva el token de acceso (de vida corta) sin pedir la contraseña
+let refreshToken = localStorage.getItem('refreshToken') || null;
+let refreshTimer = null;
 let currentUser = null;
 
+// Segundos de anticipación con que se renueva el token antes de que expire
+const REFRESH_MARGIN_SECONDS = 60;
+// Desfase aleatorio máximo: las pestañas abiertas no renuevan al mismo tiempo
+const REFRESH_JITTER_SECONDS = 20;
+// Espera tras un 401 antes de releer localStorage (otra pestaña puede estar
+// guardando el token que rotó con el mismo refresh token)
+const ROTATION_WAIT_MS = 1000;
+// Reintento tras un error de red o del servidor (la sesión se conserva)
+const RETRY_SECONDS = 30;
+
 // ============================================
 // HELPERS
 // ============================================
@@ -27,6 +40,117 @@ function getHeaders(includeAuth = false) {
     return headers;
 }
 
+/**
+ * Segundos que le quedan a un JWT (leyendo su claim exp); 0 si no se puede leer
+ */
+function secondsUntilExpiry(token) {
+    try {
+        const payload = JSON.parse(atob(token.split('.')[1].replace(/-/g, '+').replace(/_/g, '/')));
+        return Math.max(0, payload.exp - Date.now() / 1000);
+    } catch {
+        return 0;
+    }
+}
+
+function clearSession() {
+    authToken = null;
+    refreshToken = null;
+    currentUser = null;
+    clearTimeout(refreshTimer);
+    localStorage.removeItem('authToken');
+    localStorage.removeItem('refreshToken');
+}
+
+/**
+ * Programa la renovación del token de acceso antes de que expire
+ */
+function scheduleRefresh() {
+    clearTimeout(refreshTimer);
+    if (!authToken || !refreshToken) return;
+    const margin = REFRESH_MARGIN_SECONDS + Math.random() * REFRESH_JITTER_SECONDS;
+    const delay = Math.max(0, secondsUntilExpiry(authToken) - margin);
+    refreshTimer = setTimeout(() => refreshSession(), delay * 1000);
+}
+
+function scheduleRetry() {
+    clearTimeout(refreshTimer);
+    refreshTimer = setTimeout(() => refreshSession(), RETRY_SECONDS * 1000);
+}
+
+/**
+ * Usa los tokens que otra pestaña guardó en localStorage, si son otros
+ * @returns {boolean} true si había tokens más nuevos
+ */
+function adoptStoredTokens() {
+    const stored = localStorage.getItem('refreshToken');
+    if (!stored || stored === refreshToken) return false;
+    authToken = localStorage.getItem('authToken');
+    refreshToken = stored;
+    scheduleRefresh();
+    return true;
+}
+
+// Otra pestaña renovó la sesión: todas comparten el mismo par de tokens
+window.addEventListener('storage', (event) => {
+    if (event.key === 'refreshToken' && event.newValue && refreshToken) {
+        adoptStoredTokens();
+    }
+});
+
+function storeTokens(data) {
+    authToken = data.access_token;
+    localStorage.setItem('authToken', authToken);
+    if (data.refresh_token) {
+        refreshToken = data.refresh_token;
+        localStorage.setItem('refreshToken', refreshToken);
+    }
+    scheduleRefresh();
+}
+
+/**
+ * Obtiene un nuevo par de tokens con el refresh token (que queda revocado).
+ * Solo cierra la sesión si el servidor rechaza el refresh token vigente: si
+ * otra pestaña ya lo rotó se usan sus tokens, y ante errores de red o del
+ * servidor se reintenta más tarde.
+ * @returns {boolean} true si la sesión sigue vigente
+ */
+export async function refreshSession() {
+    if (adoptStoredTokens()) return true;
+    if (!refreshToken) return false;
+    const usedToken = refreshToken;
+    let response;
+    try {
+        response = await fetch(`${API_BASE_URL}/login/refresh-token`, {
+            method: 'POST',
+            headers: getHeaders(false),
+            body: JSON.stringify({ refresh_token: usedToken })
+        });
+    } catch (error) {
+        console.error('No se pudo renovar la sesión, se reintentará:', error);
+        scheduleRetry();
+        return false;
+    }
+    if (response.status === 401) {
+        if (!adoptStoredTokens()) {
+            await new Promise(resolve => setTimeout(resolve, ROTATION_WAIT_MS));
+            adoptStoredTokens();
+        }
+        // Otra pestaña (o el evento storage durante la espera) trajo tokens nuevos
+        if (refreshToken !== usedToken) return true;
+        console.error('La sesión expiró o fue revocada');
+        clearSession();
+        return false;
+    }
+    try {
+        storeTokens(await handleResponse(response));
+        return true;
+    } catch (error) {
+        console.error('No se pudo renovar la sesión, se reintentará:', error);
+        scheduleRetry();
+        return false;
+    }
+}
+
 async function handleResponse(response) {
     if (!response.ok) {
         const error = await response.json().catch(() => ({ detail: 'Error desconocido' }));
@@ -58,9 +182,8 @@ export async function login(email, password) {
 
         const data = await handleResponse(response);
         
-        // Guardar token
-        authToken = data.access_token;
-        localStorage.setItem('authToken', authToken);
+        // Guardar tokens y programar la renovación
+        storeTokens(data);
         
         // Obtener datos del usuario
         currentUser = await getCurrentUser();
@@ -97,9 +220,16 @@ export async function register(userData) {
  * Logout
  */
 export function logout() {
-    authToken = null;
-    currentUser = null;
-    localStorage.removeItem('authToken');
+    if (authToken) {
+        // Revoca los tokens en el servidor; keepalive para que sobreviva a la recarga
+        fetch(`${API_BASE_URL}/login/logout`, {
+            method: 'POST',
+            headers: getHeaders(true),
+            body: JSON.stringify({ refresh_token: refreshToken }),
+            keepalive: true
+        }).catch(() => {});
+    }
+    clearSession();
     
     // Recargar la página para limpiar el estado
     window.location.reload();
@@ -133,12 +263,16 @@ export async function getCurrentUser(forceRefresh = false) {
             headers: getHeaders(true)
         });
 
+        if (response.status === 401 && await refreshSession()) {
+            // El token expiró o fue revocado pero la sesión sigue vigente
+            return getCurrentUser(true);
+        }
         const user = await handleResponse(response);
         currentUser = user;
         return user;
     } catch (error) {
         console.error('Error obteniendo usuario actual:', error);
-        // Si falla, el token probablemente expiró
+        // Si falla, la sesión expiró o fue revocada
         logout();
         return null;
     }
@@ -168,6 +302,10 @@ export async function updateUser(userData) {
         });
 
         const updatedUser = await handleResponse(response);
+        // El cambio de contraseña revoca las sesiones abiertas: iniciar una nueva
+        if (userData.password) {
+            await login(updatedUser.email, userData.password);
+        }
         // Actualizar caché
         currentUser = updatedUser;
         console.log('✅ Usuario actualizado en caché');
@@ -184,6 +322,10 @@ export async function updateUser(userData) {
 export async function initAuth() {
     if (isAuthenticated()) {
         try {
+            if (secondsUntilExpiry(authToken) <= REFRESH_MARGIN_SECONDS && !await refreshSession()) {
+                return { authenticated: false, user: null };
+            }
+            scheduleRefresh();
             currentUser = await getCurrentUser();
             return { authenticated: true, user: currentUser };
         } catch (error) {
@@ -317,6 +459,10 @@ export async function updateProfile(userData) {
         });
 
         currentUser = await handleResponse(response);
+        // El cambio de contraseña revoca las sesiones abiertas: iniciar una nueva
+        if (userData.password) {
+            await login(currentUser.email, userData.password);
+        }
         return { success: true, user: currentUser };
     } catch (error) {
         console.error('Error actualizando perfil:', error);
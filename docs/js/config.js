@@ -80,3 +80,6 @@ export const GEOCODING_API_URL = 'https://nominatim.openstreetmap.org/reverse';
 export const API_BASE_URL = (typeof window !== 'undefined' && window.API_BASE_URL)
   ? window.API_BASE_URL
   : 'http://127.0.0.1:8000/api/v1';
+
+// Máximo de resultados por búsqueda con filtros (MAX_PAGE_SIZE del backend)
+export const SEARCH_RESULTS_LIMIT = 200;
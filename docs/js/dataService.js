@@ -5,23 +5,69 @@
 // ============================================
 
 import { haversineDistance } from './utils.js';
-import { getServices as getServicesFromAPI } from './apiService.js';
+import {
+    getServices as getServicesFromAPI,
+    getServiceChanges,
+    transformServiceToFrontend
+} from './apiService.js';
+import { API_BASE_URL } from './config.js';
 
 let services = [];
 let centerLocation = null;
 let isLoadingServices = false;
 let lastLoadTime = null;
 const CACHE_DURATION = 2 * 60 * 1000; // 2 minutos en milisegundos
+let changeStream = null; // EventSource de /services/stream para el viewport actual
+const STORAGE_KEY = 'servicesSnapshot'; // Servicios + marca de agua persistidos entre visitas
 
 /**
  * Verifica si el caché es válido
  */
 const isCacheValid = () => {
     if (!lastLoadTime) return false;
+    // Con el stream abierto el caché se mantiene al día con los deltas
+    if (changeStream && changeStream.readyState === EventSource.OPEN) return true;
     const elapsed = Date.now() - lastLoadTime;
     return elapsed < CACHE_DURATION;
 };
 
+/**
+ * Sincroniza los servicios con el backend descargando solo lo que cambió
+ * desde la última visita (la copia local vive en localStorage)
+ */
+const syncServices = async () => {
+    let snapshot = null;
+    try {
+        snapshot = JSON.parse(localStorage.getItem(STORAGE_KEY));
+    } catch (error) {
+        snapshot = null;
+    }
+
+    let byId = new Map((snapshot?.services || []).map(s => [s.id, s]));
+    let since = snapshot?.since || null;
+    let hasMore = true;
+    while (hasMore) {
+        const changes = await getServiceChanges(since);
+        if (changes.reset) {
+            // La marca de agua expiró: sincronizar desde cero
+            byId = new Map();
+            since = null;
+            continue;
+        }
+        changes.deleted.forEach(id => byId.delete(id));
+        changes.services.forEach(s => byId.set(s.id, s));
+        since = changes.next;
+        hasMore = changes.hasMore;
+    }
+    services = [...byId.values()];
+
+    try {
+        localStorage.setItem(STORAGE_KEY, JSON.stringify({ since, services }));
+    } catch (error) {
+        console.warn('⚠️ No se pudo guardar la copia local de servicios:', error);
+    }
+};
+
 /**
  * Carga los servicios desde el backend
  * @param {boolean} forceRefresh - Forzar recarga aunque el caché sea válido
@@ -44,8 +90,13 @@ const loadServicesData = async (forceRefresh = false) => {
         isLoadingServices = true;
         console.log('🔄 Cargando servicios desde backend...');
         
-        // Obtener servicios desde el backend
-        services = await getServicesFromAPI();
+        // Obtener solo los cambios desde la última sincronización
+        try {
+            await syncServices();
+        } catch (error) {
+            console.warn('⚠️ Sincronización incremental no disponible, recargando todo:', error);
+            services = await getServicesFromAPI();
+        }
         lastLoadTime = Date.now();
         
         console.log('✅ Servicios cargados:', services.length);
@@ -118,6 +169,39 @@ export const removeServiceFromCache = (serviceId) => {
     }
 };
 
+/**
+ * Escucha los cambios de servicios dentro del viewport (SSE) y los aplica al caché
+ * @param {string} bbox - Bounding box "minLng,minLat,maxLng,maxLat" (Leaflet toBBoxString)
+ * @param {Function} onChange - Callback tras aplicar cada cambio (por ejemplo, re-renderizar)
+ */
+export const watchServiceChanges = (bbox, onChange) => {
+    if (typeof EventSource === 'undefined') return;
+    if (changeStream) changeStream.close();
+
+    changeStream = new EventSource(`${API_BASE_URL}/services/stream?bbox=${encodeURIComponent(bbox)}`);
+    const upsert = (event) => {
+        const service = transformServiceToFrontend(JSON.parse(event.data));
+        const index = services.findIndex(s => s.id === service.id);
+        if (index !== -1) {
+            services[index] = service;
+        } else {
+            services.push(service);
+        }
+        onChange();
+    };
+    changeStream.addEventListener('added', upsert);
+    changeStream.addEventListener('updated', upsert);
+    changeStream.addEventListener('removed', (event) => {
+        removeServiceFromCache(JSON.parse(event.data).id);
+        onChange();
+    });
+    // El servidor descartó deltas porque el cliente se atrasó: recarga completa
+    changeStream.addEventListener('reset', async () => {
+        await loadServicesData(true);
+        onChange();
+    });
+};
+
 /**
  * Obtiene todos los servicios
  * @returns {Array} - La lista de servicios
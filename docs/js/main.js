@@ -1,6 +1,6 @@
 // js/main.js
 
-import { DEFAULT_LOCATION } from './config.js';
+import { DEFAULT_LOCATION, SEARCH_RESULTS_LIMIT } from './config.js';
 import * as DataService from './dataService.js';
 import * as MapService from './mapService.js';
 import * as UIService from './uiService.js';
@@ -16,6 +16,7 @@ document.addEventListener('DOMContentLoaded', () => {
     let selectedLocation = null;
     let centerLocation = { ...DEFAULT_LOCATION };
     let activeCategory = null; // Para gestionar la categoría activa
+    let activeDistrict = null; // ID de la comuna seleccionada en los filtros
     let userLocation = null; // Para guardar la ubicación del usuario
     let isSelectingFromPublishPanel = false; // Flag para saber el contexto de selección
 
@@ -61,36 +62,24 @@ document.addEventListener('DOMContentLoaded', () => {
                 return;
             }
             
-            // Asegurar que los servicios estén cargados (usar caché si es válido)
-            await DataService.reloadServices(forceRefresh);
-            
-            // Obtener servicios cacheados y filtrar localmente
-            let publications = DataService.getServices();
-            
-            // Aplicar filtros localmente
-            if (searchTerm || activeCategory) {
-                console.log('🔍 Filtrando localmente:', { searchTerm, activeCategory });
-                console.log('📊 Total servicios antes de filtrar:', publications.length);
-                console.log('📋 TODOS los servicios con categorías:');
-                publications.forEach((s, idx) => {
-                    console.log(`  ${idx + 1}. "${s.serviceName}" → categoría: "${s.category}" (length: ${s.category.length})`);
-                });
-                
-                publications = publications.filter(service => {
-                    const matchesSearch = !searchTerm || 
-                        service.serviceName.toLowerCase().includes(searchTerm.toLowerCase()) ||
-                        service.description.toLowerCase().includes(searchTerm.toLowerCase());
-                    const matchesCategory = !activeCategory || service.category === activeCategory;
-                    
-                    if (activeCategory) {
-                        const match = service.category === activeCategory;
-                        console.log(`${match ? '✅' : '❌'} "${service.serviceName}": "${service.category}" === "${activeCategory}" ? ${match}`);
-                    }
-                    
-                    return matchesSearch && matchesCategory;
+            const filterByRadius = maxRadius !== null && userLocation;
+            let publications;
+            if (searchTerm || activeCategory || activeDistrict || filterByRadius) {
+                // Filtros combinados: los resuelve el backend (índice en memoria)
+                console.log('🔍 Buscando en el backend:', { searchTerm, activeCategory, activeDistrict, maxRadius });
+                publications = await ApiService.getServices({
+                    search: searchTerm || null,
+                    category: activeCategory,
+                    district: activeDistrict,
+                    ...(userLocation ? { lat: userLocation.lat, lng: userLocation.lng, sort: 'distance' } : {}),
+                    radiusKm: filterByRadius ? maxRadius : null,
+                    limit: SEARCH_RESULTS_LIMIT
                 });
-                
-                console.log('✅ Total servicios después de filtrar:', publications.length);
+                console.log('✅ Resultados de la búsqueda:', publications.length);
+            } else {
+                // Asegurar que los servicios estén cargados (usar caché si es válido)
+                await DataService.reloadServices(forceRefresh);
+                publications = DataService.getServices();
             }
             
             // Si tenemos la ubicación del usuario, calculamos las distancias
@@ -101,13 +90,6 @@ document.addEventListener('DOMContentLoaded', () => {
                     }
                 });
                 
-                // Filtrar por radio SOLO si está activado
-                if (maxRadius !== null) {
-                    publications = publications.filter(pub => {
-                        return pub.distance === undefined || pub.distance <= maxRadius;
-                    });
-                }
-                
                 // Ordenar por distancia
                 publications.sort((a, b) => (a.distance || 999) - (b.distance || 999));
             }
@@ -248,6 +230,27 @@ document.addEventListener('DOMContentLoaded', () => {
             });
         }
 
+        // 7.1 Filtro por comuna: solo se muestra si el backend tiene comunas
+        const districtFilter = document.getElementById('district-filter');
+        if (districtFilter) {
+            ApiService.getDistricts().then((districts) => {
+                if (!districts.length) return;
+                districts.forEach(({ id, name }) => {
+                    const option = document.createElement('option');
+                    option.value = id;
+                    option.textContent = name;
+                    districtFilter.appendChild(option);
+                });
+                document.getElementById('district-filter-group')?.classList.remove('hidden');
+            });
+            districtFilter.addEventListener('change', (e) => {
+                activeDistrict = e.target.value || null;
+                updateActiveFiltersCount();
+                const searchInput = document.getElementById('service-search-input');
+                performSearch(searchInput ? searchInput.value : '');
+            });
+        }
+
         // 8. Listener para el control de radio de búsqueda
         const radiusSlider = document.getElementById('search-radius');
         const radiusValueDisplay = document.getElementById('radius-value');
@@ -343,6 +346,14 @@ document.addEventListener('DOMContentLoaded', () => {
             console.log('ℹ️ No hay servicios disponibles aún');
         }
 
+        // Mantener los servicios del viewport al día con deltas en vez de recargas completas
+        MapService.onViewportChange((bbox) => {
+            DataService.watchServiceChanges(bbox, () => {
+                const searchInput = document.getElementById('service-search-input');
+                performSearch(searchInput ? searchInput.value : '');
+            });
+        });
+
         // --- Carga Inicial UI ---
         UIService.hideAllModals();
 
@@ -732,6 +743,11 @@ document.addEventListener('DOMContentLoaded', () => {
             count++;
         }
         
+        // Contar comuna seleccionada
+        if (activeDistrict) {
+            count++;
+        }
+        
         // Actualizar badge
         if (count > 0) {
             badge.textContent = count;
@@ -99,6 +99,15 @@ export const initMap = (onMapClick) => {
     // Se llamará desde main.js después de obtener la ubicación del usuario.
 };
 
+/**
+ * Notifica el bounding box visible al iniciar y cada vez que el mapa se mueve.
+ * @param {Function} callback - Recibe el bbox como "minLng,minLat,maxLng,maxLat".
+ */
+export const onViewportChange = (callback) => {
+    map.on('moveend', () => callback(map.getBounds().toBBoxString()));
+    callback(map.getBounds().toBBoxString());
+};
+
 /**
  * Renderiza los marcadores de los usuarios en el mapa.
  * @param {Array} filteredUsers - Opcional, una lista de usuarios para renderizar. Si no se provee, renderiza todos.
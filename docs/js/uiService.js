@@ -691,6 +691,7 @@ export const showDetailPanel = async (service) => {
     
     // Renderizar el contenido del servicio
     serviceDetailContent.innerHTML = renderServiceDetails(service);
+    ApiService.trackServiceView(service.id);
     
     // Mostrar el panel
     detailPanel.classList.add('is-open');
@@ -707,8 +708,8 @@ export const showDetailPanel = async (service) => {
         document.body.style.overflow = 'hidden';
     }
 
-    // Cargar y mostrar reviews
-    await loadAndDisplayReviews(service.id);
+    // Cargar y mostrar reviews y similares
+    await Promise.all([loadAndDisplayReviews(service.id), loadAndDisplaySimilar(service.id)]);
 
     // Añadir listener para el botón de contacto por email
     const emailContactBtn = document.getElementById('email-contact-btn');
@@ -719,6 +720,11 @@ export const showDetailPanel = async (service) => {
             handleEmailContact(email);
         });
     }
+
+    // Contar los clics de contacto (email, teléfono y WhatsApp)
+    serviceDetailContent.querySelectorAll('.contact-actions .detail-action-btn').forEach((btn) => {
+        btn.addEventListener('click', () => ApiService.trackServiceContact(service.id));
+    });
 };
 
 /**
@@ -827,6 +833,12 @@ const renderServiceDetails = (service) => {
         </div>
         ` : ''}
 
+        <!-- Servicios similares cercanos (se ocultan si no hay) -->
+        <div class="service-detail-section" id="similar-services-section" hidden>
+            <h4>🔎 Similares cerca</h4>
+            <div id="similar-services-container" class="similar-services-list"></div>
+        </div>
+
         <!-- Sección de Reviews -->
         <div class="service-detail-section">
             <h4>💬 Valoraciones y Opiniones</h4>
@@ -1150,6 +1162,44 @@ async function loadAndDisplayReviews(serviceId) {
     }
 }
 
+/**
+ * Carga y muestra los servicios similares cercanos en el panel de detalles
+ * @param {number} serviceId - ID del servicio mostrado
+ */
+async function loadAndDisplaySimilar(serviceId) {
+    const section = document.getElementById('similar-services-section');
+    const container = document.getElementById('similar-services-container');
+    if (!section || !container) return;
+
+    const similar = await ApiService.getSimilarServices(serviceId);
+    // El usuario pudo abrir otro servicio mientras tanto
+    if (document.getElementById('detail-panel').dataset.serviceId !== String(serviceId)) return;
+
+    container.innerHTML = '';
+    similar.forEach((other) => {
+        const item = document.createElement('button');
+        item.type = 'button';
+        item.className = 'similar-service-item';
+
+        const name = document.createElement('span');
+        name.className = 'similar-service-name';
+        name.textContent = other.serviceName;
+        item.appendChild(name);
+
+        const meta = document.createElement('span');
+        meta.className = 'similar-service-meta';
+        meta.textContent = `${other.category} · ${formatPrice(other.price, other.priceModality)}`;
+        item.appendChild(meta);
+
+        item.addEventListener('click', () => {
+            MapService.focusOnService(other.id);
+            showDetailPanel(other);
+        });
+        container.appendChild(item);
+    });
+    section.hidden = similar.length === 0;
+}
+
 /**
  * Renderiza un item de review
  * @param {Object} review - Review a renderizar